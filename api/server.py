@@ -0,0 +1,219 @@
+"""
+HTTP/JSON API for the agent (FastAPI).
+
+  uvicorn api.server:app --host 0.0.0.0 --port 8000
+  python -m api.server
+
+Endpoints
+  GET  /health
+  GET  /schema                 schema.json of a database (cached by file mtime; ?database=<name>)
+  GET  /databases              registered databases (data/databases.json, core/registry.py)
+  GET  /insights               saved insights
+  POST /ask      {"message"}   intent + answer; SQL answers stream as NDJSON/Arrow
+                               (pass "session_id" to ask follow-ups on previous answers)
+  POST /execute  {"sql"}       run a read-only SELECT and stream the rows
+
+/ask and /execute take "database" (a registered name; default: the Olist warehouse). Clients
+can't name files: databases come from the registry, and queries run on read-only pools without
+filesystem access (core/db.py).
+
+WARMUP_ON_START=1 warms the default database in the background at startup (core/warmup.py).
+REPORT_EVERY_MIN=N refreshes the saved-insight report on it every N minutes (core/reports.py).
+
+Results stream as NDJSON by default (first line = metadata, then one JSON row per line,
+last line = {"type": "end"}), or as an Arrow IPC stream when the request sends
+`Accept: application/vnd.apache.arrow.stream` (metadata then goes in X-* headers).
+"""
+from __future__ import annotations
+import sys, os, io, json, asyncio, threading
+from collections import OrderedDict
+from pathlib import Path
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pyarrow as pa
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from core.sql_safety import check_sql
+from core.orchestrator import handle_message
+from core.memory import load_insights
+from core.executor import get_service, answer_key, Cancelled
+from core.db import connect
+from core.results import decode_dictionaries
+from core.session import SessionContext
+from core.approx import rewrite as approx_rewrite, annotate, approx_info
+from core import registry
+from core.warmup import WARMUP_ON_START, warm_in_background
+from core.reports import REPORT_EVERY_MIN, schedule_in_background
+
+API_MAX_INFLIGHT = int(os.getenv("API_MAX_INFLIGHT", "32"))
+API_MAX_ROWS = int(os.getenv("API_MAX_ROWS", "100000"))
+API_BATCH_ROWS = int(os.getenv("API_BATCH_ROWS", "2048"))
+API_MAX_SESSIONS = int(os.getenv("API_MAX_SESSIONS", "256"))
+ARROW_MIME = "application/vnd.apache.arrow.stream"
+
+app = FastAPI(title="Olist InsightGPT API")
+_inflight = asyncio.Semaphore(API_MAX_INFLIGHT)
+_schema_cache: dict[str, tuple[float, dict]] = {}
+_sessions: OrderedDict[tuple[str, str, str], SessionContext] = OrderedDict()  # LRU, (client, id, db)
+_sessions_lock = threading.Lock()
+
+class AskBody(BaseModel):
+    message: str
+    database: str | None = None
+    session_id: str | None = None
+    approx: bool = False
+
+class ExecuteBody(BaseModel):
+    sql: str
+    database: str | None = None
+    max_rows: int | None = None
+    approx: bool = False
+
+# --------------------------------------------------------------------------------------
+# Helpers
+# --------------------------------------------------------------------------------------
+def _client(request: Request) -> str:
+    return request.headers.get("x-client-id") or (request.client.host if request.client else "anon")
+
+async def _run(request: Request, fn, *args, cache_key=None, cache_ns="", **kwargs):
+    """Run on the shared execution service under the API's in-flight limit."""
+    if _inflight.locked():
+        raise HTTPException(429, "Too many requests in flight, retry shortly.")
+    async with _inflight:
+        fut = get_service().submit(_client(request), fn, *args, cache_key=cache_key, cache_ns=cache_ns,
+                                   cancel_previous=False, **kwargs)
+        try:
+            return await asyncio.wrap_future(fut)
+        except Cancelled:
+            raise HTTPException(409, "Request was cancelled.")
+
+def _database(database: str | None) -> dict:
+    """Registry entry for a request (default: the Olist warehouse)."""
+    if database and database not in registry.databases():
+        raise HTTPException(404, f"Unknown database: {database}")
+    entry = registry.get(database)
+    if not Path(registry.db_file(entry)).exists():
+        raise HTTPException(404, f"Database {entry['name']!r} not found")
+    return entry
+
+def _session(request: Request, session_id: str | None, db_path: str) -> SessionContext | None:
+    if not session_id:
+        return None
+    key = (_client(request), session_id, db_path)  # a session id only reaches its own client's results
+    with _sessions_lock:
+        ctx = _sessions.pop(key, None) or SessionContext(db_path)
+        _sessions[key] = ctx
+        while len(_sessions) > API_MAX_SESSIONS:
+            # not closed: a request may still be using it; it closes once the last one lets go
+            _sessions.popitem(last=False)
+        return ctx
+
+def _fetch_arrow(sql: str, db_path: str, max_rows: int, approx: bool = False) -> pa.Table:
+    info = None
+    if approx:
+        sql, info = approx_rewrite(sql, db_path)
+    with connect(db_path) as con:
+        tbl = con.execute(f"SELECT * FROM ({sql.strip().rstrip(';')}) LIMIT {int(max_rows)}").fetch_arrow_table()
+        tbl = decode_dictionaries(tbl)
+    return annotate(tbl, info) if info else tbl
+
+def _ndjson(meta: dict, table: pa.Table | None):
+    yield json.dumps({"type": "meta", **meta}, default=str) + "\n"
+    n = 0
+    if table is not None:
+        for batch in table.to_batches(max_chunksize=API_BATCH_ROWS):
+            rows = batch.to_pylist()
+            n += len(rows)
+            yield "".join(json.dumps({"type": "row", "data": r}, default=str) + "\n" for r in rows)
+    yield json.dumps({"type": "end", "rows": n}) + "\n"
+
+def _arrow_ipc(table: pa.Table):
+    buf = io.BytesIO()
+    with pa.ipc.new_stream(buf, table.schema) as writer:
+        for batch in table.to_batches(max_chunksize=API_BATCH_ROWS):
+            writer.write_batch(batch)
+            yield buf.getvalue()
+            buf.seek(0); buf.truncate()
+    yield buf.getvalue()  # schema-only tables + end-of-stream marker
+
+def _respond(request: Request, meta: dict, table: pa.Table | None):
+    if table is not None and ARROW_MIME in request.headers.get("accept", ""):
+        headers = {f"X-{k.replace('_', '-').title()}": json.dumps(v, default=str) for k, v in meta.items()}
+        return StreamingResponse(_arrow_ipc(table), media_type=ARROW_MIME, headers=headers)
+    return StreamingResponse(_ndjson(meta, table), media_type="application/x-ndjson")
+
+# --------------------------------------------------------------------------------------
+# Endpoints
+# --------------------------------------------------------------------------------------
+@app.on_event("startup")
+def _warmup():
+    if WARMUP_ON_START:  # default database; first requests don't pay for a cold start
+        warm_in_background()
+    if REPORT_EVERY_MIN:  # scheduled report refresh (core/reports.py)
+        schedule_in_background()
+
+@app.get("/health")
+def health():
+    return {"ok": True, "service": get_service().stats()}
+
+@app.get("/databases")
+def databases():
+    return [{"name": e["name"], "kind": e["kind"], "path": str(e["path"]), "description": e["description"],
+             "aliases": e["aliases"]} for e in registry.databases().values()]
+
+@app.get("/schema")
+def schema(database: str | None = None):
+    p = Path(registry.schema_path(_database(database)))
+    if not p.exists():
+        raise HTTPException(404, f"No schema for database {database or registry.DEFAULT_NAME!r}")
+    mtime = p.stat().st_mtime
+    hit = _schema_cache.get(str(p))
+    if not hit or hit[0] != mtime:
+        hit = (mtime, json.loads(p.read_text(encoding="utf-8")))
+        _schema_cache[str(p)] = hit
+    return hit[1]
+
+@app.get("/insights")
+def insights():
+    return load_insights()
+
+@app.post("/ask")
+async def ask(body: AskBody, request: Request):
+    entry = _database(body.database)
+    db_path = str(registry.db_file(entry))
+    schema_path = str(registry.schema_path(entry))
+    ctx = _session(request, body.session_id, db_path)
+    key = answer_key(body.message, schema_path, db_path, ctx.context_key() if ctx else "", body.approx)
+    md, extras = await _run(request, handle_message, body.message, schema_path=schema_path,
+                            db_path=db_path, session=ctx, approx=body.approx, cache_key=key,
+                            cache_ns=registry.cache_namespace(entry))
+    if ctx and extras.get("intent") == "sql_query" and not extras.get("error"):
+        ctx.remember(extras.get("question", body.message), extras.get("sql"), extras.get("table"))
+    meta = {k: v for k, v in extras.items() if k != "table"}
+    meta["markdown"] = md
+    return _respond(request, meta, extras.get("table"))
+
+@app.post("/execute")
+async def execute(body: ExecuteBody, request: Request):
+    entry = _database(body.database)
+    db_path = str(registry.db_file(entry))
+    unsafe = check_sql(body.sql, db_path)
+    if unsafe:
+        raise HTTPException(400, f"Only a single read-only SELECT over the database's tables is allowed ({unsafe}).")
+    max_rows = min(body.max_rows or API_MAX_ROWS, API_MAX_ROWS)
+    try:
+        table = await _run(request, _fetch_arrow, body.sql, db_path, max_rows, body.approx,
+                           cache_key=("execute", body.sql.strip(), db_path, max_rows, body.approx),
+                           cache_ns=registry.cache_namespace(entry))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(400, str(e))
+    return _respond(request, {"sql": body.sql, "columns": table.column_names, "approx": approx_info(table)}, table)
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host=os.getenv("API_HOST", "127.0.0.1"), port=int(os.getenv("API_PORT", "8000")))
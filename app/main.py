@@ -1,18 +1,27 @@
-import sys, hashlib
+import os, sys, hashlib, time, uuid
+from concurrent.futures import CancelledError
 from pathlib import Path
 
 # Ensure root import path
 ROOT = Path(__file__).resolve().parents[1]
 sys.path.append(str(ROOT))
 
-import streamlit as st
 import pandas as pd
+import streamlit as st
 import plotly.io as pio
-import duckdb
 
 # Core imports
-from core.sql_agent import DEFAULT_DB, DEFAULT_SCHEMA
+from core.sql_agent import DEFAULT_DB
+from core import registry
 from core.orchestrator import handle_message
+from core.executor import get_service, answer_key, Cancelled
+from core.db import connect, MEMORY_BUDGET_MB, RESULT_MAX_ROWS
+from core.session import SessionContext
+from core.templates import fast_path_stats
+from core.semantic import DASHBOARD_YEARS, dashboard_queries, ensure_semantic_layer
+from core.warmup import WARMUP_ON_START, warm_in_background
+from core import metrics
+from core import reports
 from core.memory import add_insight, load_insights, clear_insights
 from core.report_utils import (
     summarize_df,
@@ -20,10 +29,32 @@ from core.report_utils import (
     markdown_to_pdf_bytes,
     df_to_chart_png,  # NEW: chart helper
 )
+from core.results import (head_df, is_empty, round_floats, compact, truncated_at,
+                          to_csv_bytes, to_parquet_bytes, to_arrow_bytes)
+
+# Memory-bounded mode (MEMORY_BUDGET_MB): only the last APP_FULL_RESULTS answers keep their
+# full result table; older ones are cut to their first rows. 0 = keep everything.
+APP_FULL_RESULTS = int(os.getenv("APP_FULL_RESULTS", "3" if MEMORY_BUDGET_MB else "0"))
 
 # Theme
 pio.templates.default = "plotly_dark"
 
+# Result downloads: label -> (writer, extension, mime)
+EXPORTS = {
+    "CSV": (to_csv_bytes, "csv", "text/csv"),
+    "Parquet": (to_parquet_bytes, "parquet", "application/vnd.apache.parquet"),
+    "Arrow": (to_arrow_bytes, "arrow", "application/vnd.apache.arrow.stream"),
+}
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def _export_bytes(result_key: str, fmt: str, _table) -> bytes:
+    return EXPORTS[fmt][0](_table)
+
+@st.cache_resource(show_spinner=False)
+def _warmed(db: str):
+    # WARMUP_ON_START: once per database per server process, in the background (core/warmup.py)
+    return warm_in_background(registry.get(db))
+
 # ---------- Page config ----------
 st.set_page_config(page_title="Olist InsightGPT — Agent", page_icon="🧠", layout="wide")
 
@@ -33,7 +64,7 @@ if css_path.exists():
     st.markdown(f"<style>{css_path.read_text()}</style>", unsafe_allow_html=True)
 
 # ---------- Tabs ----------
-tab1, tab2 = st.tabs(["💬 Chat Assistant", "📊 KPI Dashboard"])
+tab1, tab2, tab3 = st.tabs(["💬 Chat Assistant", "📊 KPI Dashboard", "⏱️ Performance"])
 
 # =====================================================================================
 # ✅ TAB 1: CHAT AI AGENT
@@ -48,9 +79,31 @@ with tab1:
     # Sidebar settings
     with st.sidebar:
         st.subheader("Settings")
-        db_path = st.text_input("DuckDB path", str(DEFAULT_DB))
-        schema_path = st.text_input("Schema path", str(DEFAULT_SCHEMA))
+        dbs = registry.databases()
+        CUSTOM = "Custom path…"
+        choice = st.selectbox(
+            "Database", list(dbs) + [CUSTOM],
+            format_func=lambda n: f"{n} — {dbs[n]['description']}" if n in dbs and dbs[n]["description"] else n,
+            help="Registered in data/databases.json. Questions that name another database are routed to it.",
+        )
+        db_entry = registry.get(st.text_input("DuckDB path", str(DEFAULT_DB))) if choice == CUSTOM else dbs[choice]
+        db_path = str(registry.db_file(db_entry))
+        if not Path(db_path).exists():  # never open (and so create) a mistyped path
+            st.error(f"DuckDB not found: {db_path}")
+            st.stop()
+        schema_path = str(registry.schema_path(db_entry))
+        if WARMUP_ON_START:
+            _warmed(db_path)
         show_sql = st.toggle("Show SQL", value=True)
+        approx_mode = st.toggle(
+            "Approximate mode", value=False,
+            help="Answer from samples/sketches on large tables: faster, with 95% error bounds (*_ci95 columns).",
+        )
+        fp = fast_path_stats()
+        if fp["total"]:
+            st.caption(f"Template fast path: {fp['hits']}/{fp['total']} questions ({fp['hit_rate']:.0%}) answered without the LLM")
+        if MEMORY_BUDGET_MB:
+            st.caption(f"Memory-bounded mode: {MEMORY_BUDGET_MB} MB budget, results capped at {RESULT_MAX_ROWS:,} rows")
         st.divider()
         if st.button("Clear chat history", use_container_width=True):
             st.session_state.pop("history", None)
@@ -81,7 +134,14 @@ with tab1:
         if len(ins) == 0:
             st.info("Run a query & click **💾 Save insight** before exporting.")
         else:
-            md_text = insights_to_markdown(ins, title=report_title, author=report_author)
+            if st.button("Refresh with current data", use_container_width=True,
+                         help="Re-run the saved insights' SQL; unchanged tables are skipped (core/reports.py)"):
+                with st.spinner("Refreshing insights…"):
+                    m = reports.refresh(db_path, ins, title=report_title, author=report_author)
+                counts = ", ".join(f"{v} {k}" for k, v in sorted(m["counts"].items()))
+                st.caption(f"{counts} in {m['seconds']:.2f}s — "
+                           + (f"new version {m['version']}" if m["version"] else f"no changes since {m['latest']}"))
+            md_text = insights_to_markdown(reports.refreshed(ins, db_path), title=report_title, author=report_author)
 
             with st.expander("Preview Markdown"):
                 st.markdown(md_text)
@@ -107,10 +167,53 @@ with tab1:
     prompt_placeholder = "Ask: Top revenue categories, delivery delays, repeat buyers, etc."
     q = st.chat_input(prompt_placeholder)
 
+    if "session_id" not in st.session_state:
+        st.session_state["session_id"] = uuid.uuid4().hex
+
+    # Previous results of this conversation, for follow-ups ("now only for SP", "top 3")
+    ctx = st.session_state.get("session_ctx")
+    if ctx is None or ctx.db_path != str(db_path):
+        if ctx is not None:
+            ctx.close()
+        ctx = st.session_state["session_ctx"] = SessionContext(db_path)
+
     if q:
-        with st.spinner("Thinking…"):
-            md, extras = handle_message(q, schema_path=schema_path, db_path=db_path)
-        st.session_state["history"].append((q, md, extras))
+        # "Profile the next question" (Performance tab): run it uncached under the profiler
+        profiling = st.session_state.get("profile_next", False)
+        if profiling:
+            st.session_state["profile_next"] = False
+        fn, args = (metrics.profile, (handle_message, q)) if profiling else (handle_message, (q,))
+        # Run on the shared execution service; a newer question from this session cancels this one.
+        job = get_service().submit(
+            st.session_state["session_id"], fn, *args,
+            schema_path=schema_path, db_path=db_path, session=ctx, approx=approx_mode,
+            cache_key=None if profiling else answer_key(q, schema_path, db_path, ctx.context_key(), approx_mode),
+            cache_ns=registry.cache_namespace(db_entry),
+        )
+        status = st.empty()
+        t0 = time.perf_counter()
+        while not job.done():
+            # touching the page each tick lets Streamlit stop this run if the user asks again
+            status.caption(f"Thinking… {time.perf_counter() - t0:.1f}s")
+            time.sleep(0.1)
+        status.empty()
+        try:
+            res = job.result()
+            if profiling:
+                res, st.session_state["profile_report"] = res
+            md, extras = res
+            st.session_state["history"].append((q, md, extras))
+            if extras.get("intent") == "sql_query" and not extras.get("error"):
+                ctx.remember(extras.get("question", q), extras.get("sql"), extras.get("table"))
+            if APP_FULL_RESULTS:
+                hist = st.session_state["history"]
+                for i in range(max(0, len(hist) - APP_FULL_RESULTS)):
+                    u, m, ex = hist[i]
+                    if ex.get("table") is not None and not ex.get("compacted"):
+                        # new dict: the original is shared with the execution service's cache
+                        hist[i] = (u, m, {**ex, "table": compact(ex["table"], 10), "compacted": True})
+        except (Cancelled, CancelledError):
+            pass
 
     # ---------- Chat history ----------
     for user, md, extras in st.session_state["history"]:
@@ -121,22 +224,27 @@ with tab1:
                 st.markdown(md)
 
                 if extras.get("intent") == "sql_query":
-                    df = extras.get("df")
+                    tbl = extras.get("table")  # pyarrow.Table
                     sql = extras.get("sql", "")
+                    head = head_df(tbl, 10)  # the only pandas copy: summaries & charts need 10 rows
+                    n_rows = 0 if tbl is None else tbl.num_rows
                     t1, t2 = st.tabs(["📈 Result", "🧾 SQL"])
 
                     with t1:
-                        if df is not None and not df.empty:
-                            df_show = df.copy()
-                            for c in df_show.columns:
-                                if pd.api.types.is_float_dtype(df_show[c]):
-                                    df_show[c] = df_show[c].round(3)
-                            st.dataframe(df_show, use_container_width=True, hide_index=True)
-
-                            st.download_button(
-                                "Download CSV",
-                                df.to_csv(index=False).encode("utf-8"),
-                                file_name="result.csv", mime="text/csv",
+                        if not is_empty(tbl):
+                            st.dataframe(round_floats(tbl, 3), use_container_width=True, hide_index=True)
+                            if extras.get("compacted"):
+                                st.caption("Older answer: only its first 10 rows are kept (memory-bounded mode); ask again for the full result.")
+                            elif truncated_at(tbl):
+                                st.caption(f"Showing the first {truncated_at(tbl):,} rows (RESULT_MAX_ROWS).")
+
+                            # one format at a time, built once per result (reruns hit the cache)
+                            d1, d2 = st.columns([1, 3])
+                            res_key = hashlib.md5(f"{db_path}|{sql}|{n_rows}|{extras.get('compacted')}".encode()).hexdigest()
+                            fmt = d1.selectbox("Format", list(EXPORTS), key="fmt_" + res_key, label_visibility="collapsed")
+                            d2.download_button(
+                                f"Download {fmt}", _export_bytes(res_key, fmt, tbl),
+                                file_name=f"result.{EXPORTS[fmt][1]}", mime=EXPORTS[fmt][2], key="dl_" + res_key,
                             )
                         else:
                             st.info("No rows returned.")
@@ -147,7 +255,7 @@ with tab1:
 
                     # -------- Summarize current result --------
                     try:
-                        summary = summarize_df(df, user)
+                        summary = summarize_df(head, user)
                     except Exception:
                         summary = f"**Question:** {user} — summary generated."
 
@@ -163,7 +271,7 @@ with tab1:
                                 question=user,
                                 summary=summary,
                                 sql=sql,
-                                sample_rows=(0 if df is None else min(len(df), 10)),
+                                sample_rows=min(n_rows, 10),
                             )
                             st.success("Insight saved.")
                     with c2:
@@ -177,14 +285,14 @@ with tab1:
                             "question": user,
                             "summary": summary,
                             "sql": sql,
-                            "sample_rows": (0 if df is None else min(len(df), 10))
+                            "sample_rows": min(n_rows, 10)
                         }],
                         title="Olist Insight — Single Query Report",
                         author="Auto-Analyst"
                     )
 
-                    # Try to render a chart image from this df
-                    chart_bytes = df_to_chart_png(df, title=f"Result: {user}") if df is not None else None
+                    # Try to render a chart image from this result
+                    chart_bytes = df_to_chart_png(head, title=f"Result: {user}") if head is not None else None
                     single_pdf = markdown_to_pdf_bytes(single_md, image_bytes=chart_bytes)
 
                     c3, c4 = st.columns([1, 3])
@@ -203,6 +311,75 @@ with tab1:
                             mime="text/markdown"
                         )
 
+# =====================================================================================
+# ✅ TAB 3: PERFORMANCE (before the dashboard: it st.stop()s on databases without rollups)
+# =====================================================================================
+with tab3:
+    st.markdown("""
+    <h1 class="app-title">⏱️ Performance</h1>
+    <p class="app-subtitle">Stage latencies • Cache hit rates • LLM tokens • Slow SQL • DuckDB memory</p>
+    """, unsafe_allow_html=True)
+
+    WINDOWS = {"Last hour": 3600, "Last 24 hours": 86400, "Last 7 days": 7 * 86400, "Last 14 days": 14 * 86400}
+    since = WINDOWS[st.selectbox("Window", list(WINDOWS), index=1)]
+    st.caption(f"Metrics: `{metrics.METRICS_DB}`" + ("" if metrics.METRICS_ENABLED else " (METRICS_ENABLED=0: not recording)"))
+
+    try:
+        st.write("### Stage latency")
+        stages = metrics.stage_summary(since)
+        if stages.empty:
+            st.info("No requests recorded in this window yet.")
+        else:
+            st.dataframe(stages.round(4), hide_index=True, use_container_width=True)
+            stage = st.selectbox("Histogram for", list(stages.stage))
+            values = metrics.stage_values(stage, since).seconds
+            counts = values.value_counts(bins=min(30, max(1, values.nunique())), sort=False)
+            counts.index = [f"≤{iv.right:.3f}s" for iv in counts.index]
+            st.bar_chart(counts.rename("requests"))
+
+        c1, c2 = st.columns(2)
+        with c1:
+            st.write("### Cache hit rates")
+            caches = metrics.cache_summary(since)
+            st.dataframe(caches.round(3), hide_index=True, use_container_width=True)
+        with c2:
+            st.write("### LLM calls")
+            llm = metrics.llm_summary(since)
+            st.dataframe(llm.round(3), hide_index=True, use_container_width=True)
+        tokens = metrics.llm_tokens_by_hour(since)
+        if not tokens.empty:
+            st.line_chart(tokens.set_index("hour")[["prompt_tokens", "output_tokens"]])
+
+        st.write("### Slowest SQL")
+        for row in metrics.slowest_sql(since).itertuples():
+            label = f"{row.seconds:.3f}s · {Path(row.db).name} · " + ("error" if row.error else f"{int(row.rows):,} rows")
+            with st.expander(f"{label} · {' '.join(row.sql.split())[:90]}"):
+                st.code(row.sql, language="sql")
+                if row.error:
+                    st.error(row.error)
+                elif Path(row.db).exists():
+                    try:
+                        st.code(metrics.explain(row.sql, row.db), language="text")
+                    except Exception as e:
+                        st.caption(f"No plan: {e}")
+
+        st.write("### DuckDB memory")
+        try:
+            st.dataframe(metrics.duckdb_memory(db_path).round(1), hide_index=True, use_container_width=True)
+        except Exception as e:
+            st.caption(f"`{db_entry['name']}`: {e}")
+        mem = metrics.memory_history(since)
+        if not mem.empty:
+            st.line_chart(mem.pivot_table(index="minute", columns="db", values="mb"))
+    except metrics.MetricsBusy as e:
+        st.warning(f"Metrics busy, try again in a moment: {e}")
+
+    st.write("### Profile one request")
+    st.toggle("Profile the next question", key="profile_next",
+              help=f"Runs your next chat question uncached under {metrics.METRICS_PROFILER} (METRICS_PROFILER).")
+    if st.session_state.get("profile_report"):
+        st.code(st.session_state["profile_report"], language="text")
+
 # =====================================================================================
 # ✅ TAB 2: KPI DASHBOARD
 # =====================================================================================
@@ -212,44 +389,44 @@ with tab2:
     <p class="app-subtitle">Fast metrics • Trends • Filters</p>
     """, unsafe_allow_html=True)
 
+    @st.cache_resource(show_spinner=False)
+    def _semantic_ready(db):
+        ensure_semantic_layer(db)
+        return True
+
     @st.cache_data(show_spinner=False)
-    def execq(sql):
-        con = duckdb.connect(str(DEFAULT_DB))
-        try:
-            return con.execute(sql).fetchdf()
-        finally:
-            con.close()
-
-    year = st.selectbox("Year", [2016, 2017, 2018], index=2)
-    state = st.text_input("Filter by State (optional)")
-    where = f"AND c.customer_state='{state}'" if state else ""
-
-    df = execq(f"""
-    SELECT
-      COUNT(*) AS orders,
-      SUM(i.price+i.freight_value) AS revenue,
-      AVG(CASE WHEN o.order_delivered_customer_date > o.order_estimated_delivery_date THEN 1 ELSE 0 END) AS late_rate
-    FROM orders o
-    JOIN items i ON i.order_id=o.order_id
-    JOIN customers c ON c.customer_id=o.customer_id
-    WHERE EXTRACT(YEAR FROM o.order_purchase_timestamp)={year} {where}
-    """)
+    def execq(db, ns, sql, params=()):
+        # ns (name@mtime) keys the cache, so a rebuilt database isn't served stale numbers
+        with connect(db) as con:
+            return con.execute(sql, list(params)).fetchdf()
+
+    st.caption(f"Database: `{db_entry['name']}`")
+    try:
+        if db_entry["kind"] == "duckdb":
+            _semantic_ready(db_path)  # lake catalogs get theirs when registered
+        with connect(db_path) as con:
+            con.execute("SELECT 1 FROM agg_monthly_state LIMIT 0")
+    except Exception as e:
+        st.info(f"No KPI rollups in `{db_entry['name']}`: {e}")
+        st.stop()
+    dash_ns = registry.cache_namespace(db_entry)
+
+    year = st.selectbox("Year", list(DASHBOARD_YEARS), index=len(DASHBOARD_YEARS) - 1)
+    state = st.text_input("Filter by State (optional)").strip().upper()
+    known = set(execq(db_path, dash_ns, *dashboard_queries(year)["states"]).customer_state)
+    if state and state not in known:
+        st.warning(f"Unknown state `{state}`; known codes: {', '.join(sorted(known))}. Showing all states.")
+        state = ""
+    dash = dashboard_queries(year, state)
+
+    df = execq(db_path, dash_ns, *dash["kpis"])
 
     col1, col2, col3 = st.columns(3)
     col1.metric("Orders", f"{int(df.orders[0]):,}")
     col2.metric("Revenue (BRL)", f"{df.revenue[0]:,.0f}")
-    col3.metric("Late Deliveries", f"{df.late_rate[0]*100:,.2f}%")
-
-    ts = execq(f"""
-    SELECT date_trunc('month', o.order_purchase_timestamp) AS month,
-           COUNT(*) AS orders,
-           SUM(i.price+i.freight_value) AS revenue
-    FROM orders o
-    JOIN items i ON i.order_id=o.order_id
-    JOIN customers c ON c.customer_id=o.customer_id
-    WHERE EXTRACT(YEAR FROM o.order_purchase_timestamp)={year} {where}
-    GROUP BY 1 ORDER BY 1;
-    """)
+    col3.metric("Late Deliveries", "—" if pd.isna(df.late_rate_pct[0]) else f"{df.late_rate_pct[0]:,.2f}%")
+
+    ts = execq(db_path, dash_ns, *dash["trend"])
 
     st.write("### Orders & Revenue Over Time")
     st.line_chart(ts.set_index("month")[["orders","revenue"]])
@@ -0,0 +1,282 @@
+# core/advisor.py
+# Workload-driven physical design advisor. Every query run through execute_sql is logged;
+# the advisor groups the log by join/filter pattern and recommends (optionally applies)
+# sort orders, ART indexes and a pre-joined wide table, then replays the workload to
+# report before/after latency.
+#
+#   python -m core.advisor [--db-path db/olist.duckdb] [--apply] [--kinds sort,index,wide]
+from __future__ import annotations
+import os
+import re
+import json
+import time
+import argparse
+import threading
+import statistics
+from collections import Counter, defaultdict
+from pathlib import Path
+
+from .sql_repair import _alias_map
+from .db import open_db
+from .semantic import FACT_TABLES
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+DEFAULT_DB = REPO_ROOT / "db" / "olist.duckdb"
+QUERY_LOG = Path(os.getenv("QUERY_LOG", str(REPO_ROOT / "data" / "cache" / "query_log.jsonl")))
+QUERY_LOG_ENABLED = os.getenv("QUERY_LOG_ENABLED", "1") == "1"
+# past this size the log rotates to <log>.1 (replacing the previous one): two files at most
+QUERY_LOG_MAX_MB = float(os.getenv("QUERY_LOG_MAX_MB", "20"))
+
+# share of logged query time a pattern needs before the advisor acts on it
+MIN_SHARE = float(os.getenv("ADVISOR_MIN_SHARE", "0.05"))
+# ART indexes serve point lookups, not hash joins: only equality-filter keys that are
+# near-unique (distinct / rows)
+MIN_DISTINCT_RATIO = float(os.getenv("ADVISOR_MIN_DISTINCT_RATIO", "0.8"))
+
+# pre-joined tables the advisor can materialise: name -> (tables covered, SELECT)
+WIDE_TABLES = {
+    "fact_order_items": ({"items", "orders", "customers", "products", "sellers", "product_category_translation"},
+                         FACT_TABLES["fact_order_items"]),
+}
+
+# --------------------------------------------------------------------------------------
+# Logging (called from execute_sql)
+# --------------------------------------------------------------------------------------
+_log_lock = threading.Lock()
+
+def log_query(sql: str, elapsed_s: float, rows: int | None, error: str | None = None):
+    if not QUERY_LOG_ENABLED:
+        return
+    rec = {"ts": time.time(), "sql": sql.strip(), "elapsed_s": round(elapsed_s, 4),
+           "rows": rows, "error": error}
+    try:
+        with _log_lock:
+            QUERY_LOG.parent.mkdir(parents=True, exist_ok=True)
+            if QUERY_LOG.exists() and QUERY_LOG.stat().st_size > QUERY_LOG_MAX_MB * 1024 * 1024:
+                os.replace(QUERY_LOG, _rotated(QUERY_LOG))
+            with QUERY_LOG.open("a", encoding="utf-8") as f:
+                f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+    except OSError:
+        pass
+
+def _rotated(path: Path) -> Path:
+    return path.with_name(path.name + ".1")
+
+def load_log(path: Path | str = QUERY_LOG) -> list[dict]:
+    path = Path(path)
+    lines = []
+    for p in (_rotated(path), path):  # older entries first
+        if p.exists():
+            lines += p.read_text(encoding="utf-8").splitlines()
+    out = []
+    for line in lines:
+        try:
+            rec = json.loads(line)
+        except ValueError:
+            continue
+        if not rec.get("error"):
+            out.append(rec)
+    return out
+
+# --------------------------------------------------------------------------------------
+# Pattern extraction
+# --------------------------------------------------------------------------------------
+_JOIN_ON_RE = re.compile(r"\b(\w+)\.(\w+)\s*=\s*(\w+)\.(\w+)")
+_USING_RE = re.compile(r"\bUSING\s*\(([^)]*)\)", re.I)
+_WHERE_RE = re.compile(r"\bWHERE\b(.*?)(?=\bGROUP\s+BY\b|\bORDER\s+BY\b|\bLIMIT\b|\bHAVING\b|\)\s*$|$)", re.I | re.S)
+_PRED_RE = re.compile(r"(?:\b(\w+)\.)?\b(\w+)\s*(=|<>|!=|<=|>=|<|>|\bBETWEEN\b|\bIN\b|\bLIKE\b)", re.I)
+_RANGE_OPS = {"<", ">", "<=", ">=", "BETWEEN"}
+
+def _catalog(con) -> tuple[dict[str, set[str]], set[str]]:
+    """table/view -> columns, and the set of base tables."""
+    cols = defaultdict(set)
+    for t, c in con.execute("SELECT table_name, column_name FROM duckdb_columns() WHERE NOT internal").fetchall():
+        cols[t.lower()].add(c.lower())
+    base = {r[0].lower() for r in con.execute(
+        "SELECT table_name FROM duckdb_tables() WHERE NOT internal AND NOT temporary").fetchall()}
+    return cols, base
+
+def analyze_sql(sql: str, catalog: dict[str, set[str]]) -> dict:
+    """Tables, join keys and filter columns of one query, resolved to table.column."""
+    aliases = {a: t.lower() for a, t in _alias_map(sql).items() if t.lower() in catalog}
+    tables = sorted(set(aliases.values()))
+
+    def owner(qual: str | None, col: str) -> str | None:
+        col = col.lower()
+        if qual:
+            t = aliases.get(qual.lower())
+            return t if t and col in catalog[t] else None
+        hits = [t for t in tables if col in catalog[t]]
+        return hits[0] if len(hits) == 1 else None
+
+    joins = set()
+    for qa, ca, qb, cb in _JOIN_ON_RE.findall(sql):
+        ta, tb = owner(qa, ca), owner(qb, cb)
+        if ta and tb and ta != tb:
+            joins.add(f"{ta}.{ca.lower()}"); joins.add(f"{tb}.{cb.lower()}")
+    for using in _USING_RE.findall(sql):
+        for col in (c.strip().lower() for c in using.split(",")):
+            joins.update(f"{t}.{col}" for t in tables if col in catalog[t])
+
+    eq, rng = set(), set()
+    for where in _WHERE_RE.findall(sql):
+        for qual, col, op in _PRED_RE.findall(where):
+            t = owner(qual or None, col)
+            if t:
+                (rng if op.upper() in _RANGE_OPS else eq).add(f"{t}.{col.lower()}")
+    return {"tables": tables, "joins": sorted(joins), "eq_filters": sorted(eq), "range_filters": sorted(rng)}
+
+def cluster(records: list[dict], catalog: dict[str, set[str]]) -> list[dict]:
+    """Group logged queries by (tables, join keys, filter columns); heaviest first."""
+    groups: dict[tuple, dict] = {}
+    for rec in records:
+        a = analyze_sql(rec["sql"], catalog)
+        if not a["tables"]:
+            continue
+        key = (tuple(a["tables"]), tuple(a["joins"]), tuple(a["eq_filters"]), tuple(a["range_filters"]))
+        g = groups.setdefault(key, {**a, "count": 0, "total_s": 0.0, "sqls": Counter()})
+        g["count"] += 1
+        g["total_s"] += rec.get("elapsed_s") or 0.0
+        g["sqls"][rec["sql"]] += 1
+    total = sum(g["total_s"] for g in groups.values()) or 1.0
+    for g in groups.values():
+        g["share"] = g["total_s"] / total
+    return sorted(groups.values(), key=lambda g: g["total_s"], reverse=True)
+
+# --------------------------------------------------------------------------------------
+# Recommendations
+# --------------------------------------------------------------------------------------
+def _distinct_ratio(con, table: str, column: str) -> float:
+    n, d = con.execute(f"SELECT COUNT(*), approx_count_distinct({column}) FROM {table}").fetchone()
+    return d / n if n else 0.0
+
+def recommend(clusters: list[dict], con, min_share: float = MIN_SHARE) -> list[dict]:
+    """[{kind, target, sql, reason, share}] — sort orders, ART indexes, wide tables."""
+    _, base_tables = _catalog(con)
+    weight = defaultdict(float)  # "kind:table.column" -> workload share
+    wide, wide_tables = defaultdict(float), defaultdict(set)
+    for g in clusters:
+        for col in g["range_filters"]:
+            weight[f"sort:{col}"] += g["share"]
+        for col in g["eq_filters"]:  # join keys are hash-joined: an index wouldn't be used
+            weight[f"index:{col}"] += g["share"]
+        for name, (covers, _) in WIDE_TABLES.items():
+            if len(g["tables"]) >= 3 and set(g["tables"]) <= covers:
+                wide[name] += g["share"]
+                wide_tables[name].update(g["tables"])
+
+    recs, sorted_tables = [], set()
+    for key, share in sorted(weight.items(), key=lambda kv: -kv[1]):
+        kind, col = key.split(":", 1)
+        table, column = col.split(".")
+        if share < min_share or table not in base_tables:
+            continue
+        if kind == "sort":
+            if table in sorted_tables:
+                continue  # one physical order per table: the heaviest range filter wins
+            sorted_tables.add(table)
+            recs.append({"kind": "sort", "target": col, "share": share,
+                         "reason": f"range filters on {col} ({share:.0%} of query time): zone maps skip row groups",
+                         "sql": f"CREATE OR REPLACE TABLE {table} AS SELECT * FROM {table} ORDER BY {column}"})
+        else:
+            ratio = _distinct_ratio(con, table, column)
+            if ratio < MIN_DISTINCT_RATIO:
+                continue  # low-cardinality: a scan with zone maps beats an index
+            recs.append({"kind": "index", "target": col, "share": share,
+                         "reason": f"equality filters on {col} ({share:.0%} of query time, {ratio:.0%} distinct)",
+                         "sql": f"CREATE INDEX IF NOT EXISTS idx_{table}_{column} ON {table} ({column})"})
+    for name, share in sorted(wide.items(), key=lambda kv: -kv[1]):
+        if share >= min_share:
+            recs.append({"kind": "wide", "target": name, "share": share,
+                         "reason": f"multi-way joins over {', '.join(sorted(wide_tables[name]))} "
+                                   f"({share:.0%} of query time) can read one pre-joined table",
+                         "sql": f"CREATE OR REPLACE TABLE {name} AS {WIDE_TABLES[name][1].strip()}"})
+    return recs
+
+def apply(recs: list[dict], con, kinds: set[str] = frozenset({"sort", "index", "wide"})) -> list[dict]:
+    """Apply recommendations in a safe order: re-sorting a table rebuilds it (dropping its
+       indexes), so sorts go first, then indexes, then wide tables."""
+    done = []
+    for kind in ("sort", "index", "wide"):
+        if kind not in kinds:
+            continue
+        for r in (r for r in recs if r["kind"] == kind):
+            con.execute(r["sql"])
+            done.append(r)
+    return done
+
+# --------------------------------------------------------------------------------------
+# Replay
+# --------------------------------------------------------------------------------------
+def replay(sqls: list[str], con, repeat: int = 3) -> dict[str, float | None]:
+    """Median warm latency per query (None if it no longer runs)."""
+    out = {}
+    for sql in sqls:
+        try:
+            con.execute(sql).fetchall()  # warm-up
+            times = []
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                con.execute(sql).fetchall()
+                times.append(time.perf_counter() - t0)
+            out[sql] = statistics.median(times)
+        except Exception:
+            out[sql] = None
+    return out
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--db-path", type=str, default=str(DEFAULT_DB))
+    ap.add_argument("--log", type=str, default=str(QUERY_LOG))
+    ap.add_argument("--apply", action="store_true", help="apply the recommendations and replay the workload")
+    ap.add_argument("--kinds", type=str, default="sort,index,wide")
+    ap.add_argument("--top", type=int, default=50, help="distinct queries to replay")
+    args = ap.parse_args()
+
+    records = load_log(args.log)
+    if not records:
+        print(f"No logged queries in {args.log}"); return
+    con = open_db(args.db_path, read_only=not args.apply)
+    catalog, _ = _catalog(con)
+    clusters = cluster(records, catalog)
+
+    print(f"{len(records)} queries, {len(clusters)} patterns\n")
+    for g in clusters[:10]:
+        print(f"{g['share']:>5.0%}  {g['count']:>4}x  tables={','.join(g['tables'])}"
+              f"  joins={','.join(g['joins']) or '-'}  filters={','.join(g['eq_filters'] + g['range_filters']) or '-'}")
+    recs = recommend(clusters, con)
+    print("\nRecommendations:")
+    for r in recs:
+        print(f"  [{r['kind']}] {r['target']}: {r['reason']}\n      {r['sql'].splitlines()[0]}")
+    if not args.apply:
+        return
+
+    counts = Counter(rec["sql"] for rec in records)
+    sqls = [s for s, _ in counts.most_common(args.top)]
+    before = replay(sqls, con)
+    applied = apply(recs, con, set(args.kinds.split(",")))
+    after = replay(sqls, con)
+    print(f"\nApplied {len(applied)} change(s). Replay of {len(sqls)} distinct queries (weighted by frequency):")
+    # totals only over queries that ran both times: one that fails after apply() is a breakage,
+    # not a 0 s speed-up
+    ok = [s for s in sqls if before[s] is not None and after[s] is not None]
+    tb = sum(before[s] * counts[s] for s in ok)
+    ta = sum(after[s] * counts[s] for s in ok)
+    for s in ok[:10]:
+        print(f"  {before[s] * 1000:8.1f} ms -> {after[s] * 1000:8.1f} ms  {' '.join(s.split())[:70]}")
+    print(f"  total {tb:.3f}s -> {ta:.3f}s ({(tb - ta) / tb:+.0%} saved) over {len(ok)} queries" if tb else "")
+    failed = [s for s in sqls if s not in ok]
+    if failed:
+        print(f"\n{len(failed)} query(ies) failed (not in the totals):")
+        for s in failed:
+            if before[s] is not None:
+                when = "after apply (broken by the changes)"
+            else:
+                when = "before apply" if after[s] is not None else "before and after"
+            print(f"  {when}: {' '.join(s.split())[:70]}")
+    if any(r["kind"] == "wide" for r in applied):
+        print("  (wide tables only speed up queries written against them; logged SQL is replayed unchanged)")
+    con.close()
+
+if __name__ == "__main__":
+    main()
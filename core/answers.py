@@ -0,0 +1,223 @@
+# core/answers.py
+# Answer store for the non-SQL intents, so glossary and category-name questions don't need
+# Gemini at request time:
+#   - glossary explanations (GLOSSARY), polished by the LLM once at build time (kept across
+#     rebuilds while the seed is unchanged; the seed itself when the LLM isn't available)
+#   - category-name translations from product_category_translation, both directions
+# Built into data/cache/answers.json by scripts/ingest.py or `python -m core.answers`, served
+# from an in-memory index (exact, then fuzzy match); misses go to the LLM and are kept in an
+# LRU (ANSWER_CACHE_SIZE).
+from __future__ import annotations
+import os
+import re
+import json
+import difflib
+import argparse
+import threading
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+
+from . import metrics
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+ANSWERS_PATH = Path(os.getenv("ANSWERS_PATH", str(REPO_ROOT / "data" / "cache" / "answers.json")))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "256"))       # LLM answers to misses
+ANSWER_FUZZY_CUTOFF = float(os.getenv("ANSWER_FUZZY_CUTOFF", "0.85"))  # difflib ratio for a fuzzy hit
+
+GLOSSARY = {  # term -> seed explanation
+    "freight value": "Shipping fee charged for delivering items for an order; in Olist it's the `freight_value` column on order items.",
+    "aov": "Average order value = total revenue / number of orders.",
+    "lead time": "Time between order placement and delivery to the customer.",
+    "sla": "Service Level Agreement: expected service quality/time (e.g., delivery time promise).",
+}
+ALIASES = {
+    "average order value": "aov",
+    "freight": "freight value",
+    "delivery lead time": "lead time",
+    "service level agreement": "sla",
+}
+
+_EXPLAIN_RE = re.compile(
+    r"^\s*(?:please\s+)?(?:explain|define|describe|what\s+(?:is|are|does)|what's|meaning\s+of)\s+"
+    r"(?:the\s+)?(?:term\s+)?(?P<term>.+?)(?:\s+mean)?\s*[?.!]*\s*$", re.I)
+_TRANSLATE_RE = re.compile(
+    r"^\s*(?:please\s+)?translate\b\s*:?\s*(?:from\s+\w+\s+)?(?P<text>.+?)"
+    r"(?:\s+(?:from\s+\w+\s+)?(?:to|into|in)\s+\w+)?\s*[.!]?\s*$", re.I)
+
+def _norm(text: str) -> str:
+    """lowercase, accents/quotes/punctuation dropped, _ and - as spaces."""
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode().lower()
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", text).split())
+
+# --------------------------------------------------------------------------------------
+# Build
+# --------------------------------------------------------------------------------------
+def _translations(db_path: Path | str | None) -> dict[str, dict[str, str]]:
+    from .db import connect
+    out = {"English": {}, "Portuguese": {}}
+    if db_path is None or not Path(db_path).exists():
+        return out
+    try:
+        with connect(db_path) as con:
+            rows = con.execute("SELECT product_category_name, product_category_name_english "
+                               "FROM product_category_translation").fetchall()
+    except Exception:
+        return out  # not an Olist database
+    for pt, en in rows:
+        if pt and en:
+            out["English"][pt], out["Portuguese"][en] = en, pt
+    return out
+
+def compile_answers(db_path: Path | str | None, explain=None, previous: dict | None = None) -> dict:
+    """explain(term, seed) -> text polishes glossary entries (None: use the seeds). Entries
+       already polished from the same seed in `previous` are reused, not re-asked."""
+    old = (previous or {}).get("terms", {})
+    terms = {}
+    for term, seed in GLOSSARY.items():
+        text = old[term]["text"] if old.get(term, {}).get("seed") == seed else None
+        if text is None and explain is not None:
+            try:
+                text = explain(term, seed)
+            except Exception:
+                text = None  # LLM unavailable: the seed answers until the next build
+        terms[term] = {"seed": seed, "text": text}
+    return {"built": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S UTC"),
+            "source": str(db_path) if db_path else None,
+            "terms": terms, "translations": _translations(db_path)}
+
+def _load(path: Path = ANSWERS_PATH) -> dict | None:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+def build(db_path: Path | str, explain=None, out: Path = ANSWERS_PATH) -> dict:
+    data = compile_answers(db_path, explain, previous=_load(out))
+    out.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out.with_suffix(".tmp")
+    tmp.write_text(json.dumps(data, indent=2, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, out)
+    return data
+
+# --------------------------------------------------------------------------------------
+# Store
+# --------------------------------------------------------------------------------------
+class AnswerStore:
+    def __init__(self, data: dict, cache_size: int = ANSWER_CACHE_SIZE):
+        self.terms = {_norm(t): e["text"] or e["seed"] for t, e in data.get("terms", {}).items()}
+        for alias, term in ALIASES.items():
+            if _norm(term) in self.terms:
+                self.terms[_norm(alias)] = self.terms[_norm(term)]
+        self.translations = {lang: {_norm(k): v for k, v in m.items()}
+                             for lang, m in data.get("translations", {}).items()}
+        self.hits = self.misses = 0
+        self._cache: OrderedDict[tuple, str] = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+
+    def _match(self, key: str, index: dict[str, str], substring: bool = False) -> str | None:
+        if key in index:
+            return index[key]
+        close = difflib.get_close_matches(key, index, n=1, cutoff=ANSWER_FUZZY_CUTOFF)
+        if close:
+            return index[close[0]]
+        if substring:  # "explain the freight value of an order" -> freight value
+            for k in sorted(index, key=len, reverse=True):
+                if re.search(rf"\b{re.escape(k)}\b", key):
+                    return index[k]
+        return None
+
+    def _lookup(self, kind: str, key: str, index: dict[str, str], substring: bool = False) -> str | None:
+        hit = self._match(key, index, substring)
+        with self._lock:
+            if hit is None and (kind, key) in self._cache:
+                self._cache.move_to_end((kind, key))
+                hit = self._cache[(kind, key)]
+            if hit is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        metrics.hit("answers", hit is not None)
+        return hit
+
+    def explain(self, message: str) -> str | None:
+        m = _EXPLAIN_RE.match(message)
+        return self._lookup("explain", _norm(m.group("term") if m else message), self.terms, substring=True)
+
+    def translate(self, message: str, target: str = "English") -> str | None:
+        m = _TRANSLATE_RE.match(message)
+        key = _norm(m.group("text") if m else message)
+        return self._lookup(f"translate:{target}", key, self.translations.get(target, {}))
+
+    def remember(self, kind: str, message: str, answer: str):
+        """Keep an LLM answer to a miss; kind is 'explain' or 'translate:<language>'."""
+        if kind == "explain":
+            m = _EXPLAIN_RE.match(message)
+            key = _norm(m.group("term") if m else message)
+        else:
+            m = _TRANSLATE_RE.match(message)
+            key = _norm(m.group("text") if m else message)
+        with self._lock:
+            self._cache[(kind, key)] = answer
+            self._cache.move_to_end((kind, key))
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+
+    def intent(self, message: str) -> str | None:
+        """The intent when it's unambiguous without the LLM: 'translate ...', or an explain
+           question whose whole subject is a glossary term ('what is AOV?', not 'what is
+           the AOV in 2018')."""
+        if re.match(r"^\s*(?:please\s+)?translate\b", message, re.I):
+            return "translate"
+        m = _EXPLAIN_RE.match(message)
+        if m and self._match(_norm(m.group("term")), self.terms) is not None:
+            return "explain_term"
+        return None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"terms": len(self.terms), "translations": sum(len(m) for m in self.translations.values()),
+                    "hits": self.hits, "misses": self.misses, "cached": len(self._cache)}
+
+_store: tuple[float, AnswerStore] | None = None
+_store_lock = threading.Lock()
+
+def get_store() -> AnswerStore:
+    """Process-wide store, reloaded when answers.json is rebuilt. Without the file, the
+       glossary seeds and the default database's translations."""
+    global _store
+    mtime = ANSWERS_PATH.stat().st_mtime if ANSWERS_PATH.exists() else 0.0
+    with _store_lock:
+        if _store is None or _store[0] != mtime:
+            data = _load() if mtime else None
+            if data is None:
+                from . import registry
+                data = compile_answers(registry.get(None)["path"])
+            _store = (mtime, AnswerStore(data))
+        return _store[1]
+
+# --------------------------------------------------------------------------------------
+# CLI
+# --------------------------------------------------------------------------------------
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--db-path", type=str, default=str(REPO_ROOT / "db" / "olist.duckdb"))
+    ap.add_argument("--no-llm", action="store_true", help="don't polish glossary entries with the LLM")
+    args = ap.parse_args()
+
+    explain = None
+    if not args.no_llm:
+        try:
+            from .orchestrator import llm_explain
+            explain = llm_explain
+        except Exception as e:  # e.g. no GEMINI_API_KEY
+            print(f"LLM unavailable ({e}); glossary seeds only")
+    data = build(args.db_path, explain)
+    polished = sum(1 for e in data["terms"].values() if e["text"])
+    print(f"✅ {ANSWERS_PATH}: {len(data['terms'])} glossary terms ({polished} polished), "
+          f"{len(data['translations']['English'])} category translations")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+# core/approx.py
+# Opt-in approximate query mode for exploratory questions.
+#   - COUNT/SUM/AVG over one large table are answered from a stratified sample built at
+#     ingest (sample_<table>, each row carrying its weight _w) or, failing that, from a
+#     TABLESAMPLE; aggregates are re-weighted and each gets a 95% error bound column.
+#   - Medians/quantiles over a large table use a sketch (approx_quantile, t-digest) on the
+#     full table, since quantiles don't scale from a sample.
+# Anything else (COUNT(DISTINCT), MIN/MAX, multi-table sampled joins, CTEs/subqueries) runs
+# exactly: DuckDB's approx_count_distinct (HLL) came out 7-17% low on our data, with no bound.
+#
+#   python -m core.approx --db-path db/olist.duckdb     (re-)build the samples
+from __future__ import annotations
+import os
+import re
+import json
+import argparse
+from functools import lru_cache
+from pathlib import Path
+
+from .sql_repair import _FROM_RE
+from .db import connect, open_db
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+DEFAULT_DB = REPO_ROOT / "db" / "olist.duckdb"
+
+APPROX_SAMPLE_PCT = float(os.getenv("APPROX_SAMPLE_PCT", "10"))
+APPROX_MIN_ROWS = int(os.getenv("APPROX_MIN_ROWS", "200000"))        # smaller tables: exact is fast enough
+APPROX_MIN_PER_STRATUM = int(os.getenv("APPROX_MIN_PER_STRATUM", "200"))
+SAMPLE_PREFIX = "sample_"
+
+# table -> strata; each stratum gets ~APPROX_SAMPLE_PCT of its rows, at least ~APPROX_MIN_PER_STRATUM
+SAMPLES = {
+    "fact_order_items": ["customer_state"],
+    "sem_orders": ["customer_state"],
+    "orders": ["order_status"],
+    "items": [],
+}
+
+# --------------------------------------------------------------------------------------
+# Sample tables (built at ingest)
+# --------------------------------------------------------------------------------------
+def sample_sql(table: str, strata: list[str], pct: float = APPROX_SAMPLE_PCT,
+               min_rows: int = APPROX_MIN_PER_STRATUM) -> str:
+    keys = ", ".join(strata) if strata else "NULL"
+    on = " AND ".join(f"a.{s} IS NOT DISTINCT FROM r.{s}" for s in strata) or "TRUE"
+    return f"""
+WITH alloc AS (
+  SELECT {keys + ',' if strata else ''} COUNT(*) AS _n,
+         LEAST(COUNT(*), GREATEST(CEIL(COUNT(*) * {pct} / 100.0), {min_rows})) AS _k
+  FROM {table} GROUP BY ALL
+),
+picked AS (
+  -- Bernoulli draw at rate _k/_n per stratum: streams (no ranking of every row) and so stays
+  -- within memory_limit at any scale; the draw is a column of r so it isn't pushed into alloc
+  SELECT r.* EXCLUDE (_u), a._n AS _n
+  FROM (SELECT *, random() AS _u FROM {table}) r JOIN alloc a ON {on}
+  WHERE r._u < a._k / a._n
+)
+-- weights calibrated to the realised stratum size, so weighted counts stay exact
+SELECT * EXCLUDE (_n), _n::DOUBLE / COUNT(*) OVER (PARTITION BY {keys}) AS _w FROM picked""".strip()
+
+def build_samples(db_path: Path | str = DEFAULT_DB, pct: float = APPROX_SAMPLE_PCT):
+    con = open_db(db_path)
+    try:
+        con.execute("SELECT setseed(0.42)")  # reproducible samples across rebuilds
+        have = {r[0] for r in con.execute("SELECT table_name FROM information_schema.tables").fetchall()}
+        for table, strata in SAMPLES.items():
+            if table in have:
+                con.execute(f"CREATE OR REPLACE TABLE {SAMPLE_PREFIX}{table} AS {sample_sql(table, strata, pct)}")
+    finally:
+        con.close()
+    _catalog.cache_clear()
+
+@lru_cache(maxsize=16)
+def _catalog(db_path: str) -> tuple[dict[str, int], frozenset[str]]:
+    """(row estimate per table, tables with a pre-built sample)."""
+    with connect(db_path) as con:
+        sizes = {t: n for t, n in con.execute(
+            "SELECT table_name, estimated_size FROM duckdb_tables() WHERE NOT internal").fetchall()}
+    sampled = frozenset(t[len(SAMPLE_PREFIX):] for t in sizes if t.startswith(SAMPLE_PREFIX))
+    if "sem_orders" in sampled and "orders" in sizes:
+        sizes["sem_orders"] = sizes["orders"]  # a view: size it by its base table
+    return sizes, sampled
+
+# --------------------------------------------------------------------------------------
+# Rewrite
+# --------------------------------------------------------------------------------------
+_AGG_RE = re.compile(r"\b(SUM|COUNT|AVG|MIN|MAX|MEDIAN|QUANTILE_CONT|QUANTILE_DISC|PERCENTILE_CONT|"
+                     r"PERCENTILE_DISC|QUANTILE|APPROX_QUANTILE|APPROX_COUNT_DISTINCT)\s*\(", re.I)
+
+def _calls(sql: str) -> list[tuple[int, int, str, str]]:
+    """Aggregate calls as (start, end, NAME, inner text), innermost-last order."""
+    out = []
+    for m in _AGG_RE.finditer(sql):
+        depth, i = 1, m.end()
+        while i < len(sql) and depth:
+            depth += {"(": 1, ")": -1}.get(sql[i], 0)
+            i += 1
+        out.append((m.start(), i, m.group(1).upper(), sql[m.end():i - 1]))
+    return out
+
+def _split_top(text: str, sep: str = ",") -> list[str]:
+    parts, depth, cur = [], 0, ""
+    for ch in text:
+        depth += {"(": 1, ")": -1}.get(ch, 0)
+        if ch == sep and depth == 0:
+            parts.append(cur); cur = ""
+        else:
+            cur += ch
+    return parts + [cur]
+
+def _sketches(sql: str) -> str:
+    """MEDIAN/quantiles -> approx_quantile."""
+    for start, end, name, inner in reversed(_calls(sql)):
+        args = _split_top(inner)
+        if name == "MEDIAN" and len(args) == 1:
+            new = f"approx_quantile({inner}, 0.5)"
+        elif name in ("QUANTILE_CONT", "QUANTILE_DISC", "QUANTILE") and len(args) == 2:
+            new = f"approx_quantile({inner})"
+        else:
+            continue
+        sql = sql[:start] + new + sql[end:]
+    return sql
+
+def _weighted(name: str, inner: str, w: str) -> str | None:
+    if name == "COUNT":
+        return f"SUM({w})" if inner.strip() == "*" else f"SUM(CASE WHEN ({inner}) IS NOT NULL THEN {w} END)"
+    if name == "SUM":
+        return f"SUM(({inner}) * {w})"
+    if name == "AVG":
+        return f"(SUM(({inner}) * {w}) / SUM(CASE WHEN ({inner}) IS NOT NULL THEN {w} END))"
+    return None
+
+def _std_error(name: str, inner: str, w: str) -> str | None:
+    # Horvitz-Thompson variance for totals; plain sample variance for means
+    if name == "COUNT" and inner.strip() == "*":
+        return f"sqrt(SUM({w} * ({w} - 1)))"
+    if name == "SUM":
+        return f"sqrt(SUM({w} * ({w} - 1) * ({inner}) * ({inner})))"
+    if name == "AVG":
+        return (f"sqrt(greatest(SUM({w} * ({inner}) * ({inner})) / SUM(CASE WHEN ({inner}) IS NOT NULL THEN {w} END)"
+                f" - pow(SUM(({inner}) * {w}) / SUM(CASE WHEN ({inner}) IS NOT NULL THEN {w} END), 2), 0)"
+                f" / COUNT({inner}))")
+    return None
+
+def _top_from(sql: str) -> int | None:
+    depth = 0
+    for m in re.finditer(r"\(|\)|\bFROM\b", sql, re.I):
+        tok = m.group(0)
+        if tok == "(":
+            depth += 1
+        elif tok == ")":
+            depth -= 1
+        elif depth == 0:
+            return m.start()
+    return None
+
+def rewrite(sql: str, db_path: Path | str, pct: float = APPROX_SAMPLE_PCT) -> tuple[str, dict]:
+    """Approximate version of `sql` and a description of what was done
+       ({"mode": "exact" | "sketch" | "sample", ...})."""
+    sql = sql.strip().rstrip(";")
+    sizes, sampled = _catalog(str(db_path))
+    refs = [(m.group(1), m.group(2), m.start(1), m.end(2) if m.group(2) else m.end(1))
+            for m in _FROM_RE.finditer(sql)]
+    big = [r for r in refs if sizes.get(r[0].lower(), 0) >= APPROX_MIN_ROWS]
+    if not big:
+        return sql, {"mode": "exact", "reason": "no table above APPROX_MIN_ROWS"}
+    sketched = _sketches(sql)
+    info = {"mode": "sketch" if sketched != sql else "exact"}
+
+    if len(re.findall(r"\bSELECT\b", sql, re.I)) != 1:
+        return sketched, {**info, "reason": "subqueries/CTEs run exactly"}
+    if len(big) != 1:
+        return sketched, {**info, "reason": "joins between large tables run exactly"}
+    calls = _calls(sql)
+    if not calls or any(_weighted(name, inner, "w") is None or re.match(r"\s*DISTINCT\b", inner, re.I)
+                        for _, _, name, inner in calls):
+        return sketched, {**info, "reason": "only COUNT/SUM/AVG are estimated from samples"}
+
+    table, alias, start, end = big[0]
+    ref = alias or table
+    w = f"{ref}._w"
+    if table.lower() in sampled:
+        source, how = f"{SAMPLE_PREFIX}{table.lower()} AS {ref}", "stratified sample"
+    else:
+        n = sizes[table.lower()]
+        source = (f"(SELECT *, {n}::DOUBLE / COUNT(*) OVER () AS _w FROM {table} "
+                  f"USING SAMPLE {pct} PERCENT (system)) AS {ref}")
+        how = "TABLESAMPLE"
+
+    # error-bound columns for plain "AGG(x) AS name" select items
+    head = sql[:_top_from(sql)]
+    select_list = re.sub(r"^\s*SELECT\s+(DISTINCT\s+)?", "", head, flags=re.I)
+    bounds = []
+    for item in _split_top(select_list):
+        m = re.fullmatch(r"\s*(SUM|COUNT|AVG)\s*\((.*)\)\s+AS\s+(\w+)\s*", item, re.I | re.S)
+        if m and _std_error(m.group(1).upper(), m.group(2), w):
+            bounds.append(f"1.96 * {_std_error(m.group(1).upper(), m.group(2), w)} AS {m.group(3)}_ci95")
+
+    out = sql
+    for s, e, name, inner in reversed(calls):
+        if s >= end:
+            out = out[:s] + _weighted(name, inner, w) + out[e:]
+    out = out[:start] + source + out[end:]
+    for s, e, name, inner in reversed([c for c in calls if c[0] < start]):
+        out = out[:s] + _weighted(name, inner, w) + out[e:]
+    if bounds:
+        pos = _top_from(out)
+        out = out[:pos].rstrip() + ",\n       " + ",\n       ".join(bounds) + "\n" + out[pos:]
+    return out, {"mode": "sample", "source": how, "table": table, "pct": pct,
+                 "bounds": [b.rsplit(" AS ", 1)[1] for b in bounds]}
+
+def annotate(table, info: dict):
+    """Attach the approximation info to a pyarrow Table's schema metadata."""
+    return table.replace_schema_metadata({**(table.schema.metadata or {}), b"approx": json.dumps(info).encode()})
+
+def approx_info(table) -> dict | None:
+    meta = (table.schema.metadata or {}) if table is not None else {}
+    return json.loads(meta[b"approx"]) if b"approx" in meta else None
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--db-path", type=str, default=str(DEFAULT_DB))
+    ap.add_argument("--pct", type=float, default=APPROX_SAMPLE_PCT)
+    args = ap.parse_args()
+    build_samples(args.db_path, args.pct)
+    print(f"✅ Samples built in {args.db_path}: {', '.join(SAMPLE_PREFIX + t for t in SAMPLES)}")
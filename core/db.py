@@ -0,0 +1,144 @@
+# core/db.py
+# DuckDB connection pooling. One long-lived base connection per database file keeps the
+# database instance (and its buffer cache) alive between queries; callers get cheap
+# cursors on it, bounded by a per-database semaphore.
+# Every database is opened with the out-of-core settings below: past DUCKDB_MEMORY_LIMIT,
+# sorts/joins/aggregates spill to DUCKDB_TEMP_DIR instead of failing.
+# Pools are read-only (other processes can still read, and nothing here can write) and, unless
+# the database itself reads files (Parquet lake catalogs), can't touch the filesystem either:
+# enable_external_access=false, then the configuration is locked. Writers (ingest, semantic
+# layer, samples) use open_db, which closes this process's pool on that file first.
+from __future__ import annotations
+import os
+import itertools
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+import duckdb
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+DUCKDB_MEMORY_LIMIT = os.getenv("DUCKDB_MEMORY_LIMIT", "")   # e.g. "2GB"; "" = DuckDB default (80% of RAM)
+DUCKDB_TEMP_DIR = os.getenv("DUCKDB_TEMP_DIR", "")           # "" = DuckDB default (<db file>.tmp)
+DUCKDB_THREADS = int(os.getenv("DUCKDB_THREADS", "0"))       # 0 = one per core
+# Memory-bounded mode for small containers: DuckDB gets 40% of the budget unless
+# DUCKDB_MEMORY_LIMIT is set (its sorts/joins allocate a few hundred MB beyond memory_limit,
+# and Python needs the rest), and results/caches are capped (RESULT_MAX_ROWS etc.)
+MEMORY_BUDGET_MB = int(os.getenv("MEMORY_BUDGET_MB", "0"))   # 0 = unbounded
+RESULT_MAX_ROWS = int(os.getenv("RESULT_MAX_ROWS", "100000" if MEMORY_BUDGET_MB else "0"))  # 0 = no cap
+
+def duckdb_settings() -> dict:
+    s = {}
+    limit = DUCKDB_MEMORY_LIMIT or (f"{MEMORY_BUDGET_MB * 2 // 5}MB" if MEMORY_BUDGET_MB else "")
+    if limit:
+        s["memory_limit"] = limit
+    if DUCKDB_TEMP_DIR:
+        s["temp_directory"] = DUCKDB_TEMP_DIR
+    if DUCKDB_THREADS:
+        s["threads"] = DUCKDB_THREADS
+    return s
+
+def configure(con, **overrides):
+    """Apply the out-of-core settings (plus `overrides`) to the database behind `con`."""
+    for k, v in {**duckdb_settings(), **overrides}.items():
+        con.execute(f"SET {k} = {v!r}" if isinstance(v, str) else f"SET {k} = {v}")
+    return con
+
+def open_db(db_path: Path | str, read_only: bool = False, **overrides):
+    """Unpooled connection with the out-of-core settings, for ingest/build jobs; caller closes it."""
+    if not read_only:
+        release_pool(db_path)  # DuckDB won't open a file read-write while it's open read-only
+    return configure(duckdb.connect(str(db_path), read_only=read_only), **overrides)
+
+_versions = itertools.count(1)
+
+class ConnectionPool:
+    def __init__(self, db_path: Path | str, size: int = DB_POOL_SIZE, external_access: bool = False):
+        self.db_path = str(db_path)
+        self.inode = os.stat(self.db_path).st_ino  # a rebuilt file is swapped in (scripts/ingest.py)
+        self._base = open_db(self.db_path, read_only=True)
+        if not external_access:
+            self._base.execute("SET enable_external_access = false")
+        self._base.execute("SET lock_configuration = true")
+        self._sem = threading.BoundedSemaphore(size)
+        self._attached: dict[str, str] = {}
+        self._attach_lock = threading.Lock()
+        self.version = next(_versions)  # changes with the catalog (new pool, ATTACH); keys catalog caches
+
+    @contextmanager
+    def connection(self):
+        with self._sem:
+            cur = self._base.cursor()
+            try:
+                yield cur
+            finally:
+                cur.close()
+
+    def cursor(self):
+        """Long-lived, unpooled connection (e.g. a chat session's private views); caller closes it."""
+        return self._base.cursor()
+
+    def attach(self, other: Path | str, alias: str):
+        """ATTACH another database read-only under `alias`; visible to every cursor of this pool."""
+        with self._attach_lock:
+            if self._attached.get(alias) == str(other):
+                return
+            cur = self._base.cursor()
+            try:
+                if alias in self._attached:
+                    cur.execute(f"DETACH {alias}")
+                cur.execute(f"ATTACH '{Path(other).as_posix()}' AS {alias} (READ_ONLY)")
+            finally:
+                cur.close()
+            self._attached[alias] = str(other)
+            self.version = next(_versions)
+
+    def close(self):
+        self._base.close()
+
+_pools: dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+_external: set[str] = set()
+
+def allow_external_access(db_path: Path | str):
+    """Let the pool on `db_path` read files (views over Parquet, ATTACHed databases)."""
+    _external.add(str(Path(db_path).resolve()))
+
+def get_pool(db_path: Path | str) -> ConnectionPool:
+    key = str(Path(db_path).resolve())
+    with _pools_lock:
+        try:
+            inode = os.stat(key).st_ino
+        except FileNotFoundError:
+            raise FileNotFoundError(f"DuckDB not found: {db_path}") from None
+        pool = _pools.get(key)
+        if pool is not None and pool.inode != inode:
+            pool.close()  # replaced by a rebuild: serve the new file
+            pool = None
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(key, external_access=key in _external)
+        return pool
+
+def release_pool(db_path: Path | str):
+    """Close this process's pool on `db_path` (reopened on next use), e.g. before writing to it."""
+    with _pools_lock:
+        pool = _pools.pop(str(Path(db_path).resolve()), None)
+    if pool is not None:
+        pool.close()
+
+def pool_paths() -> list[str]:
+    """Database files this process has a pool on."""
+    with _pools_lock:
+        return list(_pools)
+
+@contextmanager
+def connect(db_path: Path | str):
+    """Pooled connection (cursor) to `db_path`; use instead of duckdb.connect for reads."""
+    with get_pool(db_path).connection() as con:
+        yield con
+
+def close_pools():
+    with _pools_lock:
+        for p in _pools.values():
+            p.close()
+        _pools.clear()
@@ -0,0 +1,221 @@
+# core/executor.py
+# Execution service: runs agent work (LLM + DuckDB) on a shared thread pool instead of
+# the Streamlit script thread, with per-user concurrency limits, cancel-on-new-question
+# and a result cache shared by every session in the process (one LRU per database
+# namespace, see core/registry.py, so one busy database can't evict another's answers).
+from __future__ import annotations
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from . import metrics
+from .db import MEMORY_BUDGET_MB
+
+EXEC_WORKERS = int(os.getenv("EXEC_WORKERS", "8"))
+EXEC_PER_USER = int(os.getenv("EXEC_PER_USER", "1"))
+EXEC_CACHE_SIZE = int(os.getenv("EXEC_CACHE_SIZE", "32" if MEMORY_BUDGET_MB else "256"))
+EXEC_CACHE_TTL_S = float(os.getenv("EXEC_CACHE_TTL_S", "900"))
+EXEC_CACHE_NAMESPACES = int(os.getenv("EXEC_CACHE_NAMESPACES", "16"))  # least recently used dropped
+
+# --------------------------------------------------------------------------------------
+# Cancellation
+# --------------------------------------------------------------------------------------
+class Cancelled(Exception):
+    """Raised inside a job (and by its future) once the job has been superseded."""
+
+class CancelToken:
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._cons = set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def check(self):
+        if self._event.is_set():
+            raise Cancelled()
+
+    def cancel(self):
+        self._event.set()
+        with self._lock:
+            cons = list(self._cons)
+        for con in cons:  # abort running DuckDB queries
+            try: con.interrupt()
+            except Exception: pass
+
+    def attach(self, con):
+        with self._lock:
+            self._cons.add(con)
+        if self.cancelled:
+            con.interrupt()
+
+    def detach(self, con):
+        with self._lock:
+            self._cons.discard(con)
+
+_local = threading.local()
+
+def current_token() -> CancelToken | None:
+    """Token of the job running on this thread (None outside the service)."""
+    return getattr(_local, "token", None)
+
+# --------------------------------------------------------------------------------------
+# Service
+# --------------------------------------------------------------------------------------
+class ExecutionService:
+    def __init__(self, workers: int = EXEC_WORKERS, per_user: int = EXEC_PER_USER,
+                 cache_size: int = EXEC_CACHE_SIZE, cache_ttl_s: float = EXEC_CACHE_TTL_S):
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="agent")
+        self._per_user = per_user
+        self._lock = threading.Lock()
+        self._user_sems: dict[str, threading.Semaphore] = {}
+        self._active: dict[str, list[tuple[Future, CancelToken]]] = {}
+        self._caches: OrderedDict[str, OrderedDict] = OrderedDict()
+        self._cache_size, self._cache_ttl = cache_size, cache_ttl_s
+        self._stats = {"submitted": 0, "completed": 0, "cancelled": 0, "failed": 0, "cache_hits": 0}
+
+    def submit(self, user: str, fn, *args, cache_key=None, cache_ns: str = "", cancel_previous: bool = True,
+               **kwargs) -> Future:
+        """Queue fn(*args, **kwargs) for `user`. A new submission cancels the user's
+           unfinished jobs; results with a cache_key are shared across sessions
+           within the cache namespace `cache_ns` (per database)."""
+        with self._lock:
+            self._stats["submitted"] += 1
+        if cancel_previous:
+            self.cancel(user)
+
+        hit = self._cache_get(cache_ns, cache_key)
+        if cache_key is not None:
+            metrics.hit("result", hit is not None)
+        if hit is not None:
+            fut = Future()
+            fut.set_result(hit)
+            return fut
+
+        token = CancelToken()
+        fut = self._pool.submit(self._run, user, token, fn, args, kwargs, (cache_ns, cache_key), time.perf_counter())
+        with self._lock:
+            self._active.setdefault(user, []).append((fut, token))
+        fut.add_done_callback(lambda f: self._finished(user, f))
+        return fut
+
+    def cancel(self, user: str) -> int:
+        with self._lock:
+            jobs = self._active.pop(user, [])
+        n = 0
+        for fut, token in jobs:
+            if not fut.done():
+                token.cancel()
+                fut.cancel()  # no-op once running; the token stops it instead
+                n += 1
+        return n
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "cached": sum(len(c) for c in self._caches.values()),
+                    "namespaces": len(self._caches),
+                    "active": sum(len(v) for v in self._active.values())}
+
+    def prime(self, cache_ns: str, cache_key, value):
+        """Store a precomputed result (core/warmup.py) as if a job had produced it."""
+        self._cache_put(cache_ns, cache_key, value)
+
+    def invalidate(self, cache_ns: str) -> int:
+        """Drop a namespace's cached results (e.g. after its database was rebuilt)."""
+        with self._lock:
+            return len(self._caches.pop(cache_ns, {}))
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+
+    # ---- internals ----
+    def _user_sem(self, user: str) -> threading.Semaphore:
+        with self._lock:
+            if user not in self._user_sems:
+                self._user_sems[user] = threading.Semaphore(self._per_user)
+            return self._user_sems[user]
+
+    def _run(self, user, token, fn, args, kwargs, cache_at, queued_at):
+        with self._user_sem(user):
+            metrics.record("stage", "queue", time.perf_counter() - queued_at)
+            token.check()
+            _local.token = token
+            try:
+                with metrics.timed("request"):
+                    res = fn(*args, **kwargs)
+            finally:
+                _local.token = None
+        token.check()  # superseded while running: drop the result
+        self._cache_put(*cache_at, res)
+        return res
+
+    def _finished(self, user: str, fut: Future):
+        with self._lock:
+            jobs = self._active.get(user)
+            if jobs:
+                self._active[user] = [j for j in jobs if j[0] is not fut]
+                if not self._active[user]:
+                    del self._active[user]
+            if fut.cancelled():
+                self._stats["cancelled"] += 1
+            elif isinstance(fut.exception(), Cancelled):
+                self._stats["cancelled"] += 1
+            elif fut.exception() is not None:
+                self._stats["failed"] += 1
+            else:
+                self._stats["completed"] += 1
+
+    def _cache_get(self, ns, key):
+        if key is None:
+            return None
+        with self._lock:
+            cache = self._caches.get(ns)
+            item = cache.get(key) if cache is not None else None
+            if item is None:
+                return None
+            ts, value = item
+            if time.monotonic() - ts > self._cache_ttl:
+                del cache[key]
+                return None
+            cache.move_to_end(key)
+            self._caches.move_to_end(ns)
+            self._stats["cache_hits"] += 1
+            return value
+
+    def _cache_put(self, ns, key, value):
+        if key is None or not _cacheable(value):
+            return
+        with self._lock:
+            cache = self._caches.setdefault(ns, OrderedDict())
+            self._caches.move_to_end(ns)
+            cache[key] = (time.monotonic(), value)
+            cache.move_to_end(key)
+            while len(cache) > self._cache_size:
+                cache.popitem(last=False)
+            while len(self._caches) > EXEC_CACHE_NAMESPACES:
+                self._caches.popitem(last=False)
+
+def answer_key(question: str, schema_path, db_path, context_key: str = "", approx: bool = False) -> tuple:
+    """Result-cache key of a chat answer (app, API and warm-up must agree on it)."""
+    return (" ".join(question.lower().split()), str(schema_path), str(db_path), context_key, approx)
+
+def _cacheable(value) -> bool:
+    # handle_message returns (markdown, extras); don't pin errors in the shared cache
+    if isinstance(value, tuple) and len(value) == 2 and isinstance(value[1], dict):
+        return not value[1].get("error")
+    return value is not None
+
+_service: ExecutionService | None = None
+_service_lock = threading.Lock()
+
+def get_service() -> ExecutionService:
+    """Process-wide service, shared by all Streamlit sessions."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = ExecutionService()
+        return _service
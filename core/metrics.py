@@ -0,0 +1,274 @@
+# core/metrics.py
+# Production metrics for the Performance tab (app/main.py): per-stage latencies, cache hits,
+# LLM calls and token usage, SQL runs and DuckDB memory. record() only appends to an
+# in-memory ring buffer (METRICS_BUFFER events, oldest dropped if the writer falls behind);
+# a background thread writes the buffer to the `metrics` table of METRICS_DB in batches
+# every METRICS_FLUSH_S seconds (sooner past METRICS_FLUSH_ROWS events), and prunes events
+# older than METRICS_RETENTION_DAYS. Each flush opens the file briefly, so several processes
+# (app, API) can share it.
+#
+#   kind    name                         value        attrs
+#   stage   queue/request/validate/      seconds      execute: sql, db, rows, error
+#           execute
+#   cache   result/template/sql_memo/    1 hit, 0 miss
+#           answers
+#   llm     intent/sql/repair/explain/   seconds      prompt_tokens, output_tokens
+#           translate
+#   memory  <database file>              bytes
+#
+# Reads open the file read-only and retry with backoff while another process holds its lock
+# (METRICS_READ_RETRIES); past that they raise MetricsBusy.
+#
+# profile(fn, ...) runs one call under cProfile (or pyinstrument, METRICS_PROFILER) and
+# returns its report alongside the result.
+from __future__ import annotations
+import io
+import os
+import json
+import time
+import atexit
+import pstats
+import cProfile
+import threading
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+import duckdb
+import pyarrow as pa
+
+from .db import open_db, connect, pool_paths
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+METRICS_DB = Path(os.getenv("METRICS_DB", str(REPO_ROOT / "data" / "cache" / "metrics.duckdb")))
+METRICS_BUFFER = int(os.getenv("METRICS_BUFFER", "20000"))
+METRICS_FLUSH_S = float(os.getenv("METRICS_FLUSH_S", "5"))
+METRICS_FLUSH_ROWS = int(os.getenv("METRICS_FLUSH_ROWS", "1000"))
+METRICS_RETENTION_DAYS = float(os.getenv("METRICS_RETENTION_DAYS", "14"))
+METRICS_READ_RETRIES = int(os.getenv("METRICS_READ_RETRIES", "5"))  # backoff 0.05s, 0.1s, 0.2s, ...
+METRICS_PROFILER = os.getenv("METRICS_PROFILER", "cprofile")  # or "pyinstrument" (if installed)
+
+_buf: deque = deque(maxlen=METRICS_BUFFER)
+_wake = threading.Event()
+_io_lock = threading.Lock()  # one writer/reader of METRICS_DB per process
+_flusher: threading.Thread | None = None
+_started = threading.Lock()
+_pruned = 0.0
+
+class MetricsBusy(Exception):
+    """METRICS_DB stayed locked by another process through every retry."""
+
+_SCHEMA = pa.schema([("ts", pa.timestamp("us", tz="UTC")), ("kind", pa.string()), ("name", pa.string()),
+                     ("value", pa.float64()), ("attrs", pa.string())])
+
+# --------------------------------------------------------------------------------------
+# Recording (hot path: an append)
+# --------------------------------------------------------------------------------------
+def record(kind: str, name: str, value: float, **attrs):
+    if not METRICS_ENABLED:
+        return
+    _buf.append((time.time(), kind, name, float(value), attrs or None))
+    if _flusher is None:
+        _start()
+    if len(_buf) >= METRICS_FLUSH_ROWS:
+        _wake.set()
+
+@contextmanager
+def timed(stage: str, **attrs):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record("stage", stage, time.perf_counter() - t0, **attrs)
+
+def hit(cache: str, ok: bool):
+    record("cache", cache, 1.0 if ok else 0.0)
+
+def llm_call(purpose: str, fn, *args, **kwargs):
+    """fn(*args, **kwargs) is a Gemini generate_content call; records its latency and tokens."""
+    t0 = time.perf_counter()
+    res = fn(*args, **kwargs)
+    usage = getattr(res, "usage_metadata", None)
+    record("llm", purpose, time.perf_counter() - t0,
+           prompt_tokens=getattr(usage, "prompt_token_count", None),
+           output_tokens=getattr(usage, "candidates_token_count", None))
+    return res
+
+# --------------------------------------------------------------------------------------
+# Writing
+# --------------------------------------------------------------------------------------
+def _start():
+    global _flusher
+    with _started:
+        if _flusher is None:
+            _flusher = threading.Thread(target=_loop, name="metrics", daemon=True)
+            _flusher.start()
+            atexit.register(flush)
+
+def _loop():
+    while True:
+        _wake.wait(METRICS_FLUSH_S)
+        _wake.clear()
+        try:
+            flush(sample_memory=True)
+        except Exception:
+            pass  # metrics never break the app
+
+def _sample_memory():
+    for path in pool_paths():
+        try:
+            with connect(path) as con:
+                used = con.execute("SELECT sum(memory_usage_bytes) FROM duckdb_memory()").fetchone()[0]
+            record("memory", Path(path).name, used or 0)
+        except Exception:
+            pass
+
+def _ensure(con):
+    con.execute("CREATE TABLE IF NOT EXISTS metrics (ts TIMESTAMPTZ, kind VARCHAR, name VARCHAR, "
+                "value DOUBLE, attrs JSON)")
+
+def flush(sample_memory: bool = False) -> int:
+    """Write buffered events to METRICS_DB; returns how many. Kept in the buffer if the file
+       is busy (another process flushing)."""
+    global _pruned
+    if sample_memory:
+        _sample_memory()
+    rows = []
+    while _buf:
+        try:
+            rows.append(_buf.popleft())
+        except IndexError:
+            break
+    if not rows:
+        return 0
+    batch = pa.Table.from_pylist(
+        [{"ts": datetime.fromtimestamp(ts, timezone.utc), "kind": k, "name": n, "value": v,
+          "attrs": json.dumps(a, default=str) if a else None} for ts, k, n, v, a in rows], schema=_SCHEMA)
+    try:
+        with _io_lock:
+            METRICS_DB.parent.mkdir(parents=True, exist_ok=True)
+            con = open_db(METRICS_DB)
+            try:
+                _ensure(con)
+                con.register("batch", batch)
+                con.execute("INSERT INTO metrics SELECT * FROM batch")
+                if time.time() - _pruned > 3600:
+                    con.execute(f"DELETE FROM metrics WHERE ts < now() - INTERVAL {METRICS_RETENTION_DAYS * 86400:.0f} SECOND")
+                    _pruned = time.time()
+            finally:
+                con.close()
+    except Exception:
+        # retry next time: put back the newest rows that fit ahead of what arrived meanwhile
+        # (extendleft on a full ring would evict from the right, i.e. the newest events)
+        room = _buf.maxlen - len(_buf)
+        _buf.extendleft(reversed(rows[-room:] if room > 0 else []))
+        return 0
+    return len(rows)
+
+# --------------------------------------------------------------------------------------
+# Reading (Performance tab)
+# --------------------------------------------------------------------------------------
+def query(sql: str, params=()):
+    """Run `sql` over the metrics table (after writing what's buffered); a pandas DataFrame."""
+    flush()
+    delay = 0.05
+    for attempt in range(METRICS_READ_RETRIES + 1):
+        try:
+            with _io_lock:
+                if not METRICS_DB.exists():
+                    METRICS_DB.parent.mkdir(parents=True, exist_ok=True)
+                    con = open_db(METRICS_DB)
+                    _ensure(con)
+                    con.close()
+                con = open_db(METRICS_DB, read_only=True)
+                try:
+                    return con.execute(sql, list(params)).fetchdf()
+                finally:
+                    con.close()
+        except duckdb.IOException as e:  # another process is flushing
+            if attempt == METRICS_READ_RETRIES:
+                raise MetricsBusy(f"{METRICS_DB} is locked by another process ({e})") from None
+            time.sleep(delay)
+            delay *= 2
+
+def stage_summary(since_s: float):
+    return query("""
+        SELECT name AS stage, count(*) AS n, quantile_cont(value, 0.5) AS p50_s,
+               quantile_cont(value, 0.95) AS p95_s, quantile_cont(value, 0.99) AS p99_s, max(value) AS max_s
+        FROM metrics WHERE kind = 'stage' AND ts >= now() - to_seconds(?) GROUP BY 1 ORDER BY p95_s DESC""",
+                 (since_s,))
+
+def stage_values(stage: str, since_s: float):
+    return query("SELECT value AS seconds FROM metrics WHERE kind = 'stage' AND name = ? "
+                 "AND ts >= now() - to_seconds(?)", (stage, since_s))
+
+def cache_summary(since_s: float):
+    return query("""
+        SELECT name AS cache, sum(value)::BIGINT AS hits, count(*) AS lookups, avg(value) AS hit_rate
+        FROM metrics WHERE kind = 'cache' AND ts >= now() - to_seconds(?) GROUP BY 1 ORDER BY 1""",
+                 (since_s,))
+
+def llm_summary(since_s: float):
+    return query("""
+        SELECT name AS purpose, count(*) AS calls, avg(value) AS avg_s,
+               sum((attrs->>'prompt_tokens')::BIGINT) AS prompt_tokens,
+               sum((attrs->>'output_tokens')::BIGINT) AS output_tokens
+        FROM metrics WHERE kind = 'llm' AND ts >= now() - to_seconds(?) GROUP BY 1 ORDER BY calls DESC""",
+                 (since_s,))
+
+def llm_tokens_by_hour(since_s: float):
+    return query("""
+        SELECT date_trunc('hour', ts) AS hour,
+               sum((attrs->>'prompt_tokens')::BIGINT) AS prompt_tokens,
+               sum((attrs->>'output_tokens')::BIGINT) AS output_tokens
+        FROM metrics WHERE kind = 'llm' AND ts >= now() - to_seconds(?) GROUP BY 1 ORDER BY 1""",
+                 (since_s,))
+
+def slowest_sql(since_s: float, limit: int = 10):
+    return query("""
+        SELECT ts, value AS seconds, attrs->>'sql' AS sql, attrs->>'db' AS db,
+               (attrs->>'rows')::BIGINT AS rows, attrs->>'error' AS error
+        FROM metrics WHERE kind = 'stage' AND name = 'execute' AND ts >= now() - to_seconds(?)
+        ORDER BY value DESC LIMIT ?""", (since_s, limit))
+
+def memory_history(since_s: float):
+    return query("""
+        SELECT date_trunc('minute', ts) AS minute, name AS db, max(value) / 1048576 AS mb
+        FROM metrics WHERE kind = 'memory' AND ts >= now() - to_seconds(?) GROUP BY ALL ORDER BY 1""",
+                 (since_s,))
+
+def explain(sql: str, db_path: Path | str) -> str:
+    with connect(db_path) as con:
+        return "\n".join(r[1] for r in con.execute(f"EXPLAIN {sql}").fetchall())
+
+def duckdb_memory(db_path: Path | str):
+    with connect(db_path) as con:
+        return con.execute("SELECT tag, memory_usage_bytes / 1048576 AS memory_mb, "
+                           "temporary_storage_bytes / 1048576 AS temp_mb FROM duckdb_memory() "
+                           "WHERE memory_usage_bytes + temporary_storage_bytes > 0 ORDER BY 2 DESC").fetchdf()
+
+# --------------------------------------------------------------------------------------
+# Profiling one request
+# --------------------------------------------------------------------------------------
+def profile(fn, *args, **kwargs):
+    """(fn(*args, **kwargs), report text). Profiles the calling thread only."""
+    if METRICS_PROFILER == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            pass
+        else:
+            p = Profiler()
+            p.start()
+            try:
+                res = fn(*args, **kwargs)
+            finally:
+                p.stop()
+            return res, p.output_text(unicode=True, color=False)
+    prof = cProfile.Profile()
+    res = prof.runcall(fn, *args, **kwargs)
+    out = io.StringIO()
+    pstats.Stats(prof, stream=out).sort_stats("cumulative").print_stats(40)
+    return res, out.getvalue()
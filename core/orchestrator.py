@@ -6,6 +6,9 @@ from dotenv import load_dotenv
 import google.generativeai as genai
 
 from .sql_agent import ask as ask_sql  # uses your working sql_agent
+from .approx import approx_info
+from .answers import GLOSSARY, get_store
+from . import registry, metrics
 
 # Load env + configure Gemini
 REPO_ROOT = Path(__file__).resolve().parents[1]
@@ -26,43 +29,81 @@ Return only the label: sql_query OR explain_term OR translate.
 
 def detect_intent(message: str) -> Intent:
     prompt = f"{_INTENT_SYS}\n\nUser: {message}\nLabel:"
-    text = genai.GenerativeModel(MODEL).generate_content(prompt).text.strip().lower()
+    text = metrics.llm_call("intent", genai.GenerativeModel(MODEL).generate_content, prompt).text.strip().lower()
     if "translate" in text: return "translate"
     if "explain" in text: return "explain_term"
     return "sql_query"
 
-_TERMS = {
-    "freight value": "Shipping fee charged for delivering items for an order; in Olist it's the `freight_value` column on order items.",
-    "aov": "Average order value = total revenue / number of orders.",
-    "lead time": "Time between order placement and delivery to the customer.",
-    "sla": "Service Level Agreement: expected service quality/time (e.g., delivery time promise).",
-}
+def _seed(term: str) -> str:
+    for k, v in GLOSSARY.items():
+        if k in term.lower():
+            return v
+    return ""
 
-def explain_term(term: str) -> str:
+def llm_explain(term: str, seed: str | None = None) -> str:
     # simple seed + LLM polish
-    seed = ""
-    for k,v in _TERMS.items():
-        if k in term.lower():
-            seed = v; break
+    seed = _seed(term) if seed is None else seed
     user_q = f"Explain briefly the term in e-commerce/logistics context: {term}"
     if seed:
         user_q += f"\n\nSeed context: {seed}"
-    res = genai.GenerativeModel(MODEL).generate_content(user_q)
+    res = metrics.llm_call("explain", genai.GenerativeModel(MODEL).generate_content, user_q)
     return res.text.strip()
 
+def explain_term(term: str) -> str:
+    """Glossary terms come from the answer store (core/answers.py); the LLM only on misses."""
+    store = get_store()
+    ans = store.explain(term)
+    if ans is None:
+        ans = llm_explain(term)
+        store.remember("explain", term, ans)
+    return ans
+
 def translate_text(text: str, target_lang: str = "English") -> str:
-    prompt = f"Translate to {target_lang}. Keep only translated text, no extra words:\n\n{text}"
-    res = genai.GenerativeModel(MODEL).generate_content(prompt)
-    return res.text.strip()
+    """Category names come from the answer store; anything else from the LLM (cached)."""
+    store = get_store()
+    ans = store.translate(text, target_lang)
+    if ans is None:
+        prompt = f"Translate to {target_lang}. Keep only translated text, no extra words:\n\n{text}"
+        ans = metrics.llm_call("translate", genai.GenerativeModel(MODEL).generate_content, prompt).text.strip()
+        store.remember(f"translate:{target_lang}", text, ans)
+    return ans
 
 def handle_message(message: str,
                    schema_path: str | Path,
-                   db_path: str | Path) -> Tuple[str, Dict[str, Any]]:
+                   db_path: str | Path,
+                   session=None,
+                   approx: bool = False) -> Tuple[str, Dict[str, Any]]:
     """
     Returns (markdown_response, extras)
-    extras may include {"sql": "...", "df": pandas.DataFrame}
+    extras may include {"sql": "...", "table": pyarrow.Table, "question": "..."}
+    session: optional core.session.SessionContext; follow-ups are answered from its previous
+    results. The caller records successful answers with session.remember(...).
+    approx: opt-in approximate answers (samples/sketches, with *_ci95 error bounds).
+    A question naming registered databases (core/registry.py) runs on those instead; naming
+    several runs on a workspace with each attached read-only (tables: <name>.<table>).
     """
-    intent = detect_intent(message)
+    database = None
+    target = registry.route(message)
+    if target is not None:
+        compare = target["kind"] == "compare"
+        routed = target["path"] if compare else registry.db_file(target)
+        if Path(routed).resolve() != Path(db_path).resolve():
+            database = target["name"]
+            schema_path = target["schema"] if compare else registry.schema_path(target)
+            db_path, approx = routed, approx and not compare  # no samples across attachments
+
+    context = None
+    if session is not None:
+        # "top 3", "now only for SP", "sort by revenue": filter/sort the previous result, no LLM
+        context = session.followup_context(message)
+        hit = session.refine(message) if database is None else None  # previous result is another DB's
+        if hit:
+            sql, tbl = hit
+            question = (context or {}).get("merged") or session.last["question"]
+            md = f"**Refined the previous result:**\n\nShowing top rows below.\n\n**SQL used:**\n```sql\n{sql}\n```"
+            return md, {"intent":"sql_query","sql":sql,"table":tbl,"question":question,"refined":True}
+
+    intent = "sql_query" if context else (get_store().intent(message) or detect_intent(message))
     if intent == "explain_term":
         ans = explain_term(message)
         return ans, {"intent":"explain_term"}
@@ -77,11 +118,26 @@ def handle_message(message: str,
         return ans, {"intent":"translate","target_lang":tgt}
 
     # default: sql_query
-    df, sql, err = ask_sql(message, schema_path=schema_path, db_path=db_path, retry=True)
+    tbl, sql, err = ask_sql(message, schema_path=schema_path, db_path=db_path, retry=True, context=context,
+                            approx=approx)
+    question = (context or {}).get("merged") or message  # merged is None for negations
+    return sql_answer(question, sql, tbl, err, database)
+
+def sql_answer(question: str, sql: str, tbl, err: str | None = None,
+               database: str | None = None) -> Tuple[str, Dict[str, Any]]:
+    """(markdown, extras) of a SQL answer, as handle_message returns it."""
     if err:
         md = f"**I tried to run SQL but hit an error:**\n\n```\n{err}\n```\n\n**Generated SQL:**\n```sql\n{sql}\n```"
-        return md, {"intent":"sql_query","sql":sql,"error":err,"df":None}
+        return md, {"intent":"sql_query","sql":sql,"error":err,"table":None,"database":database}
     else:
         # small textual summary
         md = f"**Answer based on the data:**\n\nShowing top rows below.\n\n**SQL used:**\n```sql\n{sql}\n```"
-        return md, {"intent":"sql_query","sql":sql,"df":df}
+        info = approx_info(tbl)
+        if info and info["mode"] == "sample":
+            md += (f"\n\n≈ *Approximate: {info['pct']:g}% {info['source']} of `{info['table']}`; "
+                   f"`*_ci95` columns are 95% error bounds.*")
+        elif info and info["mode"] == "sketch":
+            md += "\n\n≈ *Approximate medians / quantiles (sketches over the full table).*"
+        if database:
+            md += f"\n\n🗄️ *Ran on `{database}`.*"
+        return md, {"intent":"sql_query","sql":sql,"table":tbl,"question":question,"database":database}
@@ -0,0 +1,203 @@
+# core/registry.py
+# Database registry: named DuckDB files or Parquet lakes (per region, per snapshot, synthetic
+# scale copies), each with its own schema cache, connection pool (core/db.py) and result-cache
+# namespace (core/executor.py). A question that names a registered database is routed to it;
+# one that names several runs on a comparison workspace with each ATTACHed read-only.
+#
+#   data/databases.json:
+#     {"snap_2017": {"path": "db/olist_2017.duckdb", "description": "End-of-2017 snapshot",
+#                    "aliases": ["2017 snapshot"]},
+#      "x100": {"path": "data/synthetic/x100"}}          # folder of Parquet files = lake
+#
+#   python -m core.registry [--refresh]      list databases (rebuild schema caches / catalogs)
+from __future__ import annotations
+import os
+import re
+import json
+import argparse
+import threading
+from pathlib import Path
+
+from .db import allow_external_access, get_pool, open_db
+from .schema_utils import get_schema
+from .semantic import build_semantic_layer
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+REGISTRY_PATH = Path(os.getenv("DB_REGISTRY", str(REPO_ROOT / "data" / "databases.json")))
+REGISTRY_CACHE = REPO_ROOT / "data" / "cache" / "registry"  # schema caches, lake catalogs, comparisons
+DEFAULT_NAME = "olist"
+DEFAULT = {"path": REPO_ROOT / "db" / "olist.duckdb", "schema": REPO_ROOT / "docs" / "schema.json",
+           "description": "Olist warehouse (scripts/ingest.py)"}
+
+_NAME_RE = re.compile(r"^[a-z_][a-z0-9_]*$")
+_loaded: tuple[float, dict] | None = None
+_lock = threading.RLock()
+
+# --------------------------------------------------------------------------------------
+# Entries
+# --------------------------------------------------------------------------------------
+def _entry(name: str, spec: dict) -> dict:
+    if not _NAME_RE.match(name):
+        raise ValueError(f"Database name must be a lowercase identifier (used as ATTACH alias): {name!r}")
+    path = Path(spec["path"])
+    path = path if path.is_absolute() else REPO_ROOT / path
+    schema = spec.get("schema")
+    return {
+        "name": name,
+        "path": path,
+        "kind": spec.get("kind") or ("parquet" if path.is_dir() or path.suffix == ".parquet" else "duckdb"),
+        "schema": (Path(schema) if Path(schema).is_absolute() else REPO_ROOT / schema) if schema else None,
+        "description": spec.get("description", ""),
+        "aliases": [a.lower() for a in spec.get("aliases", [])],
+        "routable": spec.get("routable", True),
+    }
+
+def databases() -> dict[str, dict]:
+    """name -> entry; the built-in warehouse plus data/databases.json (reloaded when it changes)."""
+    global _loaded
+    mtime = REGISTRY_PATH.stat().st_mtime if REGISTRY_PATH.exists() else 0.0
+    with _lock:
+        if _loaded and _loaded[0] == mtime:
+            return _loaded[1]
+        # the default isn't routed by name (it's the usual selection) unless the file lists it
+        out = {DEFAULT_NAME: _entry(DEFAULT_NAME, {**DEFAULT, "routable": False})}
+        if mtime:
+            for name, spec in json.loads(REGISTRY_PATH.read_text(encoding="utf-8")).items():
+                out[name] = _entry(name, spec)
+        _loaded = (mtime, out)
+        return out
+
+def get(name_or_path: str | Path | None) -> dict:
+    """Registered entry by name, or an ad-hoc (unregistered) entry for a database path."""
+    dbs = databases()
+    if name_or_path is None:
+        return dbs[DEFAULT_NAME]
+    if str(name_or_path) in dbs:
+        return dbs[str(name_or_path)]
+    path = Path(name_or_path).resolve()
+    for e in dbs.values():
+        if e["path"].resolve() == path:
+            return e
+    name = re.sub(r"[^a-z0-9_]", "_", path.stem.lower()) or "db"
+    return _entry(name if _NAME_RE.match(name) else f"db_{name}", {"path": path, "routable": False})
+
+# --------------------------------------------------------------------------------------
+# Files: database (lake catalog) and schema cache
+# --------------------------------------------------------------------------------------
+def _mtime(p: Path) -> float:
+    if p.is_dir():
+        return max((f.stat().st_mtime for f in p.rglob("*.parquet")), default=0.0)
+    return p.stat().st_mtime if p.exists() else 0.0
+
+def _lake_catalog(entry: dict) -> Path:
+    """DuckDB catalog for a Parquet lake: a view per table (file or hive-partitioned folder),
+       the semantic views over them and the small monthly rollups; no data is copied."""
+    cat = REGISTRY_CACHE / f"lake_{entry['name']}.duckdb"
+    with _lock:
+        if cat.exists() and cat.stat().st_mtime >= _mtime(entry["path"]):
+            return cat
+        cat.parent.mkdir(parents=True, exist_ok=True)
+        con = open_db(cat)
+        try:
+            root = entry["path"]
+            for f in ([root] if root.is_file() else sorted(root.iterdir())):
+                if f.suffix == ".parquet":
+                    src = f"read_parquet('{f.as_posix()}')"
+                elif f.is_dir() and any(f.rglob("*.parquet")):
+                    first = next(f.rglob("*.parquet")).relative_to(f)
+                    parts = [p.split("=")[0] for p in first.parts[:-1] if "=" in p]
+                    src = f"read_parquet('{f.as_posix()}/**/*.parquet', hive_partitioning=true)"
+                    src = f"(SELECT * EXCLUDE ({', '.join(parts)}) FROM {src})" if parts else src
+                else:
+                    continue
+                con.execute(f"CREATE OR REPLACE VIEW {f.name.split('.')[0]} AS SELECT * FROM {src}")
+        finally:
+            con.close()
+        build_semantic_layer(cat, materialize_facts=False)
+        return cat
+
+def db_file(entry: dict) -> Path:
+    if entry["kind"] != "parquet":
+        return entry["path"]
+    cat = _lake_catalog(entry)
+    allow_external_access(cat)  # its views read the lake's files
+    return cat
+
+def schema_path(entry: dict, refresh: bool = False) -> Path:
+    """The entry's schema.json: its configured one, else a cache rebuilt when the database changes."""
+    if entry.get("schema"):
+        return entry["schema"]
+    out = REGISTRY_CACHE / f"schema_{entry['name']}.json"
+    db = db_file(entry)
+    with _lock:
+        if refresh or not out.exists() or out.stat().st_mtime < _mtime(db):
+            out.parent.mkdir(parents=True, exist_ok=True)
+            out.write_text(json.dumps(get_schema(db), indent=2, ensure_ascii=False), encoding="utf-8")
+    return out
+
+def cache_namespace(entry: dict) -> str:
+    """Result-cache namespace: changes when the database does, so stale answers age out."""
+    return f"{entry['name']}@{_mtime(db_file(entry)):.0f}"
+
+# --------------------------------------------------------------------------------------
+# Routing and comparisons
+# --------------------------------------------------------------------------------------
+def mentioned(question: str) -> list[str]:
+    """Registered databases named in the question (by name or alias), in order of mention."""
+    text = question.lower()
+    hits = []
+    for name, e in databases().items():
+        if not e["routable"]:
+            continue
+        pos = [m.start() for t in [name, name.replace("_", " ")] + e["aliases"]
+               for m in re.finditer(rf"\b{re.escape(t)}\b", text)]
+        if pos:
+            hits.append((min(pos), name))
+    return [n for _, n in sorted(hits)]
+
+def compare(names: list[str]) -> dict:
+    """Workspace with each database ATTACHed read-only under its name (tables: <name>.<table>)."""
+    dbs = databases()
+    members = [dbs[n] for n in names]
+    ws = REGISTRY_CACHE / "compare.duckdb"
+    if not ws.exists():
+        ws.parent.mkdir(parents=True, exist_ok=True)
+        open_db(ws).close()
+    allow_external_access(ws)  # ATTACH, and lake members' views
+    pool = get_pool(ws)
+    for e in members:
+        pool.attach(db_file(e), e["name"])
+
+    key = "_".join(sorted(names))
+    out = REGISTRY_CACHE / f"schema_compare_{key}.json"
+    schema = {}
+    for e in members:
+        for t, cols in json.loads(schema_path(e).read_text(encoding="utf-8")).items():
+            if t.startswith(("sem_", "sample_")):
+                continue  # keep base tables, the fact table and rollups
+            schema[f"{e['name']}.{t}"] = cols
+    out.write_text(json.dumps(schema, indent=2, ensure_ascii=False), encoding="utf-8")
+    return {"name": "+".join(names), "path": ws, "kind": "compare", "schema": out, "members": names,
+            "description": "comparison of " + ", ".join(names), "aliases": [], "routable": False}
+
+def route(question: str) -> dict | None:
+    """Entry for the database(s) the question names, or None (stay on the selected one)."""
+    names = mentioned(question)
+    if not names:
+        return None
+    return compare(names) if len(names) > 1 else databases()[names[0]]
+
+# --------------------------------------------------------------------------------------
+# CLI
+# --------------------------------------------------------------------------------------
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--refresh", action="store_true", help="rebuild lake catalogs and schema caches")
+    args = ap.parse_args()
+    for name, e in databases().items():
+        try:
+            sp = schema_path(e, refresh=args.refresh)
+            n = len(json.loads(sp.read_text(encoding="utf-8")))
+            print(f"{name:16} {e['kind']:8} {e['path']}  ({n} tables, schema {sp.name})  {e['description']}")
+        except Exception as ex:
+            print(f"{name:16} {e['kind']:8} {e['path']}  ✗ {ex}")
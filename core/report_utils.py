@@ -61,6 +61,8 @@ def insights_to_markdown(insights: list[dict], title="Olist InsightGPT — Analy
             "",
             it.get("summary",""),
         ]
+        if it.get("chart"):  # image path, relative to the report (core/reports.py)
+            lines += ["", f"![{it.get('question', '').strip()}]({it['chart']})"]
         if it.get("sql"):
             lines += ["", "```sql", it["sql"], "```"]
         lines.append("")
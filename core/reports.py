@@ -0,0 +1,229 @@
+# core/reports.py
+# Scheduled reports from saved insights (core/memory.py). A refresh re-runs each insight's SQL
+# against the current database in parallel (REPORT_WORKERS). It skips insights whose tables
+# are unchanged since the last run (ingest version stamps, core/versions.py), and regenerates
+# summaries and charts only for results that actually changed. When anything did, a new
+# version of the report is written to REPORTS_DIR/<UTC timestamp>/:
+#   report.md, report.pdf, charts/<insight>.png, manifest.json (status, tables, timings)
+# latest.json points at it, and the last REPORT_KEEP versions are kept. What each insight
+# looked like at the last run is kept in REPORTS_DIR/state.json, per database.
+# `python -m core.reports [--database <name>] [--force] [--every MIN]`; the API refreshes the
+# default database every REPORT_EVERY_MIN minutes (0 = off).
+from __future__ import annotations
+import os
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+from . import registry
+from .memory import load_insights
+from .results import head_df, to_arrow_bytes
+from .sql_agent import execute_sql
+from .sql_safety import check_sql
+from .versions import sql_versions
+from .report_utils import summarize_df, df_to_chart_png, insights_to_markdown, markdown_to_pdf_bytes
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+REPORTS_DIR = Path(os.getenv("REPORTS_DIR", str(REPO_ROOT / "data" / "reports")))
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", "4"))
+REPORT_KEEP = int(os.getenv("REPORT_KEEP", "20"))            # report versions kept on disk
+REPORT_EVERY_MIN = float(os.getenv("REPORT_EVERY_MIN", "0"))  # API background schedule; 0 = off
+REPORT_TITLE = "Olist InsightGPT — Analysis Report"
+
+_lock = threading.Lock()  # one refresh at a time per process (state.json, version folders)
+
+def _now() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M UTC")
+
+def insight_key(it: dict) -> str:
+    return hashlib.sha1(f"{it.get('question', '').strip()}\0{it.get('sql', '')}".encode()).hexdigest()[:12]
+
+def _load_state() -> dict:
+    try:
+        return json.loads((REPORTS_DIR / "state.json").read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+def _write_json(path: Path, data):
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(data, indent=2, ensure_ascii=False, default=str), encoding="utf-8")
+    os.replace(tmp, path)
+
+# --------------------------------------------------------------------------------------
+# One insight
+# --------------------------------------------------------------------------------------
+def _run(it: dict, key: str, db_path: str, tables: dict | None, prev: dict | None) -> dict:
+    """Re-run the SQL (on a pool thread); a changed result carries its first rows in "df"."""
+    t0 = time.perf_counter()
+    question, sql = it.get("question", "").strip(), it["sql"]
+    entry = {"key": key, "question": question, "sql": sql, "tables": tables, "refreshed": _now()}
+    unsafe = check_sql(sql, db_path)
+    tbl, err = (None, f"unsafe SQL ({unsafe})") if unsafe else execute_sql(sql, db_path)
+    if err:
+        return {**(prev or {}), **entry, "status": "error", "error": err,
+                "seconds": round(time.perf_counter() - t0, 3)}
+    digest = hashlib.sha1(to_arrow_bytes(tbl)).hexdigest()
+    entry.update(error=None, digest=digest, rows=tbl.num_rows, seconds=round(time.perf_counter() - t0, 3))
+    if prev and prev.get("digest") == digest and not prev.get("error"):
+        return {**entry, "status": "unchanged", "summary": prev["summary"], "chart": prev.get("chart")}
+    return {**entry, "status": "changed" if prev else "new", "df": head_df(tbl, 10)}
+
+def _render(e: dict):
+    """Summary and chart of a changed result (calling thread: pyplot isn't thread-safe)."""
+    df = e.pop("df")
+    e["summary"] = summarize_df(df, e["question"])
+    png = df_to_chart_png(df, title=e["question"][:60])
+    e["chart"] = None
+    if png:
+        chart = REPORTS_DIR / "charts" / f"{e['key']}-{e['digest'][:12]}.png"  # by content: shared across versions
+        chart.parent.mkdir(parents=True, exist_ok=True)
+        chart.write_bytes(png)
+        e["chart"] = chart.name
+
+# --------------------------------------------------------------------------------------
+# Refresh
+# --------------------------------------------------------------------------------------
+def refresh(db_path: Path | str, insights: list[dict] | None = None, force: bool = False,
+            workers: int = REPORT_WORKERS, title: str = REPORT_TITLE, author: str = "Auto-Analyst") -> dict:
+    """Bring every saved insight up to date with `db_path`; returns the run's manifest
+       ("version" is the folder written, None when nothing changed)."""
+    db_path = str(Path(db_path).resolve())
+    insights = [it for it in (load_insights() if insights is None else insights) if it.get("sql")]
+    t0 = time.perf_counter()
+    with _lock:
+        state = _load_state()
+        prev_all = state.get(db_path, {})
+        entries, jobs = {}, {}
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="report") as pool:
+            for it in insights:
+                key = insight_key(it)
+                prev = prev_all.get(key)
+                try:
+                    tables = sql_versions(it["sql"], db_path)
+                except Exception:
+                    tables = None  # doesn't parse: run it and let the error show
+                if not force and prev and tables is not None and prev.get("tables") == tables and not prev.get("error"):
+                    entries[key] = {**prev, "status": "skipped", "seconds": 0.0}
+                else:
+                    jobs[key] = pool.submit(_run, it, key, db_path, tables, prev)
+            for key, fut in jobs.items():
+                entries[key] = fut.result()
+                if "df" in entries[key]:
+                    _render(entries[key])
+        ordered = [entries[insight_key(it)] for it in insights]
+
+        dirty = force or set(entries) != set(prev_all) or any(
+            e["status"] in ("new", "changed") or (e["status"] == "error" and e["error"] != prev_all.get(e["key"], {}).get("error"))
+            for e in ordered)
+        latest = _latest()
+        version = _write_version(ordered, db_path, title, author) if dirty or latest is None else None
+        state[db_path] = {e["key"]: {k: v for k, v in e.items() if k not in ("status", "seconds")} for e in ordered}
+        REPORTS_DIR.mkdir(parents=True, exist_ok=True)
+        _write_json(REPORTS_DIR / "state.json", state)
+
+    counts = {}
+    for e in ordered:
+        counts[e["status"]] = counts.get(e["status"], 0) + 1
+    return {"version": version, "latest": version or latest, "database": db_path, "counts": counts,
+            "seconds": round(time.perf_counter() - t0, 3),
+            "insights": [{k: e.get(k) for k in ("key", "question", "status", "rows", "seconds", "error", "tables")}
+                         for e in ordered]}
+
+def _latest() -> str | None:
+    try:
+        name = json.loads((REPORTS_DIR / "latest.json").read_text(encoding="utf-8"))["version"]
+    except (OSError, ValueError, KeyError):
+        return None
+    return name if (REPORTS_DIR / name).is_dir() else None
+
+def _write_version(entries: list[dict], db_path: str, title: str, author: str) -> str:
+    name = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    out = REPORTS_DIR / name
+    if out.exists():  # two runs in the same second
+        name = f"{name}-{len(list(REPORTS_DIR.glob(name + '*')))}"
+        out = REPORTS_DIR / name
+    (out / "charts").mkdir(parents=True)
+    items = []
+    for e in entries:
+        it = {"timestamp": e["refreshed"], "question": e["question"], "sql": e.get("sql", ""),
+              "summary": e.get("summary") or "", "chart": None}
+        if e.get("error"):
+            it["summary"] = (it["summary"] + "\n\n" if it["summary"] else "") + f"⚠️ Refresh failed: {e['error']}"
+        if e.get("chart") and (REPORTS_DIR / "charts" / e["chart"]).exists():
+            shutil.copy2(REPORTS_DIR / "charts" / e["chart"], out / "charts" / e["chart"])
+            it["chart"] = f"charts/{e['chart']}"
+        items.append(it)
+    md = insights_to_markdown(items, title=title, author=author)
+    (out / "report.md").write_text(md, encoding="utf-8")
+    (out / "report.pdf").write_bytes(markdown_to_pdf_bytes(md))
+    _write_json(out / "manifest.json", {"version": name, "created": _now(), "database": db_path,
+                                        "insights": [{k: v for k, v in e.items() if k != "summary"} for e in entries]})
+    _write_json(REPORTS_DIR / "latest.json", {"version": name, "path": str(out)})
+    versions = sorted(p for p in REPORTS_DIR.iterdir() if p.is_dir() and p.name[:8].isdigit())
+    for old in versions[:-REPORT_KEEP] if REPORT_KEEP else []:
+        shutil.rmtree(old, ignore_errors=True)
+    return name
+
+def refreshed(insights: list[dict], db_path: Path | str) -> list[dict]:
+    """`insights` with the summaries of the last refresh on `db_path` (where there is one)."""
+    state = _load_state().get(str(Path(db_path).resolve()), {})
+    out = []
+    for it in insights:
+        e = state.get(insight_key(it))
+        out.append({**it, "summary": e["summary"], "timestamp": e["refreshed"]}
+                   if e and e.get("summary") and not e.get("error") else it)
+    return out
+
+# --------------------------------------------------------------------------------------
+# Schedule
+# --------------------------------------------------------------------------------------
+def run_every(minutes: float, entry: dict | None = None, stop: threading.Event | None = None, **kwargs):
+    stop = stop or threading.Event()
+    while not stop.is_set():
+        try:
+            _log(refresh(registry.db_file(entry or registry.get(None)), **kwargs))
+        except Exception as e:
+            print(f"report refresh failed: {e}")
+        stop.wait(minutes * 60)
+
+def schedule_in_background(entry: dict | None = None, minutes: float = REPORT_EVERY_MIN) -> threading.Thread:
+    t = threading.Thread(target=run_every, args=(minutes, entry), name="reports", daemon=True)
+    t.start()
+    return t
+
+def _log(m: dict):
+    counts = ", ".join(f"{v} {k}" for k, v in sorted(m["counts"].items())) or "no insights with SQL"
+    where = f"wrote {REPORTS_DIR / m['version']}" if m["version"] else f"no changes, latest {m['latest']}"
+    print(f"[{_now()}] {counts} in {m['seconds']:.2f}s — {where}")
+
+# --------------------------------------------------------------------------------------
+# CLI
+# --------------------------------------------------------------------------------------
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--database", default=None, help="registered database name or path (default: Olist)")
+    ap.add_argument("--force", action="store_true", help="re-run every insight and write a new version (once)")
+    ap.add_argument("--workers", type=int, default=REPORT_WORKERS)
+    ap.add_argument("--every", type=float, default=0, help="repeat every N minutes")
+    args = ap.parse_args()
+
+    entry = registry.get(args.database)
+    if args.every:
+        if args.force:
+            _log(refresh(registry.db_file(entry), force=True, workers=args.workers))
+        run_every(args.every, entry, workers=args.workers)
+        return
+    m = refresh(registry.db_file(entry), force=args.force, workers=args.workers)
+    for it in m["insights"]:
+        print(f"  {it['status']:<9} {it['seconds']:>6.2f}s  {it['question'][:70]}"
+              + (f"  ({it['error']})" if it["error"] else ""))
+    _log(m)
+
+if __name__ == "__main__":
+    main()
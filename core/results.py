@@ -0,0 +1,90 @@
+# core/results.py
+# Arrow-native result helpers. Query results travel as pyarrow Tables from DuckDB to the
+# UI/API/exports; pandas is only materialised for the few rows that summaries and charts need.
+from __future__ import annotations
+import io
+import tempfile
+from pathlib import Path
+
+import duckdb
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+def is_empty(table: pa.Table | None) -> bool:
+    return table is None or table.num_rows == 0
+
+def head_df(table: pa.Table | None, n: int = 10) -> pd.DataFrame | None:
+    """First n rows as pandas (zero-copy slice, converts only those rows)."""
+    if table is None:
+        return None
+    return table.slice(0, n).to_pandas()
+
+def decode_dictionaries(table: pa.Table) -> pa.Table:
+    """ENUM columns arrive as dictionaries with unsigned indices, which pandas can't convert:
+       plain values instead."""
+    for i, field in enumerate(table.schema):
+        if pa.types.is_dictionary(field.type):
+            table = table.set_column(i, field.with_type(field.type.value_type),
+                                     table.column(i).cast(field.type.value_type))
+    return table
+
+def fetch_arrow(cur, max_rows: int = 0, batch_rows: int = 65536) -> pa.Table:
+    """Result of the last query on `cur` as Arrow. With `max_rows`, stream batches and stop at
+       the cap, so DuckDB never materialises the rest; a capped table is marked truncated."""
+    if not max_rows:
+        return decode_dictionaries(cur.fetch_arrow_table())
+    reader = cur.fetch_record_batch(batch_rows)
+    batches, n, truncated = [], 0, False
+    for b in reader:
+        if n + b.num_rows > max_rows:
+            batches.append(b.slice(0, max_rows - n)); truncated = True
+            break
+        batches.append(b); n += b.num_rows
+    table = decode_dictionaries(pa.Table.from_batches(batches, schema=reader.schema))
+    if truncated:
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), b"truncated": str(max_rows).encode()})
+    return table
+
+def truncated_at(table: pa.Table | None) -> int | None:
+    meta = (table.schema.metadata or {}) if table is not None else {}
+    return int(meta[b"truncated"]) if b"truncated" in meta else None
+
+def compact(table: pa.Table | None, n: int = 10) -> pa.Table | None:
+    """Copy of the first n rows that doesn't keep the full result's buffers alive."""
+    if table is None or table.num_rows <= n:
+        return table
+    return pa.Table.from_pylist(table.slice(0, n).to_pylist(), schema=table.schema)
+
+def round_floats(table: pa.Table, ndigits: int = 3) -> pa.Table:
+    """Display copy with float columns rounded; other columns share buffers with `table`."""
+    for i, field in enumerate(table.schema):
+        if pa.types.is_floating(field.type):
+            table = table.set_column(i, field, pc.round(table.column(i), ndigits))
+    return table
+
+def _copy_via_duckdb(table: pa.Table, fmt: str) -> bytes:
+    # DuckDB scans the Arrow table in place (no pandas round-trip) and writes the file itself
+    with tempfile.TemporaryDirectory() as d:
+        out = Path(d) / f"result.{fmt}"
+        con = duckdb.connect()
+        try:
+            con.register("result", table)
+            opts = "(HEADER, DELIMITER ',')" if fmt == "csv" else "(FORMAT PARQUET, COMPRESSION ZSTD)"
+            con.execute(f"COPY result TO '{out.as_posix()}' {opts}")
+        finally:
+            con.close()
+        return out.read_bytes()
+
+def to_csv_bytes(table: pa.Table) -> bytes:
+    return _copy_via_duckdb(table, "csv")
+
+def to_parquet_bytes(table: pa.Table) -> bytes:
+    return _copy_via_duckdb(table, "parquet")
+
+def to_arrow_bytes(table: pa.Table) -> bytes:
+    """Arrow IPC stream (.arrow), readable with pyarrow.ipc.open_stream / polars / DuckDB."""
+    buf = io.BytesIO()
+    with pa.ipc.new_stream(buf, table.schema) as writer:
+        writer.write_table(table)
+    return buf.getvalue()
@@ -1,13 +1,26 @@
 # core/schema_utils.py
-import argparse, json
+# schema.json: tables -> columns (name, type, hint) from one duckdb_columns() query, plus cheap
+# statistics from one aggregate pass per table: non-null/null counts, approximate distinct
+# counts, min/max of numeric and temporal columns, and every value of low-cardinality text
+# columns (customer_state, payment_type, order_status ...), most frequent first. The SQL
+# agent's prompt shows them, so filters use real values and ranges the first time.
+import os, re, argparse, json
+from datetime import date, datetime, time
+from decimal import Decimal
 from pathlib import Path
-import duckdb
+
+from .db import connect
+from .semantic import SEMANTIC_OBJECTS, FACT_TABLES
+from .versions import VERSIONS_TABLE
 
 # Resolve repo root = parent of this file's directory
 REPO_ROOT = Path(__file__).resolve().parents[1]
 DEFAULT_DB = REPO_ROOT / "db" / "olist.duckdb"
 DOCS_DIR = REPO_ROOT / "docs"
 
+SCHEMA_STATS = os.getenv("SCHEMA_STATS", "1") == "1"
+SCHEMA_TOP_VALUES = int(os.getenv("SCHEMA_TOP_VALUES", "30"))  # list a text column's values up to this many
+
 HINTS = {
     "orders.order_purchase_timestamp": "UTC timestamp when order was placed",
     "orders.order_estimated_delivery_date": "Estimated delivery date",
@@ -18,24 +31,73 @@ HINTS = {
     "reviews.review_score": "Customer review score (1-5)",
     "products.product_category_name": "Original Portuguese category name",
     "product_category_translation.product_category_name_english": "Category name in English",
+    "fact_order_items.order_id": "One row per order item, already joined to orders/customers/products/sellers; prefer over joining those tables",
+    "fact_order_items.category": "English category name (Portuguese if untranslated)",
+    "fact_order_items.line_revenue": "price + freight_value (BRL)",
+    "fact_order_items.is_late": "1 = delivered after estimate, 0 = on time, NULL = not delivered (order-level, repeats per item)",
+    "fact_order_items.delay_days": "Days delivered after (+) / before (-) the estimate (order-level, repeats per item)",
+    "fact_order_items.delivery_days": "Days from purchase to delivery (order-level, repeats per item)",
 }
 
-def get_schema(db_path: Path):
-    con = duckdb.connect(str(db_path))
-    tables = [r[0] for r in con.execute(
-        "SELECT table_name FROM information_schema.tables WHERE table_schema='main' ORDER BY 1"
-    ).fetchall()]
-    schema = {}
-    for t in tables:
-        cols = con.execute(f"PRAGMA table_info('{t}')").fetchall()
-        schema[t] = []
-        for c in cols:
-            col = {"name": c[1], "type": c[2]}
-            key = f"{t}.{c[1]}"
+_NUMERIC_RE = re.compile(r"^(U?(TINY|SMALL|BIG|HUGE)?INT(EGER)?|DOUBLE|FLOAT|REAL|DECIMAL.*)$")
+_TEMPORAL_RE = re.compile(r"^(DATE|TIME|TIMESTAMP).*")
+
+def _jsonable(v):
+    if isinstance(v, (datetime, date, time)):
+        return v.isoformat()
+    return float(v) if isinstance(v, Decimal) else v
+
+def _column_stats(con, table: str, cols: list[dict]) -> None:
+    """One aggregate pass over `table`; adds count/nulls/distinct/min/max/values to cols."""
+    exprs, plan = ["count(*)"], []
+    for c in cols:
+        q, kind = f'"{c["name"]}"', c["type"].upper()
+        keys = ["count", "distinct"]
+        exprs += [f"count({q})", f"approx_count_distinct({q})"]
+        if _NUMERIC_RE.match(kind) or _TEMPORAL_RE.match(kind):
+            keys += ["min", "max"]
+            exprs += [f"min({q})", f"max({q})"]
+        elif kind in ("VARCHAR", "ENUM", "BOOLEAN"):
+            keys.append("values")
+            exprs.append(f"approx_top_k({q}, {SCHEMA_TOP_VALUES + 1})")
+        elif not re.match(r"^[A-Z ]+$", kind):
+            keys, exprs = [], exprs[:-2]  # lists, structs, maps: names/types only
+        plan.append((c, keys))
+    row = iter(con.execute(f'SELECT {", ".join(exprs)} FROM "{table}"').fetchone())
+    rows = next(row)
+    for c, keys in plan:
+        stats = dict(zip(keys, row))
+        if not stats:
+            continue
+        stats = {"count": stats["count"], "nulls": rows - stats["count"],
+                 **stats, "distinct": min(stats["distinct"], stats["count"])}  # HLL can overshoot
+        values = stats.pop("values", None)
+        if values is not None and len(values) <= SCHEMA_TOP_VALUES:
+            stats["values"], stats["distinct"] = values, len(values)  # fewer than k: all of them, exact
+        c.update({k: _jsonable(v) for k, v in stats.items()})
+
+def table_rows(cols: list[dict]) -> int | None:
+    c = cols[0] if cols else {}
+    return c["count"] + c["nulls"] if "count" in c else None
+
+def get_schema(db_path: Path, stats: bool = SCHEMA_STATS):
+    with connect(db_path) as con:
+        schema = {}
+        for t, name, typ in con.execute("""
+            SELECT table_name, column_name, data_type FROM duckdb_columns()
+            WHERE database_name = current_database() AND schema_name = 'main' AND NOT internal
+            ORDER BY table_name, column_index""").fetchall():
+            if t.startswith("sample_") or t == VERSIONS_TABLE:
+                continue  # approx-mode samples and ingest stamps are internal
+            col = {"name": name, "type": "ENUM" if typ.startswith("ENUM(") else typ}  # members: the stats' values
+            key = f"{t}.{name}"
             if key in HINTS:
                 col["hint"] = HINTS[key]
-            schema[t].append(col)
-    con.close()
+            schema.setdefault(t, []).append(col)
+        if stats:
+            for t, cols in schema.items():
+                if t not in SEMANTIC_OBJECTS or t in FACT_TABLES:  # the prompt describes the rest as metrics
+                    _column_stats(con, t, cols)
     return schema
 
 def write_schema_files(schema, out_json: Path, out_md: Path):
@@ -45,9 +107,14 @@ def write_schema_files(schema, out_json: Path, out_md: Path):
     with out_md.open("w", encoding="utf-8") as f:
         f.write("# Olist DB Schema\n\n")
         for t, cols in schema.items():
-            f.write(f"## {t}\n\n")
+            rows = table_rows(cols)
+            f.write(f"## {t}" + (f" ({rows:,} rows)" if rows is not None else "") + "\n\n")
             for c in cols:
                 hint = f" – {c['hint']}" if "hint" in c else ""
+                if "values" in c:
+                    hint += " – values: " + ", ".join(f"`{v}`" for v in c["values"])
+                elif "min" in c:
+                    hint += f" – {c['min']} … {c['max']}"
                 f.write(f"- `{c['name']}` ({c['type']}){hint}\n")
             f.write("\n")
 
@@ -56,6 +123,7 @@ if __name__ == "__main__":
     ap.add_argument("--db-path", type=str, default=str(DEFAULT_DB))
     ap.add_argument("--out-json", type=str, default=str(DOCS_DIR / "schema.json"))
     ap.add_argument("--out-md", type=str, default=str(DOCS_DIR / "schema.md"))
+    ap.add_argument("--no-stats", action="store_true", help="names and types only (no table scans)")
     args = ap.parse_args()
 
     db_path = Path(args.db_path)
@@ -63,6 +131,6 @@ if __name__ == "__main__":
         raise FileNotFoundError(f"Database not found at: {db_path}\n"
                                 f"Tip: run ingest first or pass --db-path with the correct absolute path.")
 
-    schema = get_schema(db_path)
+    schema = get_schema(db_path, stats=not args.no_stats)
     write_schema_files(schema, Path(args.out_json), Path(args.out_md))
     print(f"✅ Wrote {args.out_json} and {args.out_md}")
@@ -0,0 +1,406 @@
+# core/semantic.py
+# Semantic layer: the business definitions the agent is allowed to use deterministically.
+# Every table is reached from `orders o`; `grain` says which row level a definition lives at
+# so we never aggregate an order-level metric over item/payment rows (fan-out).
+from __future__ import annotations
+import os
+import argparse
+from pathlib import Path
+
+from .db import connect, open_db
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+DEFAULT_DB = REPO_ROOT / "db" / "olist.duckdb"
+FACT_SORT_ROWS = int(os.getenv("FACT_SORT_ROWS", "1000000"))  # rows sorted at once when building facts
+
+# shared row-level definitions (used by measures, compiled views and rollups alike)
+LINE_REVENUE = "i.price + i.freight_value"
+IS_DELIVERED = "o.order_delivered_customer_date IS NOT NULL AND o.order_estimated_delivery_date IS NOT NULL"
+IS_LATE = "o.order_delivered_customer_date > o.order_estimated_delivery_date"
+DELAY_DAYS = "date_diff('day', o.order_estimated_delivery_date, o.order_delivered_customer_date)"
+DELIVERY_DAYS = "date_diff('day', o.order_purchase_timestamp, o.order_delivered_customer_date)"
+
+# table alias -> join clause (relative to `orders o`) and the tables it depends on
+JOINS = {
+    "o":   ("orders o", []),
+    "i":   ("JOIN items i ON i.order_id = o.order_id", ["o"]),
+    "c":   ("JOIN customers c ON c.customer_id = o.customer_id", ["o"]),
+    "r":   ("JOIN reviews r ON r.order_id = o.order_id", ["o"]),
+    "pay": ("JOIN payments pay ON pay.order_id = o.order_id", ["o"]),
+    "p":   ("JOIN products p ON p.product_id = i.product_id", ["i"]),
+    "t":   ("LEFT JOIN product_category_translation t ON t.product_category_name = p.product_category_name", ["p"]),
+    "s":   ("JOIN sellers s ON s.seller_id = i.seller_id", ["i"]),
+}
+
+# grain: "order" | "item" | "payment" | None (safe at any grain, e.g. COUNT(DISTINCT order_id))
+# agg:   "sum" | "count" | "avg" | "rate" — lets the parser reject e.g. "average revenue" for a SUM
+# fact:  the same measure over fact_order_items (item-grain measures only; order counts there
+#        would miss orders without items)
+MEASURES = {
+    "revenue": {
+        "sql": f"SUM({LINE_REVENUE})",
+        "uses": ["i"], "grain": "item", "agg": "sum",
+        "synonyms": ["revenue", "sales", "gmv", "total revenue"],
+        "description": "Item price + freight value (BRL)",
+        "fact": "SUM(line_revenue)",
+    },
+    "orders": {
+        "sql": "COUNT(DISTINCT o.order_id)",
+        "uses": ["o"], "grain": None, "agg": "count",
+        "synonyms": ["orders", "order count", "number of orders", "order volume"],
+        "description": "Number of distinct orders",
+    },
+    "freight": {
+        "sql": "SUM(i.freight_value)",
+        "uses": ["i"], "grain": "item", "agg": "sum",
+        "synonyms": ["freight value", "freight", "shipping cost", "freight cost"],
+        "description": "Total freight value (BRL)",
+        "fact": "SUM(freight_value)",
+    },
+    "aov": {
+        "sql": f"SUM({LINE_REVENUE}) / NULLIF(COUNT(DISTINCT o.order_id), 0)",
+        "uses": ["i"], "grain": "item", "agg": "avg",
+        "synonyms": ["aov", "average order value", "avg order value"],
+        "description": "Average order value = revenue / orders",
+        "fact": "SUM(line_revenue) / NULLIF(COUNT(DISTINCT order_id), 0)",
+    },
+    "late_rate_pct": {
+        "sql": f"100.0 * AVG(CASE WHEN {IS_LATE} THEN 1 ELSE 0 END)",
+        "uses": ["o"], "grain": "order", "agg": "rate",
+        "where": [IS_DELIVERED],
+        "synonyms": ["late delivery rate", "late rate", "late delivery percentage", "late deliveries rate"],
+        "description": "% of delivered orders that arrived after the estimated date",
+    },
+    "avg_delay_days": {
+        "sql": f"AVG({DELAY_DAYS})",
+        "uses": ["o"], "grain": "order", "agg": "avg",
+        "where": [IS_DELIVERED],
+        "synonyms": ["average delivery delay", "delivery delay", "avg delivery delay", "delay days", "delay"],
+        "description": "Days delivered after (+) / before (-) the estimate",
+    },
+    "avg_delivery_days": {
+        "sql": f"AVG({DELIVERY_DAYS})",
+        "uses": ["o"], "grain": "order", "agg": "avg",
+        "where": ["o.order_delivered_customer_date IS NOT NULL"],
+        "synonyms": ["delivery time", "lead time", "days to deliver", "average delivery time"],
+        "description": "Days from purchase to delivery",
+    },
+    "avg_review_score": {
+        "sql": "AVG(r.review_score)",
+        "uses": ["r"], "grain": "order", "agg": "avg",
+        "synonyms": ["average review score", "review score", "avg review score", "rating", "review scores"],
+        "description": "Mean customer review score (1-5)",
+    },
+    "payments": {
+        "sql": "COUNT(*)",
+        "uses": ["pay"], "grain": "payment", "agg": "count",
+        "synonyms": ["payments", "payment count", "number of payments"],
+        "description": "Number of payment records",
+    },
+    "payment_value": {
+        "sql": "SUM(pay.payment_value)",
+        "uses": ["pay"], "grain": "payment", "agg": "sum",
+        "synonyms": ["payment value", "total paid", "amount paid"],
+        "description": "Total paid value (BRL)",
+    },
+}
+
+DIMENSIONS = {
+    "category": {
+        "sql": "COALESCE(t.product_category_name_english, p.product_category_name)",
+        "uses": ["t"], "grain": "item",
+        "synonyms": ["product categories", "product category", "categories", "category"],
+    },
+    "customer_state": {
+        "sql": "c.customer_state",
+        "uses": ["c"], "grain": "order",
+        "synonyms": ["customer states", "customer state", "states", "state"],
+    },
+    "customer_city": {
+        "sql": "c.customer_city",
+        "uses": ["c"], "grain": "order",
+        "synonyms": ["customer cities", "customer city", "cities", "city"],
+    },
+    "seller_state": {
+        "sql": "s.seller_state",
+        "uses": ["s"], "grain": "item",
+        "synonyms": ["seller states", "seller state"],
+    },
+    "seller_id": {
+        "sql": "i.seller_id",
+        "uses": ["i"], "grain": "item",
+        "synonyms": ["sellers", "seller"],
+    },
+    "product_id": {
+        "sql": "i.product_id",
+        "uses": ["i"], "grain": "item",
+        "synonyms": ["products", "product"],
+    },
+    "order_status": {
+        "sql": "o.order_status",
+        "uses": ["o"], "grain": "order",
+        "synonyms": ["order status", "status"],
+    },
+    "payment_type": {
+        "sql": "pay.payment_type",
+        "uses": ["pay"], "grain": "payment",
+        "synonyms": ["payment types", "payment type", "payment methods", "payment method"],
+    },
+}
+
+# time buckets on the purchase timestamp
+TIME_GRAINS = {
+    "day":   ["per day", "daily", "by day", "each day"],
+    "week":  ["per week", "weekly", "by week", "each week"],
+    "month": ["per month", "monthly", "by month", "each month", "month over month"],
+    "quarter": ["per quarter", "quarterly", "by quarter"],
+    "year":  ["per year", "yearly", "annual", "by year", "each year"],
+}
+TIME_COLUMN = "o.order_purchase_timestamp"
+
+BR_STATES = {"AC", "AL", "AM", "AP", "BA", "CE", "DF", "ES", "GO", "MA", "MG", "MS", "MT", "PA",
+             "PB", "PE", "PI", "PR", "RJ", "RN", "RO", "RR", "RS", "SC", "SE", "SP", "TO"}
+
+def compatible(measure: dict, dims: list[dict]) -> bool:
+    """A measure can be grouped by dimensions at its own grain or coarser (order level)."""
+    g = measure["grain"]
+    if g is None:
+        return True
+    return all(d["grain"] in ("order", g) for d in dims)
+
+def join_clause(aliases: list[str]) -> str:
+    """FROM/JOIN text covering `aliases` and their dependencies, in dependency order."""
+    needed, stack = [], list(aliases)
+    while stack:
+        a = stack.pop()
+        if a not in needed:
+            needed.append(a)
+            stack += JOINS[a][1]
+    order = list(JOINS)  # declaration order respects dependencies
+    return "\n".join(JOINS[a][0] if a != "o" else f"FROM {JOINS[a][0]}"
+                     for a in sorted(needed, key=order.index))
+
+# --------------------------------------------------------------------------------------
+# Compiled views: one row per order / per order item with every dimension and
+# row-level fact resolved, so ad-hoc SQL doesn't have to rebuild the joins.
+# --------------------------------------------------------------------------------------
+ORDER_FACTS = {
+    "order_revenue": "it.revenue",
+    "order_freight": "it.freight",
+    "n_items": "it.n_items",
+    "is_late": f"CASE WHEN {IS_DELIVERED} THEN (CASE WHEN {IS_LATE} THEN 1 ELSE 0 END) END",
+    "delay_days": f"CASE WHEN {IS_DELIVERED} THEN {DELAY_DAYS} END",
+    "delivery_days": DELIVERY_DAYS,
+}
+ITEM_FACTS = {
+    "line_revenue": LINE_REVENUE,
+    "price": "i.price",
+    "freight_value": "i.freight_value",
+}
+_ORDER_COLS = ["o.order_id", "o.customer_id", "o.order_purchase_timestamp",
+               "o.order_delivered_customer_date", "o.order_estimated_delivery_date"]
+
+def _dim_cols(grains: tuple[str, ...]) -> list[str]:
+    return [f"{d['sql']} AS {k}" for k, d in DIMENSIONS.items() if d["grain"] in grains]
+
+def _dim_uses(grains: tuple[str, ...]) -> list[str]:
+    return [a for d in DIMENSIONS.values() if d["grain"] in grains for a in d["uses"]]
+
+def _col_name(expr: str) -> str:
+    return expr.rsplit(" AS ", 1)[-1].rsplit(".", 1)[-1]
+
+def compile_views() -> dict[str, str]:
+    orders_cols = (_ORDER_COLS + [f"date_trunc('month', {TIME_COLUMN}) AS month"]
+                   + _dim_cols(("order",)) + [f"{v} AS {k}" for k, v in ORDER_FACTS.items()])
+    order_items = ("LEFT JOIN (SELECT order_id, SUM(price + freight_value) AS revenue, "
+                   "SUM(freight_value) AS freight, COUNT(*) AS n_items FROM items GROUP BY 1) it "
+                   "ON it.order_id = o.order_id")
+    items_cols = [_col_name(c) for c in _ITEM_VIEW_COLS]
+    return {
+        "sem_orders": "SELECT " + ",\n       ".join(orders_cols) + "\n"
+                      + join_clause(_dim_uses(("order",))) + "\n" + order_items,
+        # item rows come from the materialised fact table: no joins at query time
+        "sem_order_items": "SELECT " + ", ".join(items_cols) + "\nFROM fact_order_items",
+    }
+
+# --------------------------------------------------------------------------------------
+# Denormalised fact table: the orders/items/customers/products/translation/sellers join
+# materialised once at ingest, sorted by purchase time so date-range scans skip row groups.
+# Order-level facts (is_late, delay_days, delivery_days) repeat on every item of an order.
+# --------------------------------------------------------------------------------------
+_ITEM_VIEW_COLS = (["o.order_id", "i.order_item_id", TIME_COLUMN, f"date_trunc('month', {TIME_COLUMN}) AS month"]
+                   + _dim_cols(("order", "item")) + [f"{v} AS {k}" for k, v in ITEM_FACTS.items()])
+FACT_COLUMNS = _ITEM_VIEW_COLS + [
+    "o.customer_id", "o.order_delivered_customer_date", "o.order_estimated_delivery_date",
+] + [f"{ORDER_FACTS[k]} AS {k}" for k in ("is_late", "delay_days", "delivery_days")]
+FACT_TABLES = {
+    "fact_order_items": "SELECT " + ",\n       ".join(FACT_COLUMNS) + "\n"
+                        + join_clause(["i"] + _dim_uses(("order", "item")))
+                        + f"\nORDER BY {TIME_COLUMN}",
+}
+# dimensions available as plain columns of fact_order_items
+FACT_DIMS = {k for k, d in DIMENSIONS.items() if d["grain"] in ("order", "item")}
+
+# --------------------------------------------------------------------------------------
+# Pre-aggregated rollups (monthly). `columns` are additive, `measures` re-derive each
+# registered measure from them, so any roll-up over months/states stays exact.
+# --------------------------------------------------------------------------------------
+ROLLUPS = {
+    "agg_monthly_state": {
+        "source": "sem_orders",
+        "dims": ["customer_state", "order_status"],
+        "columns": {
+            "orders": "COUNT(*)",
+            "orders_with_items": "COUNT(order_revenue)",  # AOV's denominator, as in the measure
+            "revenue": "SUM(order_revenue)",
+            "freight": "SUM(order_freight)",
+            "late_orders": "SUM(is_late)",
+            "delivered_orders": "COUNT(is_late)",
+            "delay_days_sum": "SUM(delay_days)",
+            "delivery_days_sum": "SUM(delivery_days)",
+            "delivery_days_n": "COUNT(delivery_days)",
+        },
+        "measures": {
+            "orders": "SUM(orders)",
+            "revenue": "SUM(revenue)",
+            "freight": "SUM(freight)",
+            "aov": "SUM(revenue) / NULLIF(SUM(orders_with_items), 0)",
+            "late_rate_pct": "100.0 * SUM(late_orders) / NULLIF(SUM(delivered_orders), 0)",
+            "avg_delay_days": "SUM(delay_days_sum) / NULLIF(SUM(delivered_orders), 0)",
+            "avg_delivery_days": "SUM(delivery_days_sum) / NULLIF(SUM(delivery_days_n), 0)",
+        },
+    },
+    "agg_monthly_category": {
+        "source": "sem_order_items",
+        "dims": ["category"],
+        "columns": {
+            "items": "COUNT(*)",
+            "revenue": "SUM(line_revenue)",
+            "freight": "SUM(freight_value)",
+        },
+        "measures": {
+            "revenue": "SUM(revenue)",
+            "freight": "SUM(freight)",
+        },
+    },
+}
+SEMANTIC_OBJECTS = set(FACT_TABLES) | set(ROLLUPS) | {"sem_orders", "sem_order_items"}
+
+# KPI dashboard (app tab 2): headline numbers and monthly trend for a year, optional state
+DASHBOARD_YEARS = (2016, 2017, 2018)
+
+def dashboard_queries(year: int, state: str = "") -> dict[str, tuple[str, tuple]]:
+    """name -> (sql, params) of the dashboard's queries; core/warmup.py runs the same ones."""
+    kpi = ROLLUPS["agg_monthly_state"]["measures"]
+    where = "AND customer_state = ?" if state else ""
+    params = (f"{year}-01-01", f"{year + 1}-01-01") + ((state,) if state else ())
+    # no matching rows (e.g. an unknown state): orders/revenue 0, late rate NULL
+    return {
+        "kpis": (f"""SELECT COALESCE({kpi['orders']}, 0) AS orders, COALESCE({kpi['revenue']}, 0) AS revenue,
+       {kpi['late_rate_pct']} AS late_rate_pct
+FROM agg_monthly_state WHERE month >= CAST(? AS DATE) AND month < CAST(? AS DATE) {where}""", params),
+        "trend": (f"""SELECT month, {kpi['orders']} AS orders, {kpi['revenue']} AS revenue
+FROM agg_monthly_state WHERE month >= CAST(? AS DATE) AND month < CAST(? AS DATE) {where}
+GROUP BY 1 ORDER BY 1""", params),
+        "states": ("SELECT DISTINCT customer_state FROM agg_monthly_state WHERE customer_state IS NOT NULL ORDER BY 1", ()),
+    }
+
+def compile_rollups() -> dict[str, str]:
+    out = {}
+    for name, r in ROLLUPS.items():
+        cols = ["month"] + r["dims"] + [f"{v} AS {k}" for k, v in r["columns"].items()]
+        out[name] = (f"SELECT " + ", ".join(cols) + f" FROM {r['source']} "
+                     f"GROUP BY ALL ORDER BY month")
+    return out
+
+def rollup_for(measure: str, dims: list[str], time_grain: str | None) -> tuple[str, str] | None:
+    """(rollup table, expression) able to answer `measure` grouped by `dims`, or None."""
+    if time_grain in ("day", "week"):
+        return None  # rollups are monthly
+    for name, r in ROLLUPS.items():
+        if measure in r["measures"] and set(dims) <= set(r["dims"]):
+            return name, r["measures"][measure]
+    return None
+
+def _create_sorted(con, name: str, sql: str):
+    """CREATE TABLE name AS sql (sql ends in ORDER BY <column>) without sorting it all at once:
+       the join is staged unsorted, then appended in FACT_SORT_ROWS-sized time ranges, so the
+       sort stays within DuckDB's memory_limit at any scale."""
+    body, key = sql.rsplit("ORDER BY", 1)
+    col, stage = key.strip().split(".")[-1], f"_stage_{name}"
+    con.execute(f"CREATE OR REPLACE TABLE {stage} AS {body}")
+    try:
+        n = con.execute(f"SELECT COUNT(*) FROM {stage}").fetchone()[0]
+        k = max(1, -(-n // FACT_SORT_ROWS))
+        if k == 1:
+            con.execute(f"CREATE OR REPLACE TABLE {name} AS SELECT * FROM {stage} ORDER BY {col}")
+            return
+        cuts = con.execute(f"SELECT quantile_disc({col}, {[i / k for i in range(1, k)]}) FROM {stage}").fetchone()[0]
+        con.execute(f"CREATE OR REPLACE TABLE {name} AS SELECT * FROM {stage} LIMIT 0")
+        for i in range(k):
+            last = i == k - 1
+            lo = [f"({col} >= ? OR {col} IS NULL)" if last else f"{col} >= ?"] if i else []
+            hi = [] if last else [f"{col} < ?"]   # NULLs sort last: they go in the last slice
+            where = " AND ".join(lo + hi)
+            params = ([cuts[i - 1]] if i else []) + ([cuts[i]] if i < k - 1 else [])
+            con.execute(f"INSERT INTO {name} SELECT * FROM {stage} WHERE {where} ORDER BY {col}", params)
+    finally:
+        con.execute(f"DROP TABLE IF EXISTS {stage}")
+
+def build_semantic_layer(db_path: Path | str = DEFAULT_DB, materialize_facts: bool = True):
+    """Create/refresh the fact table, sem_* views and agg_* rollup tables in the database.
+       materialize_facts=False keeps the fact table a view (e.g. over a Parquet lake)."""
+    con = open_db(db_path)
+    try:
+        for name, sql in FACT_TABLES.items():
+            if materialize_facts:
+                _create_sorted(con, name, sql)
+            else:
+                con.execute(f"CREATE OR REPLACE VIEW {name} AS {sql.rsplit('ORDER BY', 1)[0]}")
+        for name, sql in compile_views().items():
+            con.execute(f"CREATE OR REPLACE VIEW {name} AS {sql}")
+        for name, sql in compile_rollups().items():
+            con.execute(f"CREATE OR REPLACE TABLE {name} AS {sql}")
+    finally:
+        con.close()
+
+def semantic_objects_in(db_path: Path | str) -> set[str]:
+    with connect(db_path) as con:
+        have = {r[0] for r in con.execute(
+            "SELECT table_name FROM information_schema.tables WHERE table_schema='main'").fetchall()}
+    return have & SEMANTIC_OBJECTS
+
+def ensure_semantic_layer(db_path: Path | str = DEFAULT_DB):
+    """Build the semantic layer only if some of its objects are missing."""
+    if semantic_objects_in(db_path) != SEMANTIC_OBJECTS:
+        build_semantic_layer(db_path)
+
+def metrics_prompt() -> str:
+    """Compact metric catalogue for the LLM prompt."""
+    lines = ["Measures (name: definition):"]
+    for k, m in MEASURES.items():
+        lines.append(f"- {k}: {m['sql']}  -- {m['description']}")
+    lines.append("Views: sem_orders (one row per order: "
+                 + ", ".join(["order_id", "customer_id", "order_purchase_timestamp", "month"]
+                             + [k for k, d in DIMENSIONS.items() if d["grain"] == "order"]
+                             + list(ORDER_FACTS)) + "); "
+                 "sem_order_items (one row per item: order_id, order_item_id, order_purchase_timestamp, month, "
+                 + ", ".join([k for k, d in DIMENSIONS.items() if d["grain"] in ("order", "item")]
+                             + list(ITEM_FACTS)) + ")")
+    lines.append("fact_order_items is sem_order_items materialised with customer_id, delivery dates, is_late, "
+                 "delay_days, delivery_days: use it instead of joining orders/items/customers/products/"
+                 "translation/sellers (order-level facts repeat per item: aggregate them per DISTINCT order_id "
+                 "or use sem_orders)")
+    lines.append("Monthly rollups (prefer these when the question only needs month/year + their dims):")
+    for name, r in ROLLUPS.items():
+        cols = ", ".join(["month"] + r["dims"] + list(r["columns"]))
+        derived = "; ".join(f"{k} = {v}" for k, v in r["measures"].items())
+        lines.append(f"- {name}({cols}): {derived}")
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--db-path", type=str, default=str(DEFAULT_DB))
+    args = ap.parse_args()
+    build_semantic_layer(args.db_path)
+    print(f"✅ Semantic layer built in {args.db_path}: {', '.join(sorted(SEMANTIC_OBJECTS))}")
@@ -0,0 +1,213 @@
+# core/session.py
+# Conversation context: each chat session keeps its recent results registered (zero-copy,
+# Arrow) as views on its own in-memory DuckDB connection, so follow-ups like "now only for SP",
+# "top 3" or "sort by revenue ascending" are answered from the prior result instead of
+# regenerating and re-running the full query. Memory is bounded per session.
+from __future__ import annotations
+import os
+import re
+import difflib
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import duckdb
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from .db import configure, MEMORY_BUDGET_MB
+
+SESSION_MEMORY_MB = float(os.getenv("SESSION_MEMORY_MB", str(MEMORY_BUDGET_MB / 16) if MEMORY_BUDGET_MB else "64"))
+SESSION_MAX_RESULTS = int(os.getenv("SESSION_MAX_RESULTS", "5"))
+
+# words that carry no meaning of their own in a follow-up
+_FILLER = {
+    "now", "only", "just", "for", "and", "or", "show", "me", "the", "them", "it", "those", "these",
+    "same", "but", "please", "filter", "to", "keep", "with", "in", "of", "results", "result",
+    "rows", "instead", "what", "about", "how", "exclude", "excluding", "without", "except", "not",
+    "sort", "sorted", "order", "ordered", "by", "asc", "ascending", "desc", "descending", "top",
+    "first", "limit", "bottom", "then", "also", "where", "is", "are", "a", "an", "reverse",
+    "lowest", "highest", "state", "category", "from", "on", "that", "this", "one", "ones",
+}
+_CUES = re.compile(r"^\s*(now|and|what about|how about|same|only|just|instead|but|filter|"
+                   r"exclude|without|sort|order|top \d+|bottom \d+|limit)\b", re.I)
+_TOP_N = re.compile(r"\b(top|bottom|first)\s+\d+\b", re.I)
+_NEGATE = re.compile(r"\b(exclude|excluding|without|except|not)\b")
+
+class SessionContext:
+    def __init__(self, db_path: Path | str, memory_mb: float = SESSION_MEMORY_MB,
+                 max_results: int = SESSION_MAX_RESULTS):
+        if not Path(db_path).exists():
+            raise FileNotFoundError(f"DuckDB not found: {db_path}")
+        self.db_path = str(db_path)
+        # refinements only read the registered results, so no handle on the database file (which
+        # a rebuild may close or swap) and views private to the session
+        self.con = configure(duckdb.connect())
+        self.budget = int(memory_mb * 1024 * 1024)
+        self.max_results = max_results
+        self.results: OrderedDict[str, dict] = OrderedDict()  # view name -> {question, sql, table}
+        self._n = 0
+        self._lock = threading.Lock()
+
+    # ---- bookkeeping ----
+    @property
+    def last(self) -> dict | None:
+        return next(reversed(self.results.values())) if self.results else None
+
+    def context_key(self) -> str:
+        """Identifies what a follow-up would refer to (for result caching)."""
+        last = self.last
+        return hashlib.md5(last["sql"].encode()).hexdigest() if last else ""
+
+    def used_bytes(self) -> int:
+        return sum(r["table"].nbytes for r in self.results.values())
+
+    def remember(self, question: str, sql: str, table: pa.Table | None):
+        if table is None or not sql:
+            return
+        if self.last and self.last["sql"] == sql:
+            return  # same answer again (e.g. a cached rerun)
+        with self._lock:
+            self._n += 1
+            name = f"prev_{self._n}"
+            self.con.register(name, table)
+            self.results[name] = {"question": question, "sql": sql, "table": table}
+            self._evict()
+
+    def _evict(self):
+        # oldest first, never the latest result
+        while len(self.results) > 1 and (len(self.results) > self.max_results
+                                         or self.used_bytes() > self.budget):
+            name, _ = self.results.popitem(last=False)
+            self.con.unregister(name)
+
+    def clear(self):
+        with self._lock:
+            for name in list(self.results):
+                self.con.unregister(name)
+            self.results.clear()
+
+    def close(self):
+        self.clear()
+        self.con.close()
+
+    def __del__(self):  # dropped without close() (e.g. evicted from the API's session LRU)
+        try:
+            self.con.close()
+        except Exception:
+            pass
+
+    # ---- follow-ups ----
+    def is_followup(self, message: str) -> bool:
+        return bool(self.results) and bool(_CUES.match(message))
+
+    def refine(self, message: str) -> tuple[str, pa.Table] | None:
+        """Answer `message` as filter/sort/limit over the latest result when every part of it
+           maps onto that result. Returns (sql, table) or None; the SQL is self-contained
+           (previous query as a CTE) so it can be saved or re-run elsewhere."""
+        with self._lock:
+            if not self.results:
+                return None
+            name, last = next(reversed(self.results.items()))
+            plan = _plan_refinement(message, last["table"])
+            if plan is None:
+                return None
+            # concatenated, not str.format: the clauses quote result values, which may hold braces
+            table = self.con.execute(f"SELECT * FROM {name}" + plan).fetch_arrow_table()
+        sql = f"WITH prev AS (\n{last['sql'].strip().rstrip(';')}\n)\nSELECT * FROM prev" + plan + ";"
+        return sql, table
+
+    def followup_context(self, message: str) -> dict | None:
+        """Context for a follow-up that needs a new query: the previous question/SQL for the
+           prompt, plus a merged question for the template fast path, e.g.
+           'Top 5 categories by revenue' + 'now only for SP' -> 'Top 5 categories by revenue SP'."""
+        if not self.is_followup(message):
+            return None
+        last = self.last
+        extra = " ".join(w for w in re.findall(r"[\w']+", message)
+                         if w.lower() not in _FILLER or w.lower() in ("top", "bottom"))
+        prev_q = last["question"]
+        if _TOP_N.search(extra):
+            prev_q = _TOP_N.sub("", prev_q)  # the follow-up's "top N" replaces the previous one
+        # negations ("exclude SP") don't survive word-merging; leave those to the LLM
+        merged = None if _NEGATE.search(message.lower()) else " ".join(f"{prev_q} {extra}".split())
+        return {"question": last["question"], "sql": last["sql"], "merged": merged}
+
+def _quote(v) -> str:
+    return "'" + str(v).replace("'", "''") + "'"
+
+def _plan_refinement(message: str, table: pa.Table) -> str | None:
+    """WHERE / ORDER BY / LIMIT clauses (leading space) over `table` answering `message`, or None."""
+    text = " " + " ".join(re.findall(r"[\w']+", message.lower())) + " "
+    original = message
+    where, order, limit = [], None, None
+
+    # value filters: follow-up mentions values that exist in a text column of the result
+    for field in table.schema:
+        if not (pa.types.is_string(field.type) or pa.types.is_large_string(field.type)):
+            continue
+        uniques = pc.unique(table.column(field.name)).drop_null()
+        if len(uniques) > 1000:
+            continue
+        hits, neg = [], False
+        for v in sorted(uniques.to_pylist(), key=len, reverse=True):
+            vv = " ".join(re.findall(r"[\w']+", v.lower()))
+            if vv and f" {vv} " in text:
+                # short codes (SP, RJ) must be written in capitals to count
+                if len(vv) <= 2 and not re.search(rf"\b{re.escape(v.upper())}\b", original):
+                    continue
+                before = text[:text.index(f" {vv} ")]
+                neg = neg or bool(_NEGATE.search(" ".join(before.split()[-2:])))
+                hits.append(v)
+                text = text.replace(f" {vv} ", " ")
+        if hits:
+            op = "NOT IN" if neg else "IN"
+            where.append(f'"{field.name}" {op} ({", ".join(_quote(h) for h in hits)})')
+
+    numeric = [f.name for f in table.schema if pa.types.is_integer(f.type) or pa.types.is_floating(f.type)
+               or pa.types.is_decimal(f.type)]
+
+    m = re.search(r" (?:sort|sorted|order|ordered) (?:it |them |results |rows )?by ([\w ]+?)"
+                  r"( asc| ascending| desc| descending)? ", text)
+    if m:
+        col = _match_column(m.group(1), table.column_names)
+        if not col:
+            return None
+        desc = not (m.group(2) or "").strip().startswith("asc")
+        order = f'"{col}" {"DESC" if desc else "ASC"}'
+        text = text.replace(m.group(0), " ")
+        for w in m.group(1).split():
+            text = text.replace(f" {w} ", " ")
+
+    m = re.search(r" (top|first|limit|bottom) (\d+) ", text)
+    if m:
+        limit = int(m.group(2))
+        if m.group(1) == "bottom" and numeric:
+            order = f'"{numeric[-1]}" ASC'
+        text = text.replace(m.group(0), " ")
+    elif re.search(r" (reverse|lowest first|ascending) ", text) and numeric and order is None:
+        order = f'"{numeric[-1]}" ASC'
+
+    leftover = [w for w in text.split() if w not in _FILLER and not w.isdigit()]
+    if leftover or not (where or order or limit):
+        return None  # something the prior result can't answer: not a pure refinement
+
+    sql = ""
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    if order:
+        sql += f" ORDER BY {order}"
+    if limit:
+        sql += f" LIMIT {limit}"
+    return sql
+
+def _match_column(phrase: str, columns: list[str]) -> str | None:
+    key = phrase.strip().replace(" ", "_")
+    for c in columns:
+        if c.lower() == key:
+            return c
+    m = difflib.get_close_matches(key, [c.lower() for c in columns], n=1, cutoff=0.5)
+    if not m:
+        m = [c.lower() for c in columns if key in c.lower()][:1]
+    return next((c for c in columns if c.lower() == m[0]), None) if m else None
@@ -1,13 +1,26 @@
 # core/sql_agent.py
-import os, re, json
+import os, re, json, time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
 from pathlib import Path
 
-import duckdb
-import pandas as pd
-import sqlparse
 from dotenv import load_dotenv
 import google.generativeai as genai
 
+from .sql_repair import validate_and_fix, explain_sql
+from .sql_safety import check_sql, is_safe_select, is_syntax_error
+from .schema_utils import table_rows
+from .templates import match_template
+from .semantic import metrics_prompt, SEMANTIC_OBJECTS, FACT_TABLES
+from .executor import current_token
+from . import metrics
+from .db import connect, RESULT_MAX_ROWS
+from .results import fetch_arrow
+from .advisor import log_query
+from .approx import rewrite as approx_rewrite, annotate
+
 # --------------------------------------------------------------------------------------
 # Env & paths (patched to load .env reliably)
 # --------------------------------------------------------------------------------------
@@ -30,6 +43,15 @@ genai.configure(api_key=GEMINI_API_KEY)
 DEFAULT_DB = REPO_ROOT / "db" / "olist.duckdb"
 DEFAULT_SCHEMA = REPO_ROOT / "docs" / "schema.json"
 
+# Speculative mode (opt-in): generate N candidates in parallel, run the cheapest valid plan.
+SQL_CANDIDATES = int(os.getenv("SQL_CANDIDATES", "1"))           # 1 = off
+SQL_COST_BUDGET = float(os.getenv("SQL_COST_BUDGET", "0"))       # max plan cost (est. rows), 0 = no limit
+SQL_SPECULATIVE_GRACE_S = float(os.getenv("SQL_SPECULATIVE_GRACE_S", "1.5"))  # wait for cheaper ones after first valid
+SPECULATIVE_LOG = REPO_ROOT / "data" / "cache" / "speculative_log.jsonl"
+# question -> SQL that answered it (per database): a repeated question skips the LLM even after
+# its result has aged out of the result cache; warmed from saved insights (core/warmup.py)
+SQL_MEMO_SIZE = int(os.getenv("SQL_MEMO_SIZE", "512"))
+
 # --------------------------------------------------------------------------------------
 # Prompt & examples
 # --------------------------------------------------------------------------------------
@@ -40,17 +62,18 @@ Rules:
 - No DDL/DML and no modifications (no CREATE/INSERT/UPDATE/DELETE/DROP/ALTER/TRUNCATE).
 - Prefer ANSI SQL.
 - Add clear aliases for aggregates (e.g., AS revenue).
+- Use the METRICS definitions (revenue, late_rate_pct, ...) instead of inventing your own; prefer the
+  monthly rollups / sem_* views when they can answer the question.
+- For item-level questions use fact_order_items (pre-joined, English category) instead of joining
+  orders, items, customers, products and product_category_translation yourself.
+- Columns listed with {'a'|'b'} hold exactly those values (most frequent first): filter on them as
+  written (e.g. order_status = 'delivered', customer_state = 'SP'); lo..hi is a column's range.
 """
 
 _EXAMPLES = [
     ("Top 5 product categories by revenue",
-     """WITH rev AS (
-  SELECT i.product_id, (i.price + i.freight_value) AS line_rev
-  FROM items i
-)
-SELECT p.product_category_name, SUM(r.line_rev) AS revenue
-FROM rev r
-JOIN products p ON p.product_id = r.product_id
+     """SELECT category, SUM(line_revenue) AS revenue
+FROM fact_order_items
 GROUP BY 1
 ORDER BY revenue DESC
 LIMIT 5;"""),
@@ -66,10 +89,9 @@ GROUP BY 1
 ORDER BY avg_delay_days DESC;"""),
 
     ("How many orders per month in 2018?",
-     """SELECT date_trunc('month', o.order_purchase_timestamp) AS month,
-       COUNT(*) AS orders
-FROM orders o
-WHERE EXTRACT(YEAR FROM o.order_purchase_timestamp) = 2018
+     """SELECT month, SUM(orders) AS orders
+FROM agg_monthly_state
+WHERE month >= '2018-01-01' AND month < '2019-01-01'
 GROUP BY 1
 ORDER BY 1;"""),
 
@@ -80,91 +102,118 @@ GROUP BY 1
 ORDER BY cnt DESC;"""),
 
     ("Average review score by product category (top 10)",
-     """SELECT p.product_category_name, AVG(r.review_score) AS avg_score
-FROM items i
-JOIN products p ON p.product_id = i.product_id
-JOIN reviews r ON r.order_id = i.order_id
+     """SELECT f.category, AVG(r.review_score) AS avg_score
+FROM fact_order_items f
+JOIN reviews r ON r.order_id = f.order_id
 GROUP BY 1
 ORDER BY avg_score DESC
 LIMIT 10;"""),
 
     ("Top 10 cities by total freight value",
-     """SELECT c.customer_city, SUM(i.freight_value) AS total_freight
-FROM orders o
-JOIN customers c ON c.customer_id = o.customer_id
-JOIN items i ON i.order_id = o.order_id
+     """SELECT customer_city, SUM(freight_value) AS total_freight
+FROM fact_order_items
 GROUP BY 1
 ORDER BY total_freight DESC
 LIMIT 10;"""),
 
     ("Overall late delivery rate",
-     """SELECT
-  100.0 * SUM(CASE WHEN o.order_delivered_customer_date > o.order_estimated_delivery_date THEN 1 ELSE 0 END)
-  / NULLIF(COUNT(*),0) AS late_rate_pct
-FROM orders o
-WHERE o.order_delivered_customer_date IS NOT NULL
-  AND o.order_estimated_delivery_date IS NOT NULL;"""),
-
-    ("Top categories by revenue with English names",
-     """WITH line AS (
-  SELECT i.product_id, (i.price + i.freight_value) AS line_rev
-  FROM items i
-)
-SELECT t.product_category_name_english AS category_en,
-       SUM(l.line_rev) AS revenue
-FROM line l
-JOIN products p ON p.product_id = l.product_id
-LEFT JOIN product_category_translation t
-  ON t.product_category_name = p.product_category_name
+     """SELECT 100.0 * SUM(late_orders) / NULLIF(SUM(delivered_orders), 0) AS late_rate_pct
+FROM agg_monthly_state;"""),
+
+    ("Late delivery rate by number of items in the order",
+     """SELECT n_items, 100.0 * AVG(is_late) AS late_rate_pct, COUNT(*) AS orders
+FROM sem_orders
+WHERE is_late IS NOT NULL
 GROUP BY 1
-ORDER BY revenue DESC
-LIMIT 10;"""),
+ORDER BY 1;"""),
+
+    ("Average delivery delay by category in SP (per order, not per item)",
+     """SELECT category, AVG(delay_days) AS avg_delay_days
+FROM (SELECT DISTINCT order_id, category, delay_days
+      FROM fact_order_items
+      WHERE customer_state = 'SP' AND delay_days IS NOT NULL)
+GROUP BY 1
+ORDER BY avg_delay_days DESC;"""),
 ]
 
 # --------------------------------------------------------------------------------------
 # Prompt builders
 # --------------------------------------------------------------------------------------
+def _stat_text(v) -> str:
+    if isinstance(v, str):
+        return v[:10]  # ISO date/timestamp: the day is enough for filters
+    return f"{v:g}" if isinstance(v, float) else str(v)
+
+def _column_text(c: dict) -> str:
+    """name:TYPE, then its values (low-cardinality text) or range, then the hint."""
+    out = f"{c['name']}:{c.get('type','')}"
+    if c.get("values"):
+        out += " {" + "|".join("'" + str(v)[:40].replace("'", "''") + "'" for v in c["values"]) + "}"
+    elif "min" in c and c["min"] is not None:
+        out += f" {_stat_text(c['min'])}..{_stat_text(c['max'])}"
+    return out + (f" [{c['hint']}]" if c.get("hint") else "")
+
 def _schema_text(schema_json: dict) -> str:
     parts = []
     for t, cols in schema_json.items():
-        cols_str = ", ".join([f"{c['name']}:{c.get('type','')}" for c in cols])
-        parts.append(f"{t}({cols_str})")
+        if t in SEMANTIC_OBJECTS and t not in FACT_TABLES:
+            continue  # described compactly in the METRICS section
+        rows = table_rows(cols)
+        parts.append(f"{t}" + (f"[{rows:,} rows]" if rows is not None else "")
+                     + f"({', '.join(_column_text(c) for c in cols)})")
     return "\n".join(parts)
 
 def _examples_text() -> str:
     return "\n\n".join([f"-- Q: {q}\n{sql}" for q, sql in _EXAMPLES])
 
-def build_prompt(schema_json: dict, question: str) -> str:
+def _context_text(context: dict | None) -> str:
+    if not context:
+        return ""
+    return f"""
+PREVIOUS QUESTION: {context['question']}
+PREVIOUS SQL:
+{context['sql']}
+The next question may be a follow-up: if so, modify the previous SQL rather than starting over.
+"""
+
+def build_prompt(schema_json: dict, question: str, context: dict | None = None) -> str:
     return f"""{_SYS_PROMPT}
 
 SCHEMA:
 {_schema_text(schema_json)}
 
+METRICS:
+{metrics_prompt()}
+
 EXAMPLES:
 {_examples_text()}
-
+{_context_text(context)}
 Now write only SQL for:
 Q: {question}
 SQL:
 """.strip()
 
+def build_repair_prompt(schema_json: dict, sql: str, error: str) -> str:
+    """Minimal repair prompt: only the failing SQL, the error and the tables it touches."""
+    used = {t: cols for t, cols in schema_json.items()
+            if re.search(rf"\b{re.escape(t)}\b", sql, flags=re.I)}
+    return f"""Fix this DuckDB SQL query. Output only the corrected SQL SELECT (no prose).
+
+SCHEMA:
+{_schema_text(used or schema_json)}
+
+SQL:
+{sql}
+
+ERROR:
+{error}
+
+FIXED SQL:
+""".strip()
+
 # --------------------------------------------------------------------------------------
-# Safety & helpers
+# Helpers (the safety check is core/sql_safety.py)
 # --------------------------------------------------------------------------------------
-def is_safe_select(sql: str) -> bool:
-    statements = [s for s in sqlparse.split(sql) if s.strip()]
-    if len(statements) != 1:
-        return False
-    sql_up = statements[0].upper()
-    banned = ["INSERT","UPDATE","DELETE","DROP","ALTER","CREATE",
-              "REPLACE","TRUNCATE","ATTACH","DETACH","PRAGMA","COPY"]
-    if any(b in sql_up for b in banned):
-        return False
-    first = sqlparse.parse(statements[0])[0]
-    tokens = [t for t in first.tokens if not t.is_whitespace]
-    head = tokens[0].value.upper() if tokens else ""
-    return head.startswith("SELECT") or head.startswith("WITH")
-
 _CODE_FENCE_RE = re.compile(r"```sql\s*(.*?)```", flags=re.I|re.S)
 def _extract_code_block(text: str) -> str:
     m = _CODE_FENCE_RE.search(text or "")
@@ -172,34 +221,88 @@ def _extract_code_block(text: str) -> str:
         return m.group(1).strip()
     return (text or "").strip().strip("`")
 
-def _call_gemini(prompt: str, model: str) -> str:
+def _call_gemini(prompt: str, model: str, generation_config: dict | None = None, purpose: str = "sql") -> str:
+    tok = current_token()
+    if tok: tok.check()  # superseded job: don't spend another LLM call
     try:
-        return genai.GenerativeModel(model).generate_content(prompt).text
+        return metrics.llm_call(purpose, genai.GenerativeModel(model).generate_content, prompt,
+                                generation_config=generation_config).text
     except Exception as e:
         if "NotFound" in str(e):
             for alt in ["gemini-1.5-flash-8b","gemini-1.5-pro-002"]:
-                try: return genai.GenerativeModel(alt).generate_content(prompt).text
+                try: return metrics.llm_call(purpose, genai.GenerativeModel(alt).generate_content, prompt,
+                                             generation_config=generation_config).text
                 except: pass
         raise
 
 # --------------------------------------------------------------------------------------
 # Public API
 # --------------------------------------------------------------------------------------
-def generate_sql(question: str, schema_json: dict, model: str = MODEL) -> str:
-    prompt = build_prompt(schema_json, question)
-    return _extract_code_block(_call_gemini(prompt, model))
-
-def execute_sql(sql: str, db_path: Path | str = DEFAULT_DB):
+def generate_sql(question: str, schema_json: dict, model: str = MODEL,
+                 temperature: float | None = None, context: dict | None = None) -> str:
+    prompt = build_prompt(schema_json, question, context)
+    config = None if temperature is None else {"temperature": temperature}
+    return _extract_code_block(_call_gemini(prompt, model, config))
+
+def execute_sql(sql: str, db_path: Path | str = DEFAULT_DB, approx: bool = False):
+    """Run `sql`; returns (pyarrow.Table, None) or (None, error).
+       approx=True runs the sampled/sketch rewrite from core/approx.py when one applies
+       (exact query if it doesn't or fails); approx_info(table) describes what was done."""
     db_path = Path(db_path)
-    con = duckdb.connect(str(db_path))
-    try:    return con.execute(sql).fetchdf(), None
-    except Exception as e: return None, str(e)
-    finally: con.close()
+    if approx:
+        try:    sql_a, info = approx_rewrite(sql, db_path)
+        except Exception: sql_a, info = sql, {"mode": "exact"}
+        if info["mode"] != "exact":
+            tbl, err = _run_sql(sql_a, db_path)
+            if not err: return annotate(tbl, info), None
+    return _run_sql(sql, db_path)
+
+def _run_sql(sql: str, db_path: Path):
+    tok = current_token()
+    t0 = time.perf_counter()
+    with connect(db_path) as con:
+        if tok: tok.attach(con)  # lets the execution service interrupt this query
+        try:
+            tbl = fetch_arrow(con.execute(sql), RESULT_MAX_ROWS)
+            elapsed = time.perf_counter() - t0
+            log_query(sql, elapsed, tbl.num_rows)  # workload for core/advisor.py
+            metrics.record("stage", "execute", elapsed, sql=sql, db=str(db_path), rows=tbl.num_rows)
+            return tbl, None
+        except Exception as e:
+            elapsed = time.perf_counter() - t0
+            log_query(sql, elapsed, None, str(e))
+            metrics.record("stage", "execute", elapsed, sql=sql, db=str(db_path), error=str(e))
+            return None, str(e)
+        finally:
+            if tok: tok.detach(con)
+
+_sql_memo: OrderedDict[tuple[str, str], str] = OrderedDict()
+_memo_lock = threading.Lock()
+
+def _memo_key(question: str, db_path) -> tuple[str, str]:
+    return " ".join(question.lower().split()), str(Path(db_path).resolve())
+
+def remember_sql(question: str, sql: str, db_path: Path | str = DEFAULT_DB):
+    with _memo_lock:
+        key = _memo_key(question, db_path)
+        _sql_memo[key] = sql
+        _sql_memo.move_to_end(key)
+        while len(_sql_memo) > SQL_MEMO_SIZE:
+            _sql_memo.popitem(last=False)
+
+def recall_sql(question: str, db_path: Path | str = DEFAULT_DB) -> str | None:
+    with _memo_lock:
+        return _sql_memo.get(_memo_key(question, db_path))
 
 def ask(question: str,
         schema_path: Path | str = DEFAULT_SCHEMA,
         db_path: Path | str = DEFAULT_DB,
-        retry: bool = True):
+        retry: bool = True,
+        candidates: int | None = None,
+        context: dict | None = None,
+        approx: bool = False):
+    """context: follow-up context from SessionContext.followup_context (previous question/SQL).
+       approx: answer from samples/sketches where possible (see execute_sql)."""
 
     schema_path = Path(schema_path)
     db_path = Path(db_path)
@@ -207,19 +310,148 @@ def ask(question: str,
     if not schema_path.exists(): raise FileNotFoundError(f"Schema not found: {schema_path}")
     if not db_path.exists(): raise FileNotFoundError(f"DuckDB not found: {db_path}")
 
+    # Fast path: known question shapes compile straight to SQL, no LLM call
+    sql = match_template((context or {}).get("merged") or question, db_path)
+    metrics.hit("template", bool(sql))
+    if sql:
+        tbl, err = execute_sql(sql, db_path, approx)
+        if not err: return tbl, sql, None
+
+    # Seen this question before (a follow-up depends on its context, so not those)
+    sql = recall_sql(question, db_path) if context is None else None
+    if context is None:
+        metrics.hit("sql_memo", bool(sql))
+    if sql:
+        tbl, err = execute_sql(sql, db_path, approx)
+        if not err: return tbl, sql, None
+
+    tbl, sql, err = _ask_llm(question, schema_path, db_path, retry, candidates, context, approx)
+    if not err and context is None:
+        remember_sql(question, sql, db_path)
+    return tbl, sql, err
+
+def _ask_llm(question, schema_path, db_path, retry, candidates, context, approx):
     schema_json = json.load(open(schema_path,"r",encoding="utf-8"))
-    sql = generate_sql(question, schema_json)
 
-    if not is_safe_select(sql): return None, sql, "❌ Unsafe SQL blocked"
+    n = SQL_CANDIDATES if candidates is None else candidates
+    if n > 1:
+        return _ask_speculative(question, schema_json, db_path, n, context, approx)
+
+    sql = generate_sql(question, schema_json, context=context)
 
-    df, err = execute_sql(sql, db_path)
+    unsafe = check_sql(sql)
+    if unsafe and not (retry and is_syntax_error(unsafe)): return None, sql, f"❌ Unsafe SQL blocked ({unsafe})"
 
+    # Bind against the schema before running: most failures are caught (and fixed) here
+    with metrics.timed("validate"):
+        sql, err = (sql, unsafe) if unsafe else validate_and_fix(sql, schema_json, db_path)
     if err and retry:
-        repair = build_prompt(schema_json, question) + f"\n\nError:\n{err}\nFix SQL only:"
-        try:
-            sql2 = _extract_code_block(_call_gemini(repair, MODEL))
-            if is_safe_select(sql2):
-                return execute_sql(sql2, db_path)[0], sql2, None
-        except: pass
+        sql, err = _repair(sql, err, schema_json, db_path)
+        retry = False
+    if err: return None, sql, err
+    # tables are known now (the binder / repair mapped any misspelt ones): whitelist them
+    unsafe = check_sql(sql, db_path)
+    if unsafe: return None, sql, f"❌ Unsafe SQL blocked ({unsafe})"
+
+    tbl, err = execute_sql(sql, db_path, approx)
 
-    return df, sql, err
+    if err and retry:
+        sql2, err2 = _repair(sql, err, schema_json, db_path)
+        if not err2 and sql2 != sql and is_safe_select(sql2, db_path):
+            tbl2, err2 = execute_sql(sql2, db_path, approx)
+            if not err2: return tbl2, sql2, None
+
+    return tbl, sql, err
+
+def _repair(sql: str, err: str, schema_json: dict, db_path: Path):
+    """One targeted LLM repair round-trip; returns (sql, err) unchanged if it doesn't help."""
+    try:
+        sql2 = _extract_code_block(_call_gemini(build_repair_prompt(schema_json, sql, err), MODEL, purpose="repair"))
+    except Exception:
+        return sql, err
+    if not is_safe_select(sql2): return sql, err
+    sql2, err2 = validate_and_fix(sql2, schema_json, db_path)
+    return (sql2, None) if err2 is None else (sql, err)
+
+# --------------------------------------------------------------------------------------
+# Speculative multi-candidate generation
+# --------------------------------------------------------------------------------------
+# sampling temperatures for candidates 1..n-1, reused in turn (Gemini rejects values above 2.0,
+# and SQL gets sloppy well before that)
+_CANDIDATE_TEMPS = (0.6, 0.8, 1.0, 1.2)
+
+def _candidate(i: int, question: str, schema_json: dict, db_path: Path, context: dict | None = None) -> dict:
+    """Generate one candidate and bind/cost it. Candidate 0 uses the model default,
+       the rest are sampled hotter so they actually differ."""
+    c = {"index": i, "sql": None, "cost": None, "error": None}
+    temperature = None if i == 0 else _CANDIDATE_TEMPS[(i - 1) % len(_CANDIDATE_TEMPS)]
+    try:
+        sql = generate_sql(question, schema_json, temperature=temperature, context=context)
+    except Exception as e:
+        c["error"] = str(e); return c
+    c["sql"] = sql
+    if not is_safe_select(sql):
+        c["error"] = "unsafe"; return c
+    sql, err = validate_and_fix(sql, schema_json, db_path)
+    c["sql"] = sql
+    if err:
+        c["error"] = err; return c
+    if not is_safe_select(sql, db_path):
+        c["error"] = "unsafe"; return c
+    c["cost"], c["error"] = explain_sql(sql, db_path)
+    if c["cost"] is not None and SQL_COST_BUDGET and c["cost"] > SQL_COST_BUDGET:
+        c["error"] = f"over cost budget ({c['cost']:,.0f} > {SQL_COST_BUDGET:,.0f})"
+    return c
+
+def _ask_speculative(question: str, schema_json: dict, db_path: Path, n: int,
+                     context: dict | None = None, approx: bool = False):
+    t0 = time.perf_counter()
+    pool = ThreadPoolExecutor(max_workers=n)
+    pending = {pool.submit(_candidate, i, question, schema_json, db_path, context) for i in range(n)}
+    done, deadline = [], None
+    while pending:
+        timeout = None if deadline is None else max(0.0, deadline - time.perf_counter())
+        finished, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+        if not finished:
+            break  # grace window over
+        done += [f.result() for f in finished]
+        if deadline is None and any(c["error"] is None for c in done):
+            deadline = time.perf_counter() + SQL_SPECULATIVE_GRACE_S
+    # drop stragglers: queued ones never start, in-flight LLM calls are ignored
+    pool.shutdown(wait=False, cancel_futures=True)
+
+    valid, seen = [], set()
+    for c in sorted(done, key=lambda c: (c["cost"] is None, c["cost"] or 0, c["index"])):
+        if c["error"] is None and c["sql"] not in seen:
+            seen.add(c["sql"]); valid.append(c)
+
+    tbl, sql, err, winner = None, None, None, None
+    for c in valid:
+        tbl, err = execute_sql(c["sql"], db_path, approx)
+        sql = c["sql"]
+        if not err:
+            winner = c; break
+    if not valid:
+        first = min(done, key=lambda c: c["index"]) if done else {"sql": None, "error": "no candidates"}
+        sql, err = first["sql"], f"❌ No valid SQL candidate: {first['error']}"
+
+    _log_speculative(question, n, done, winner, time.perf_counter() - t0)
+    return (tbl, sql, None) if winner else (None, sql, err)
+
+def _log_speculative(question: str, n: int, done: list[dict], winner: dict | None, elapsed: float):
+    rec = {
+        "timestamp": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S UTC"),
+        "question": question,
+        "n": n,
+        "received": len(done),
+        "winner": None if winner is None else winner["index"],
+        "winner_cost": None if winner is None else winner["cost"],
+        "candidates": [{"index": c["index"], "cost": c["cost"], "error": c["error"]} for c in done],
+        "elapsed_s": round(elapsed, 3),
+    }
+    try:
+        SPECULATIVE_LOG.parent.mkdir(parents=True, exist_ok=True)
+        with SPECULATIVE_LOG.open("a", encoding="utf-8") as f:
+            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+    except OSError:
+        pass
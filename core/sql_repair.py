@@ -0,0 +1,147 @@
+# core/sql_repair.py
+from __future__ import annotations
+import re, json, difflib
+from pathlib import Path
+
+from .db import connect
+
+# --------------------------------------------------------------------------------------
+# Pre-execution validation
+# --------------------------------------------------------------------------------------
+def explain_sql(sql: str, db_path: Path | str) -> tuple[float | None, str | None]:
+    """Bind + plan the query with EXPLAIN (never runs it).
+       Returns (cost, None) or (None, error); cost = sum of the planner's estimated cardinalities."""
+    with connect(db_path) as con:
+        try:
+            plan = con.execute("EXPLAIN (FORMAT JSON) " + sql.strip().rstrip(";")).fetchall()
+            return float(sum(_plan_cost(n) for n in json.loads(plan[0][1]))), None
+        except Exception as e:
+            return None, str(e)
+
+def _plan_cost(node: dict) -> float:
+    est = node.get("extra_info", {}).get("Estimated Cardinality", 0)
+    try: est = float(est)
+    except (TypeError, ValueError): est = 0.0
+    return est + sum(_plan_cost(c) for c in node.get("children", []))
+
+def validate_sql(sql: str, db_path: Path | str) -> str | None:
+    """Returns the DuckDB bind/parse error message, or None when the SQL is valid."""
+    return explain_sql(sql, db_path)[1]
+
+# --------------------------------------------------------------------------------------
+# Deterministic fixes (no LLM) for the common binder/catalog errors
+# --------------------------------------------------------------------------------------
+_NOT_ALIAS = {"ON", "USING", "WHERE", "GROUP", "ORDER", "LIMIT", "JOIN", "LEFT", "RIGHT",
+              "INNER", "OUTER", "FULL", "CROSS", "HAVING", "UNION", "WINDOW", "QUALIFY", "AS"}
+_FROM_RE = re.compile(r"\b(?:FROM|JOIN)\s+([A-Za-z_]\w*)"
+                      rf"(?:\s+(?:AS\s+)?(?!(?:{'|'.join(_NOT_ALIAS)})\b)([A-Za-z_]\w*))?", re.I)
+
+_COL_OF_TABLE_RE = re.compile(r'Table "(\w+)" does not have a column named "(\w+)"')
+_COL_NOT_FOUND_RE = re.compile(r'Referenced column "(\w+)" not found')
+_CANDIDATES_RE = re.compile(r'Candidate bindings: (.*)')
+_TABLE_REF_RE = re.compile(r'Referenced table "(\w+)" not found!\s*Candidate tables: (.*)')
+_MISSING_TABLE_RE = re.compile(r'Table with name (\w+) does not exist')
+_AMBIGUOUS_RE = re.compile(r'Ambiguous reference to column name "(\w+)" \(use: (.*?)\)')
+
+def _closest(word: str, options: list[str]) -> str | None:
+    m = difflib.get_close_matches(word.lower(), [o.lower() for o in options], n=1, cutoff=0.6)
+    if not m:
+        return None
+    return next(o for o in options if o.lower() == m[0])
+
+def _alias_map(sql: str) -> dict[str, str]:
+    """alias (or bare table name) -> table name, as written in FROM/JOIN clauses."""
+    aliases = {}
+    for table, alias in _FROM_RE.findall(sql):
+        aliases[table.lower()] = table
+        if alias:
+            aliases[alias.lower()] = table
+    return aliases
+
+def _columns(schema_json: dict, table: str) -> list[str]:
+    for t, cols in schema_json.items():
+        if t.lower() == table.lower():
+            return [c["name"] for c in cols]
+    return []
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+
+def _sub_code(pattern: str, new: str, sql: str, flags: int = 0) -> str:
+    # substitute outside '...' string literals: a value like 'customer_stat' is data, not a name
+    out, pos = [], 0
+    for m in _STRING_RE.finditer(sql):
+        out += [re.sub(pattern, lambda _: new, sql[pos:m.start()], flags=flags), m.group(0)]
+        pos = m.end()
+    return "".join(out) + re.sub(pattern, lambda _: new, sql[pos:], flags=flags)
+
+def _sub_bare(sql: str, old: str, new: str) -> str:
+    # unqualified identifier only (not preceded by "alias.")
+    return _sub_code(rf"(?<![\w.]){re.escape(old)}(?!\w)", new, sql)
+
+def _sub_qualified(sql: str, qual: str, old: str, new: str) -> str:
+    return _sub_code(rf"(?<![\w.]){re.escape(qual)}\.{re.escape(old)}(?!\w)", new, sql, flags=re.I)
+
+def fix_sql(sql: str, err: str, schema_json: dict) -> str | None:
+    """Apply one deterministic fix for a binder/catalog error.
+       Returns the rewritten SQL, or None if the error isn't fixable locally."""
+    aliases = _alias_map(sql)
+
+    m = _MISSING_TABLE_RE.search(err)
+    if m:
+        bad = m.group(1)
+        good = _closest(bad, list(schema_json))
+        return _sub_bare(sql, bad, good) if good else None
+
+    m = _COL_OF_TABLE_RE.search(err)
+    if m:
+        qual, col = m.groups()
+        table = aliases.get(qual.lower(), qual)
+        # right column, wrong alias: move it to the joined table that has it
+        quals = {t.lower(): t for t in aliases.values()}
+        quals.update({t.lower(): a for a, t in aliases.items() if a != t.lower()})
+        for t, a in quals.items():
+            if t != table.lower() and col in _columns(schema_json, t):
+                return _sub_qualified(sql, qual, col, f"{a}.{col}")
+        good = _closest(col, _columns(schema_json, table))
+        return _sub_qualified(sql, qual, col, f"{qual}.{good}") if good else None
+
+    m = _COL_NOT_FOUND_RE.search(err)
+    if m:
+        col = m.group(1)
+        cand = _CANDIDATES_RE.search(err)
+        options = [c.strip().strip('"').split(".")[-1] for c in cand.group(1).split(",")] if cand else []
+        if not options:
+            options = [c for t in aliases.values() for c in _columns(schema_json, t)]
+        good = _closest(col, options)
+        return _sub_bare(sql, col, good) if good else None
+
+    m = _TABLE_REF_RE.search(err)
+    if m:
+        bad = m.group(1)
+        options = [c.strip().strip('"') for c in m.group(2).split(",")]
+        good = options[0] if len(options) == 1 else _closest(bad, options)
+        if not good:
+            return None
+        return _sub_code(rf"(?<![\w.]){re.escape(bad)}\.", f"{good}.", sql)
+
+    m = _AMBIGUOUS_RE.search(err)
+    if m:
+        col = m.group(1)
+        options = re.findall(r'"([\w.]+)"', m.group(2))
+        return _sub_bare(sql, col, options[0]) if options else None
+
+    return None
+
+def validate_and_fix(sql: str, schema_json: dict, db_path: Path | str,
+                     max_fixes: int = 3) -> tuple[str, str | None]:
+    """Validate, applying up to `max_fixes` local fixes. Returns (sql, error_or_None)."""
+    err = validate_sql(sql, db_path)
+    for _ in range(max_fixes):
+        if err is None:
+            break
+        fixed = fix_sql(sql, err, schema_json)
+        if not fixed or fixed == sql:
+            break
+        new_err = validate_sql(fixed, db_path)
+        sql, err = fixed, new_err
+    return sql, err
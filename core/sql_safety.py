@@ -0,0 +1,194 @@
+# core/sql_safety.py
+# Safety check for generated / client SQL, on DuckDB's own parser: json_serialize_sql only
+# serializes SELECTs, so it tells us the statement count and type, and its AST gives every
+# table and function the query touches. A query passes when it is exactly one SELECT (CTEs,
+# set operations, DESCRIBE included) and
+#   - every table function is whitelisted (unnest/range/generate_series: no read_csv, glob,
+#     query(), duckdb_* ...), and so is every built-in scalar/aggregate function: the
+#     deterministic ones in duckdb_functions(), the clock, and pure built-in macros (nullif,
+#     count_if, list_* ...). Settings, sequences, random, session and catalog introspection
+#     are refused, and so is any built-in a newer DuckDB adds that isn't deterministic
+#   - no table reference is a file path (FROM 'orders.csv' replacement scans)
+#   - with a database: every table is one of its tables/views (attached ones included) or a CTE
+# Keywords inside names and strings don't matter any more (replace(), review_creation_date).
+# Verdicts are cached by SQL hash and catalog version.
+from __future__ import annotations
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import duckdb
+
+from .db import connect, get_pool
+
+SQL_SAFETY_CACHE = int(os.getenv("SQL_SAFETY_CACHE", "2048"))  # cached verdicts
+
+TABLE_FUNCTIONS = {"unnest", "range", "generate_series"}
+# not deterministic, but only read the clock
+CLOCK_FUNCTIONS = {"now", "today", "current_date", "get_current_time", "get_current_timestamp",
+                   "transaction_timestamp"}
+# built-in macros that only compute on their arguments (the rest read the session or catalog)
+PURE_MACROS = {"count_if", "date_add", "fdiv", "fmod", "geomean", "geometric_mean", "json",
+               "json_group_array", "json_group_object", "json_group_structure", "map_contains_entry",
+               "map_contains_value", "md5_number_lower", "md5_number_upper", "nullif", "round_even",
+               "roundbankers", "split_part"}
+PURE_MACRO_PREFIXES = ("list_", "array_")
+# deterministic, but reach outside the query: configuration, environment
+DENIED_FUNCTIONS = {"getenv", "current_setting"}
+_PATH_CHARS = set("./\\:")
+
+_parser = duckdb.connect()
+_parser_lock = threading.Lock()
+_verdicts: OrderedDict[tuple, str | None] = OrderedDict()
+_verdicts_lock = threading.Lock()
+_catalogs: dict[str, tuple[int, set[str]]] = {}
+
+def _function_lists() -> tuple[set[str], set[str]]:
+    """(every built-in function name, the allowed ones) of this DuckDB build."""
+    builtin, allowed = set(), set()
+    for name, kind, stability in _parser.execute(
+            "SELECT function_name, function_type, stability FROM duckdb_functions()").fetchall():
+        name = name.lower()
+        builtin.add(name)
+        if (kind in ("scalar", "aggregate") and stability == "CONSISTENT") or name in CLOCK_FUNCTIONS \
+                or (kind == "macro" and (name in PURE_MACROS or name.startswith(PURE_MACRO_PREFIXES))):
+            allowed.add(name)
+    return builtin, allowed - DENIED_FUNCTIONS
+
+_BUILTIN_FUNCTIONS, ALLOWED_FUNCTIONS = _function_lists()
+
+# --------------------------------------------------------------------------------------
+# AST walk
+# --------------------------------------------------------------------------------------
+def _parse(sql: str) -> tuple[list | None, str | None]:
+    """(statements, error); error is 'syntax error: ...' for parser errors."""
+    with _parser_lock:
+        out = json.loads(_parser.execute("SELECT json_serialize_sql(?::VARCHAR)", [sql]).fetchone()[0])
+    if not out.get("error"):
+        return out["statements"], None
+    if out.get("error_type") == "parser":
+        msg = out.get("error_message") or ""
+        return None, msg if msg.startswith("syntax error") else f"syntax error: {msg}"
+    return None, "only a single SELECT is allowed"
+
+def _check_table(ref: dict, ctes: frozenset, tables: set[str] | None) -> str | None:
+    name = ref["table_name"].strip('"')
+    parts = [p for p in (ref.get("catalog_name"), ref.get("schema_name"), name) if p]
+    if len(parts) == 1 and name.lower() in ctes:
+        return None
+    if _PATH_CHARS & set(name):
+        return f"file access: {name}"
+    if tables is not None and ".".join(parts).lower() not in tables:
+        return f"unknown table: {'.'.join(parts)}"
+    return None
+
+def _check_function(fn: dict, table_fn: bool) -> str | None:
+    name = fn["function_name"].lower()
+    if table_fn:
+        return None if name in TABLE_FUNCTIONS else f"table function not allowed: {name}"
+    if name in ALLOWED_FUNCTIONS:
+        return None
+    if name in _BUILTIN_FUNCTIONS or name in DENIED_FUNCTIONS:
+        return f"function not allowed: {name}"
+    return None  # not a built-in: fails in the binder (and gets repaired), it can't run
+
+def _walk(node, ctes: frozenset, tables: set[str] | None) -> str | None:
+    if isinstance(node, list):
+        return next((r for r in (_walk(n, ctes, tables) for n in node) if r), None)
+    if not isinstance(node, dict):
+        return None
+    cte_map = node.get("cte_map")
+    if cte_map and cte_map.get("map"):
+        ctes = ctes | {e["key"].lower() for e in cte_map["map"]}
+    kind = node.get("type")
+    if kind == "BASE_TABLE":
+        return _check_table(node, ctes, tables)
+    if kind == "SHOW_REF" and node.get("table_name"):  # DESCRIBE / SUMMARIZE <table>
+        return _check_table(node, ctes, tables)
+    if kind == "TABLE_FUNCTION":
+        return (_check_function(node["function"], True)
+                or _walk(node["function"].get("children"), ctes, tables))
+    if node.get("class") == "FUNCTION":
+        err = _check_function(node, False)
+        if err:
+            return err
+    return next((r for r in (_walk(v, ctes, tables) for v in node.values()
+                             if isinstance(v, (dict, list))) if r), None)
+
+# --------------------------------------------------------------------------------------
+# Public API
+# --------------------------------------------------------------------------------------
+def _catalog(db_path: Path | str) -> tuple[int, set[str]]:
+    """(pool version, names of the database's tables/views: t, schema.t, db.t, db.schema.t)."""
+    pool = get_pool(db_path)
+    hit = _catalogs.get(pool.db_path)
+    if hit and hit[0] == pool.version:
+        return hit
+    names = set()
+    with connect(db_path) as con:
+        for d, s, t in con.execute("""
+            SELECT database_name, schema_name, table_name FROM duckdb_tables() WHERE NOT internal
+            UNION ALL
+            SELECT database_name, schema_name, view_name FROM duckdb_views() WHERE NOT internal""").fetchall():
+            d, s, t = d.lower(), s.lower(), t.lower()
+            names |= {t, f"{s}.{t}", f"{d}.{t}", f"{d}.{s}.{t}"}
+    _catalogs[pool.db_path] = hit = (pool.version, names)
+    return hit
+
+def check_sql(sql: str, db_path: Path | str | None = None) -> str | None:
+    """None if `sql` is a single safe SELECT, else the reason. With db_path, tables must
+       exist in that database; without, only file paths are refused as tables."""
+    version, tables = _catalog(db_path) if db_path is not None else (None, None)
+    key = (hashlib.sha1(sql.encode()).hexdigest(), version)
+    with _verdicts_lock:
+        if key in _verdicts:
+            _verdicts.move_to_end(key)
+            return _verdicts[key]
+    statements, verdict = _parse(sql)
+    if statements is not None:
+        verdict = ("only a single SELECT is allowed" if len(statements) != 1
+                   else _walk(statements[0], frozenset(), tables))
+    with _verdicts_lock:
+        _verdicts[key] = verdict
+        while len(_verdicts) > SQL_SAFETY_CACHE:
+            _verdicts.popitem(last=False)
+    return verdict
+
+def referenced_tables(sql: str) -> set[str] | None:
+    """Tables and views a single SELECT reads, lowercase as written (t, schema.t), CTEs
+       excluded; None if `sql` isn't one SELECT."""
+    statements, _ = _parse(sql)
+    if statements is None or len(statements) != 1:
+        return None
+    out: set[str] = set()
+
+    def collect(node, ctes: frozenset):
+        if isinstance(node, list):
+            for n in node:
+                collect(n, ctes)
+            return
+        if not isinstance(node, dict):
+            return
+        cte_map = node.get("cte_map")
+        if cte_map and cte_map.get("map"):
+            ctes = ctes | {e["key"].lower() for e in cte_map["map"]}
+        if node.get("type") in ("BASE_TABLE", "SHOW_REF") and node.get("table_name"):
+            parts = [p for p in (node.get("catalog_name"), node.get("schema_name"), node["table_name"].strip('"')) if p]
+            if not (len(parts) == 1 and parts[0].lower() in ctes):
+                out.add(".".join(parts).lower())
+        for v in node.values():
+            if isinstance(v, (dict, list)):
+                collect(v, ctes)
+
+    collect(statements[0], frozenset())
+    return out
+
+def is_safe_select(sql: str, db_path: Path | str | None = None) -> bool:
+    return check_sql(sql, db_path) is None
+
+def is_syntax_error(verdict: str | None) -> bool:
+    """Parser errors: the SQL can't run at all, so it's worth an LLM repair."""
+    return bool(verdict) and verdict.startswith("syntax error")
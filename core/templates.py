@@ -0,0 +1,200 @@
+# core/templates.py
+# Deterministic NL → SQL fast path for recurring question shapes:
+#   "top N <dimension> by <measure> [in YEAR]", "<measure> per month in YEAR",
+#   "<measure> by <dimension>", "overall <measure> [in SP]".
+# Anything the parser doesn't fully understand returns None and goes to the LLM.
+from __future__ import annotations
+import os
+import re
+import threading
+from functools import lru_cache
+from pathlib import Path
+
+from .semantic import (MEASURES, DIMENSIONS, TIME_GRAINS, TIME_COLUMN, BR_STATES, FACT_DIMS,
+                       compatible, join_clause, rollup_for, semantic_objects_in)
+
+_STOP = {
+    "top", "bottom", "first", "by", "per", "in", "for", "of", "the", "a", "an", "what", "whats",
+    "is", "are", "was", "were", "show", "me", "list", "give", "get", "find", "which", "how",
+    "many", "much", "total", "overall", "average", "avg", "mean", "number", "count", "with",
+    "highest", "lowest", "most", "least", "fewest", "during", "year", "across", "all", "days",
+    "please", "our", "we", "do", "did", "have", "rank", "ranked", "state", "sum",
+    "english", "name", "names",  # categories are always rendered with English names
+}
+_AVG_WORDS = {"average", "avg", "mean"}
+_COUNT_WORDS = {"many", "number", "count"}
+_ASC_WORDS = {"bottom", "lowest", "least", "fewest"}
+
+# all phrases, longest first, so "product categories" wins over "products"
+_PHRASES = sorted(
+    [(syn, "measure", k) for k, m in MEASURES.items() for syn in m["synonyms"]]
+    + [(syn, "dimension", k) for k, d in DIMENSIONS.items() for syn in d["synonyms"]]
+    + [(syn, "time", k) for k, syns in TIME_GRAINS.items() for syn in syns],
+    key=lambda p: -len(p[0]),
+)
+
+_stats = {"hits": 0, "misses": 0}
+_stats_lock = threading.Lock()
+
+def parse_question(question: str) -> dict | None:
+    """Question → {measure, dimension, time_grain, year, state, limit, desc} or None."""
+    states = [s for s in re.findall(r"\b([A-Z]{2})\b", question) if s in BR_STATES]
+    text = " " + re.sub(r"[^a-z0-9 ]+", " ", question.lower()) + " "
+    for s in states:
+        text = re.sub(rf" {s.lower()} ", " ", text)
+    if len(set(states)) > 1:
+        return None
+
+    found = {"measure": set(), "dimension": set(), "time": set()}
+    for phrase, kind, key in _PHRASES:
+        if f" {phrase} " in text:
+            found[kind].add(key)
+            text = text.replace(f" {phrase} ", " ")
+    if len(found["measure"]) != 1 or len(found["dimension"]) > 1 or len(found["time"]) > 1:
+        return None
+
+    years = re.findall(r"\b(20\d{2})\b", text)
+    if len(set(years)) > 1:
+        return None
+    text = re.sub(r"\b20\d{2}\b", " ", text)
+
+    m = re.search(r"\b(top|bottom|first)\s+(\d+)\b", text)
+    limit = int(m.group(2)) if m else (10 if re.search(r"\b(top|bottom)\b", text) else None)
+    text = re.sub(r"\b\d+\b", " ", text)
+
+    words = set(text.split())
+    if words - _STOP:
+        return None  # something we don't understand: let the LLM handle it
+
+    measure = next(iter(found["measure"]))
+    agg = MEASURES[measure]["agg"]
+    if words & _AVG_WORDS and agg not in ("avg", "rate"):
+        return None  # "average revenue" is not SUM(revenue)
+    if words & _COUNT_WORDS and agg != "count":
+        return None  # "how many late deliveries" is not a rate
+
+    intent = {
+        "measure": measure,
+        "dimension": next(iter(found["dimension"]), None),
+        "time_grain": next(iter(found["time"]), None),
+        "year": int(years[0]) if years else None,
+        "state": states[0] if states else None,
+        "limit": limit,
+        "desc": not (words & _ASC_WORDS),
+    }
+    if intent["time_grain"] and intent["limit"]:
+        return None
+    dims = [DIMENSIONS[intent["dimension"]]] if intent["dimension"] else []
+    if intent["state"]:
+        dims.append(DIMENSIONS["customer_state"])
+    if not compatible(MEASURES[measure], dims):
+        return None
+    return intent
+
+def render_sql(intent: dict, rollups: set[str] = frozenset()) -> str:
+    """SQL for a parsed intent; reads a pre-aggregated rollup when one in `rollups` can answer it,
+       else fact_order_items (if present) for item-level measures, else the raw tables."""
+    dims = [intent["dimension"]] if intent["dimension"] else []
+    hit = rollup_for(intent["measure"], dims + (["customer_state"] if intent["state"] else []),
+                     intent["time_grain"])
+    if hit and hit[0] in rollups:
+        return _render_rollup(intent, *hit)
+    m = MEASURES[intent["measure"]]
+    if "fact_order_items" in rollups and m.get("fact") and set(dims) <= FACT_DIMS:
+        return _render_fact(intent, m["fact"])
+
+    select, uses = [], list(m["uses"])
+    where = list(m.get("where", []))
+
+    if intent["time_grain"]:
+        select.append(f"date_trunc('{intent['time_grain']}', {TIME_COLUMN}) AS {intent['time_grain']}")
+    if intent["dimension"]:
+        d = DIMENSIONS[intent["dimension"]]
+        select.append(f"{d['sql']} AS {intent['dimension']}")
+        uses += d["uses"]
+    select.append(f"{m['sql']} AS {intent['measure']}")
+
+    if intent["year"]:
+        y = intent["year"]
+        # range predicate (not EXTRACT) so zone maps on the sorted timestamp can skip row groups
+        where += [f"{TIME_COLUMN} >= '{y}-01-01'", f"{TIME_COLUMN} < '{y + 1}-01-01'"]
+    if intent["state"]:
+        where.append(f"c.customer_state = '{intent['state']}'")
+        uses.append("c")
+    return _assemble(intent, select, join_clause(uses), where)
+
+def _render_rollup(intent: dict, table: str, expr: str) -> str:
+    select, where = [], []
+    if intent["time_grain"]:
+        select.append(f"date_trunc('{intent['time_grain']}', month) AS {intent['time_grain']}")
+    if intent["dimension"]:
+        select.append(intent["dimension"])
+    select.append(f"{expr} AS {intent['measure']}")
+    if intent["year"]:
+        y = intent["year"]
+        where += [f"month >= '{y}-01-01'", f"month < '{y + 1}-01-01'"]
+    if intent["state"]:
+        where.append(f"customer_state = '{intent['state']}'")
+    return _assemble(intent, select, f"FROM {table}", where)
+
+def _render_fact(intent: dict, expr: str) -> str:
+    # same shape as the raw-table SQL, over the pre-joined fact table (no joins)
+    select, where = [], []
+    ts = "order_purchase_timestamp"
+    if intent["time_grain"]:
+        select.append(f"date_trunc('{intent['time_grain']}', {ts}) AS {intent['time_grain']}")
+    if intent["dimension"]:
+        select.append(intent["dimension"])
+    select.append(f"{expr} AS {intent['measure']}")
+    if intent["year"]:
+        y = intent["year"]
+        where += [f"{ts} >= '{y}-01-01'", f"{ts} < '{y + 1}-01-01'"]
+    if intent["state"]:
+        where.append(f"customer_state = '{intent['state']}'")
+    return _assemble(intent, select, "FROM fact_order_items", where)
+
+def _assemble(intent: dict, select: list[str], from_clause: str, where: list[str]) -> str:
+    group = [str(i + 1) for i in range(len(select) - 1)]
+    lines = ["SELECT " + ",\n       ".join(select), from_clause]
+    if where:
+        lines.append("WHERE " + "\n  AND ".join(where))
+    if group:
+        lines.append("GROUP BY " + ", ".join(group))
+        if intent["time_grain"]:
+            lines.append("ORDER BY " + ", ".join(group))
+        else:
+            lines.append(f"ORDER BY {intent['measure']} {'DESC' if intent['desc'] else 'ASC'}")
+        if intent["limit"]:
+            lines.append(f"LIMIT {intent['limit']}")
+    return "\n".join(lines) + ";"
+
+@lru_cache(maxsize=16)
+def _rollups_at(db_path: str, version: tuple) -> frozenset[str]:
+    return frozenset(semantic_objects_in(db_path))
+
+def _rollups_in(db_path: str) -> frozenset[str]:
+    """Semantic objects in `db_path`, cached per file version (a rebuild swaps the file in, so
+       inode/mtime change); a missing or unreadable database isn't cached."""
+    try:
+        st = os.stat(db_path)
+        return _rollups_at(db_path, (st.st_ino, st.st_mtime_ns, st.st_size))
+    except Exception:
+        return frozenset()
+
+def match_template(question: str, db_path: Path | str | None = None) -> str | None:
+    """SQL for a known question shape, or None (→ LLM). Updates the hit-rate counters.
+       With `db_path`, answers from the pre-aggregated rollups when they exist there."""
+    try:
+        intent = parse_question(question)
+    except Exception:
+        intent = None
+    with _stats_lock:
+        _stats["hits" if intent else "misses"] += 1
+    if not intent:
+        return None
+    return render_sql(intent, _rollups_in(str(db_path)) if db_path else frozenset())
+
+def fast_path_stats() -> dict:
+    with _stats_lock:
+        total = _stats["hits"] + _stats["misses"]
+        return {**_stats, "total": total, "hit_rate": (_stats["hits"] / total) if total else 0.0}
@@ -0,0 +1,74 @@
+# core/versions.py
+# Ingest version stamps. scripts/ingest.py records a fingerprint of every table it builds in
+# the `ingest_versions` table: row count plus an order-independent sum of the row hashes (a
+# sum, not an XOR, so duplicate rows that change together don't cancel out). A table whose
+# data didn't change keeps its stamp across rebuilds, and re-sorting by `core.advisor --apply`
+# doesn't change it either. sql_versions() gives the stamps of the tables a query reads (views
+# resolved to their tables), so consumers (core/reports.py) can skip work whose inputs are
+# unchanged. Databases without stamps (lake catalogs, older builds) fall back to the database
+# file's size and mtime for every table.
+from __future__ import annotations
+import re
+from pathlib import Path
+
+import duckdb
+
+from .db import connect
+from .sql_safety import referenced_tables
+
+VERSIONS_TABLE = "ingest_versions"
+_VIEW_RE = re.compile(r"^\s*CREATE\s+(?:OR\s+REPLACE\s+)?VIEW\s+\S+\s+(?:\([^)]*\)\s+)?AS\s+(.*?);?\s*$", re.I | re.S)
+
+def stamp(con) -> dict[str, str]:
+    """(Re)write the stamps of every table in the database behind `con` (read-write); returns them."""
+    con.execute(f"CREATE OR REPLACE TABLE {VERSIONS_TABLE} "
+                "(table_name VARCHAR, version VARCHAR, rows BIGINT, stamped TIMESTAMPTZ)")
+    tables = [r[0] for r in con.execute("""
+        SELECT table_name FROM duckdb_tables()
+        WHERE database_name = current_database() AND schema_name = 'main' AND NOT internal
+          AND table_name <> ?""", [VERSIONS_TABLE]).fetchall()]
+    out = {}
+    for t in tables:
+        rows, h = con.execute(f'SELECT count(*), sum(hash(_row)::HUGEINT) FROM "{t}" _row').fetchone()
+        out[t] = f"{rows}:{int(h or 0):x}"
+        con.execute(f"INSERT INTO {VERSIONS_TABLE} VALUES (?, ?, ?, now())", [t, out[t], rows])
+    return out
+
+def table_versions(db_path: Path | str) -> dict[str, str]:
+    """{table: stamp}; {} when the database has none."""
+    try:
+        with connect(db_path) as con:
+            return dict(con.execute(f"SELECT table_name, version FROM {VERSIONS_TABLE}").fetchall())
+    except duckdb.CatalogException:
+        return {}
+
+def _views(db_path: Path | str) -> dict[str, str]:
+    with connect(db_path) as con:
+        rows = con.execute("SELECT view_name, sql FROM duckdb_views() "
+                           "WHERE database_name = current_database() AND NOT internal").fetchall()
+    out = {}
+    for name, sql in rows:
+        m = _VIEW_RE.match(sql or "")
+        if m:
+            out[name.lower()] = m.group(1)
+    return out
+
+def sql_versions(sql: str, db_path: Path | str) -> dict[str, str] | None:
+    """Stamps of the tables `sql` reads, views expanded; None if it isn't a single SELECT."""
+    tables = referenced_tables(sql)
+    if tables is None:
+        return None
+    stamps, views = table_versions(db_path), _views(db_path)
+    st = Path(db_path).stat()
+    fallback = f"file:{st.st_size}:{st.st_mtime_ns}"
+    out, seen, todo = {}, set(), list(tables)
+    while todo:
+        name = todo.pop().split(".")[-1]
+        if name in seen:
+            continue
+        seen.add(name)
+        if name in views:
+            todo += referenced_tables(views[name]) or []
+        else:
+            out[name] = stamps.get(name, fallback)
+    return dict(sorted(out.items()))
@@ -0,0 +1,243 @@
+# core/warmup.py
+# Warm-up / precomputation after a deploy or restart, so the first user doesn't pay for it:
+#   1. open the database's connection pool
+#   2. touch the hot columns (dashboard + the logged workload's join/filter columns) so their
+#      pages are in DuckDB's buffer cache and the OS page cache
+#   3. run the KPI dashboard queries for every year, and load the glossary/translation answer store
+#   4. saved insights (data/cache/insights.json): run their SQL, and seed the question→SQL memo
+#      and the result cache with the answers, so asking them again skips the LLM
+#   5. standing questions (WARMUP_QUESTIONS file, else STANDING_QUESTIONS): answer them through
+#      the orchestrator on the execution service, filling the same caches
+# The app and API run it in the background at startup when WARMUP_ON_START=1.
+#
+#   python -m core.warmup [--database <name>] [--no-questions]     warm and report
+#   python -m core.warmup --compare [--question "..."]             time-to-first-answer, cold vs warm
+from __future__ import annotations
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import subprocess
+from collections import defaultdict
+from pathlib import Path
+
+from . import registry
+from .db import connect, get_pool
+from .executor import get_service, answer_key
+from .answers import get_store
+from .memory import load_insights
+from .semantic import DASHBOARD_YEARS, dashboard_queries
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+WARMUP_ON_START = os.getenv("WARMUP_ON_START", "0") == "1"
+WARMUP_QUESTIONS = Path(os.getenv("WARMUP_QUESTIONS", str(REPO_ROOT / "data" / "standing_questions.txt")))
+WARMUP_USER = "warmup"  # execution-service user the standing questions run as
+
+STANDING_QUESTIONS = [
+    "Top 10 product categories by revenue",
+    "Orders per month in 2018",
+    "Late delivery rate by customer state",
+    "Average order value per month in 2018",
+    "Revenue by payment type",
+]
+# always touched (when present): what the dashboard and the fast path read
+HOT_COLUMNS = {
+    "agg_monthly_state": ["month", "customer_state", "orders", "revenue", "late_orders", "delivered_orders"],
+    "fact_order_items": ["order_id", "order_purchase_timestamp", "month", "customer_state", "category",
+                         "line_revenue"],
+    "orders": ["order_id", "customer_id", "order_purchase_timestamp", "order_status"],
+}
+
+def standing_questions() -> list[str]:
+    """One per line in WARMUP_QUESTIONS (# comments), else the built-in list."""
+    if WARMUP_QUESTIONS.exists():
+        lines = [l.strip() for l in WARMUP_QUESTIONS.read_text(encoding="utf-8").splitlines()]
+        return [l for l in lines if l and not l.startswith("#")]
+    return list(STANDING_QUESTIONS)
+
+# --------------------------------------------------------------------------------------
+# Steps
+# --------------------------------------------------------------------------------------
+def hot_columns(db_path: Path | str) -> dict[str, list[str]]:
+    """table -> columns to touch: HOT_COLUMNS plus the logged workload's join/filter columns."""
+    from .advisor import load_log, cluster, _catalog
+    with connect(db_path) as con:
+        catalog, base = _catalog(con)
+    cols = defaultdict(set)
+    for t, cs in HOT_COLUMNS.items():
+        cols[t].update(c for c in cs if c in catalog.get(t, ()))
+    for g in cluster(load_log(), catalog):
+        for tc in g["joins"] + g["eq_filters"] + g["range_filters"]:
+            t, c = tc.split(".")
+            cols[t].add(c)
+    return {t: sorted(cs) for t, cs in cols.items() if cs and t in base}
+
+def touch(db_path: Path | str, columns: dict[str, list[str]]) -> int:
+    """Read every value of the columns once (one scan per table); returns tables scanned."""
+    with connect(db_path) as con:
+        for t, cs in columns.items():
+            con.execute(f"SELECT {', '.join(f'bit_xor(hash({c}))' for c in cs)} FROM {t}").fetchall()
+    return len(columns)
+
+def run_dashboard(db_path: Path | str) -> int:
+    n = 0
+    with connect(db_path) as con:
+        for year in DASHBOARD_YEARS:
+            for sql, params in dashboard_queries(year).values():
+                con.execute(sql, list(params)).fetchall()
+                n += 1
+    return n
+
+def prime_insights(entry: dict, db_path: str, schema_path: str) -> tuple[int, int]:
+    """Seed the SQL memo and result cache from saved insights; (primed, failed)."""
+    from .sql_agent import execute_sql, remember_sql
+    from .orchestrator import sql_answer
+    ok = bad = 0
+    ns = registry.cache_namespace(entry)
+    for ins in load_insights():
+        question, sql = (ins.get("question") or "").strip(), (ins.get("sql") or "").strip()
+        if not question or not sql:
+            continue
+        tbl, err = execute_sql(sql, db_path)
+        if err:
+            bad += 1
+            continue
+        remember_sql(question, sql, db_path)
+        get_service().prime(ns, answer_key(question, schema_path, db_path), sql_answer(question, sql, tbl))
+        ok += 1
+    return ok, bad
+
+def answer_questions(entry: dict, db_path: str, schema_path: str, questions: list[str]) -> tuple[int, int]:
+    """Answer each question once on the execution service (cached there); (answered, failed)."""
+    from .orchestrator import handle_message
+    ok = bad = 0
+    ns = registry.cache_namespace(entry)
+    for q in questions:
+        try:
+            _, extras = get_service().submit(
+                WARMUP_USER, handle_message, q, schema_path=schema_path, db_path=db_path,
+                cache_key=answer_key(q, schema_path, db_path), cache_ns=ns, cancel_previous=False,
+            ).result()
+            ok, bad = (ok + 1, bad) if not extras.get("error") else (ok, bad + 1)
+        except Exception:
+            bad += 1  # e.g. the LLM is unreachable: the other steps still count
+    return ok, bad
+
+# --------------------------------------------------------------------------------------
+# Entry points
+# --------------------------------------------------------------------------------------
+def warm(entry: dict | None = None, questions: list[str] | None = None, insights: bool = True) -> dict:
+    """Run every warm-up step for a registry entry (default: the Olist warehouse); returns a
+       report {step: {"s": seconds, ...counts}}."""
+    entry = entry or registry.get(None)
+    db_path = str(registry.db_file(entry))
+    schema_path = str(registry.schema_path(entry))
+    report = {}
+
+    def step(name, fn, *args):
+        t0 = time.perf_counter()
+        try:
+            res = fn(*args)
+        except Exception as e:
+            res = {"error": str(e)}
+        report[name] = {"s": round(time.perf_counter() - t0, 3), **(res if isinstance(res, dict) else {"n": res})}
+
+    step("pool", lambda: get_pool(db_path) and 1)
+    step("columns", lambda: touch(db_path, hot_columns(db_path)))
+    step("dashboard", run_dashboard, db_path)
+    step("answers", lambda: get_store().stats())
+    if insights:
+        step("insights", lambda: dict(zip(("primed", "failed"), prime_insights(entry, db_path, schema_path))))
+    qs = standing_questions() if questions is None else questions
+    if qs:
+        step("questions", lambda: dict(zip(("answered", "failed"),
+                                           answer_questions(entry, db_path, schema_path, qs))))
+    return report
+
+def warm_in_background(entry: dict | None = None, **kwargs) -> threading.Thread:
+    t = threading.Thread(target=warm, args=(entry,), kwargs=kwargs, name="warmup", daemon=True)
+    t.start()
+    return t
+
+# --------------------------------------------------------------------------------------
+# CLI: warm, or compare time-to-first-answer in fresh processes
+# --------------------------------------------------------------------------------------
+def _first_answer(entry: dict, question: str, timeout_s: float) -> dict:
+    """Seconds to the first dashboard view and the first answer to `question`."""
+    from .orchestrator import handle_message
+    db_path, schema_path = str(registry.db_file(entry)), str(registry.schema_path(entry))
+    out = {}
+    t0 = time.perf_counter()
+    with connect(db_path) as con:
+        for sql, params in dashboard_queries(DASHBOARD_YEARS[-1]).values():
+            con.execute(sql, list(params)).fetchall()
+    out["dashboard_s"] = round(time.perf_counter() - t0, 3)
+    t0 = time.perf_counter()
+    try:
+        _, extras = get_service().submit(
+            "user", handle_message, question, schema_path=schema_path, db_path=db_path,
+            cache_key=answer_key(question, schema_path, db_path), cache_ns=registry.cache_namespace(entry),
+        ).result(timeout=timeout_s)
+        out["answer_s"] = round(time.perf_counter() - t0, 3)
+        out["error"] = extras.get("error")
+    except Exception as e:
+        out["answer_s"], out["error"] = None, str(e) or type(e).__name__
+    return out
+
+def _child(mode: str, database: str | None, question: str, questions: bool, timeout_s: float):
+    t0 = time.perf_counter()
+    entry = registry.get(database)
+    out = {}
+    if mode == "warm":
+        out["warmup"] = warm(entry, questions=None if questions else [])
+        out["warmup_s"] = round(time.perf_counter() - t0, 3)
+    out.update(_first_answer(entry, question, timeout_s))
+    print(json.dumps(out, default=str), flush=True)
+    os._exit(0)  # don't wait on an LLM call that timed out
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--database", default=None, help="registry name (default: the Olist warehouse)")
+    ap.add_argument("--no-questions", action="store_true", help="skip the standing questions (no LLM calls)")
+    ap.add_argument("--compare", action="store_true", help="time-to-first-answer: cold vs warmed process")
+    ap.add_argument("--question", default=None, help="question timed by --compare (default: first saved insight)")
+    ap.add_argument("--timeout", type=float, default=120.0, help="--compare: give up on an answer after this many s")
+    ap.add_argument("--child", choices=["cold", "warm"])
+    args = ap.parse_args()
+
+    question = args.question or next((i["question"].strip() for i in load_insights() if i.get("question")),
+                                     standing_questions()[0])
+    if args.child:
+        return _child(args.child, args.database, question, not args.no_questions, args.timeout)
+    if not args.compare:
+        report = warm(registry.get(args.database), questions=[] if args.no_questions else None)
+        for name, r in report.items():
+            print(f"{name:10} {r['s']:>7.2f}s  " + "  ".join(f"{k}={v}" for k, v in r.items() if k != "s"))
+        return
+
+    print(f"Question: {question!r}")
+    res = {}
+    for mode in ("cold", "warm"):  # cold first: the warm run leaves the OS page cache hot
+        cmd = [sys.executable, "-m", "core.warmup", "--child", mode, "--question", question,
+               "--timeout", str(args.timeout)] + (["--no-questions"] if args.no_questions else [])
+        if args.database:
+            cmd += ["--database", args.database]
+        env = {**os.environ, "QUERY_LOG_ENABLED": "0"}
+        p = subprocess.run(cmd, cwd=REPO_ROOT, capture_output=True, text=True, env=env)
+        if p.returncode:
+            raise SystemExit(p.stderr[-2000:])
+        res[mode] = json.loads(p.stdout.strip().splitlines()[-1])
+    c, w = res["cold"], res["warm"]
+    print(f"warm-up took {w['warmup_s']:.2f}s: " + ", ".join(f"{k} {v['s']:.2f}s" for k, v in w["warmup"].items()))
+    print(f"{'':22} {'cold':>8} {'warm':>8}")
+    for k, label in (("dashboard_s", "first dashboard view"), ("answer_s", "first answer")):
+        fmt = lambda v: f"{v:>7.3f}s" if v is not None else "     n/a"
+        print(f"{label:22} {fmt(c[k])} {fmt(w[k])}")
+    for mode in ("cold", "warm"):
+        if res[mode].get("error"):
+            print(f"  ({mode} answer error: {res[mode]['error'][:200]})")
+
+if __name__ == "__main__":
+    main()
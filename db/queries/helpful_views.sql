@@ -1,16 +1,15 @@
--- Order-level revenue (price + freight) and simple delivery delay in days
+-- Order-level revenue (price + freight) and delivery delay in days.
+-- Definitions live in core/semantic.py (sem_orders); build it first with `python -m core.semantic`.
 CREATE OR REPLACE VIEW v_order_enriched AS
 SELECT
-  o.order_id,
-  o.customer_id,
-  o.order_purchase_timestamp,
-  o.order_delivered_customer_date,
-  o.order_estimated_delivery_date,
-  DATE_DIFF('day', o.order_estimated_delivery_date, o.order_delivered_customer_date) AS delivery_delay_days,
-  SUM(i.price + i.freight_value) AS order_revenue
-FROM orders o
-LEFT JOIN items i ON i.order_id = o.order_id
-GROUP BY 1,2,3,4,5;
+  order_id,
+  customer_id,
+  order_purchase_timestamp,
+  order_delivered_customer_date,
+  order_estimated_delivery_date,
+  delay_days AS delivery_delay_days,
+  order_revenue
+FROM sem_orders;
 
 -- Customer + geolocation join via zip prefix (best-effort)
 CREATE OR REPLACE VIEW v_customer_geo AS
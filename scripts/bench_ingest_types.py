@@ -0,0 +1,162 @@
+"""
+Storage size and group-by time: declared ingest types (scripts/ingest.py SCHEMAS: dictionary
+columns in Parquet, ENUMs in DuckDB, parsed timestamps) against a baseline.
+
+Ingests --raw-dir into --work-dir (base tables only, no semantic layer), then reports
+  - Parquet bytes per table and in total
+  - DuckDB bytes (used blocks) per table and in total
+  - best-of --repeat time of group-bys on the low-cardinality columns, on DuckDB and on Parquet
+
+The baseline is an earlier build, --baseline-db and --baseline-parquet (e.g. made by the
+previous ingest.py). Without one, it's a copy of the new tables with ENUMs cast back to
+VARCHAR, which isolates the ENUM effect.
+
+  python scripts/bench_ingest_types.py --raw-dir data/synthetic/x10 \
+      [--baseline-db old/olist.duckdb --baseline-parquet old/processed]
+"""
+import sys, os, time, shutil, argparse, tempfile
+from pathlib import Path
+
+import duckdb
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT / "scripts"))
+from ingest import RAW_FILES, CLUSTER, INGEST_CHUNK_ROWS, read_csv_chunks, write_parquet, create_duckdb
+
+QUERIES = {
+    "orders by status": "SELECT order_status, count(*) FROM orders GROUP BY 1",
+    "customers by state": "SELECT customer_state, count(*) FROM customers GROUP BY 1",
+    "payments by type": "SELECT payment_type, sum(payment_value), avg(payment_installments) FROM payments GROUP BY 1",
+    "delivered by month": """SELECT date_trunc('month', order_purchase_timestamp) AS m, count(*) FROM orders
+WHERE order_status = 'delivered' GROUP BY 1""",
+    "state x status": """SELECT c.customer_state, o.order_status, count(*) FROM orders o
+JOIN customers c ON c.customer_id = o.customer_id GROUP BY ALL""",
+    "revenue by category": """SELECT p.product_category_name, sum(i.price + i.freight_value) FROM items i
+JOIN products p ON p.product_id = i.product_id GROUP BY 1""",
+}
+
+def parquet_sizes(folder: Path) -> dict[str, int]:
+    return {name: (folder / f"{name}.parquet").stat().st_size
+            for name in RAW_FILES if (folder / f"{name}.parquet").exists()}
+
+def duckdb_sizes(db_path: Path) -> dict[str, int]:
+    con = duckdb.connect(str(db_path), read_only=True)
+    try:
+        block = con.execute("SELECT block_size FROM pragma_database_size()").fetchone()[0]
+        out = {}
+        for name in RAW_FILES:
+            try:
+                blocks = con.execute(f"SELECT count(DISTINCT block_id) FROM pragma_storage_info('{name}') "
+                                     "WHERE persistent").fetchone()[0]
+            except duckdb.CatalogException:
+                continue
+            out[name] = blocks * block
+        return out
+    finally:
+        con.close()
+
+def best_of(con, sql: str, repeat: int) -> float:
+    con.execute(sql).fetchall()  # warm the buffer cache
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        con.execute(sql).fetchall()
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+def time_queries(db_path: Path | None, parquet: Path | None, repeat: int) -> dict[tuple, float]:
+    out = {}
+    if db_path is not None:
+        con = duckdb.connect(str(db_path), read_only=True)
+        for q, sql in QUERIES.items():
+            out[("duckdb", q)] = best_of(con, sql, repeat)
+        con.close()
+    if parquet is not None:
+        con = duckdb.connect()
+        for name in RAW_FILES:
+            if (parquet / f"{name}.parquet").exists():
+                con.execute(f"CREATE VIEW {name} AS SELECT * FROM read_parquet('{(parquet / f'{name}.parquet').as_posix()}')")
+        for q, sql in QUERIES.items():
+            out[("parquet", q)] = best_of(con, sql, repeat)
+        con.close()
+    return out
+
+def varchar_copy(db_path: Path, out: Path):
+    """Copy of the base tables with every ENUM column cast back to VARCHAR."""
+    con = duckdb.connect(str(out))
+    con.execute(f"ATTACH '{db_path.as_posix()}' AS src (READ_ONLY)")
+    for name in RAW_FILES:
+        cols = con.execute("SELECT column_name, data_type FROM duckdb_columns() WHERE database_name = 'src' "
+                           "AND table_name = ?", [name]).fetchall()
+        casts = [f'"{c}"::VARCHAR AS "{c}"' for c, t in cols if t.startswith("ENUM")]
+        select = f"* REPLACE ({', '.join(casts)})" if casts else "*"
+        order = f" ORDER BY {CLUSTER[name]}" if name in CLUSTER else ""
+        con.execute(f"CREATE TABLE {name} AS SELECT {select} FROM src.{name}{order}")
+    con.close()
+
+def _fmt_delta(new: float, old: float) -> str:
+    return f"{(new - old) / old * 100:+.0f}%" if old else ""
+
+def report(title: str, rows: list[tuple], unit: str):
+    print(f"\n{title}")
+    print(f"  {'':<24}{'baseline':>12}{'declared':>12}{'delta':>8}")
+    for label, old, new in rows:
+        if old is None or new is None:
+            continue
+        scale = 1 / 1048576 if unit == "MB" else 1000
+        print(f"  {label:<24}{old * scale:>10.2f}{unit:>2}{new * scale:>10.2f}{unit:>2}{_fmt_delta(new, old):>8}")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--raw-dir", required=True, help="Olist-layout CSVs (scripts/generate_synthetic.py)")
+    ap.add_argument("--baseline-db", default=None, help="DuckDB from an earlier ingest")
+    ap.add_argument("--baseline-parquet", default=None, help="processed Parquet folder from an earlier ingest")
+    ap.add_argument("--chunk-rows", type=int, default=INGEST_CHUNK_ROWS)
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--work-dir", default=None, help="keep outputs here (default: temp dir, removed)")
+    args = ap.parse_args()
+
+    raw_dir = Path(args.raw_dir)
+    work = Path(args.work_dir or tempfile.mkdtemp(prefix="bench_types_"))
+    work.mkdir(parents=True, exist_ok=True)
+    try:
+        t0 = time.perf_counter()
+        parquet_map = {}
+        for name, fname in RAW_FILES.items():
+            parquet_map[name], _ = write_parquet(read_csv_chunks(raw_dir / fname, name, args.chunk_rows),
+                                                 work / "parquet", name)
+        t_parquet = time.perf_counter() - t0
+        db = work / "declared.duckdb"
+        db.unlink(missing_ok=True)
+        create_duckdb(parquet_map, db)
+        print(f"Ingested {raw_dir} in {time.perf_counter() - t0:.1f}s (CSV → Parquet {t_parquet:.1f}s)")
+
+        if args.baseline_db:
+            base_db = Path(args.baseline_db)
+            base_pq = Path(args.baseline_parquet) if args.baseline_parquet else None
+            print(f"Baseline: {base_db}" + (f" + {base_pq}" if base_pq else ""))
+        else:
+            base_db, base_pq = work / "varchar.duckdb", None
+            base_db.unlink(missing_ok=True)
+            varchar_copy(db, base_db)
+            print("Baseline: the same tables with ENUMs as VARCHAR (no --baseline-db)")
+
+        if base_pq is not None:
+            old, new = parquet_sizes(base_pq), parquet_sizes(work / "parquet")
+            report("Parquet size", [(n, old.get(n), new.get(n)) for n in new]
+                   + [("total", sum(old.values()), sum(new.values()))], "MB")
+        old, new = duckdb_sizes(base_db), duckdb_sizes(db)
+        report("DuckDB size (used blocks)", [(n, old.get(n), new.get(n)) for n in new]
+               + [("total", sum(old.values()), sum(new.values()))], "MB")
+
+        old, new = time_queries(base_db, base_pq, args.repeat), time_queries(db, work / "parquet", args.repeat)
+        for engine in ("duckdb", "parquet"):
+            rows = [(q, old.get((engine, q)), new.get((engine, q))) for q in QUERIES]
+            if any(o is not None for _, o, _ in rows):
+                report(f"Query time on {engine} (best of {args.repeat})", rows, "ms")
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Peak-RSS test for the out-of-core configuration: ingest + heavy queries on a scaled dataset.
+
+Generates a synthetic Olist at --scale (scripts/generate_synthetic.py) unless --raw-dir is
+given, then runs, each in a fresh subprocess so peaks don't mix:
+
+  ingest    scripts/ingest.py with INGEST_CHUNK_ROWS and DUCKDB_MEMORY_LIMIT
+  queries   large sorts/aggregates/joins through core.sql_agent.execute_sql with MEMORY_BUDGET_MB
+            (DuckDB spills to disk past its limit; results capped at RESULT_MAX_ROWS)
+
+and reports peak RSS per phase. Exits non-zero if a bounded phase exceeds --max-rss-mb.
+--compare also runs everything without limits (default DuckDB settings, whole results).
+
+  python scripts/bench_out_of_core.py --scale 10 --budget-mb 1536 [--compare]
+"""
+import sys, os, json, time, shutil, argparse, tempfile, subprocess
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+QUERIES = {
+    "sort all items": "SELECT * FROM fact_order_items ORDER BY price DESC, order_id",
+    "group by customer": """SELECT c.customer_unique_id, COUNT(DISTINCT f.order_id) AS orders, SUM(f.line_revenue) AS revenue
+FROM fact_order_items f JOIN customers c ON c.customer_id = f.customer_id GROUP BY 1 ORDER BY revenue DESC""",
+    "orders x items x payments": """SELECT o.order_id, o.order_purchase_timestamp, i.price, p.payment_type, p.payment_value
+FROM orders o JOIN items i ON i.order_id = o.order_id JOIN payments p ON p.order_id = o.order_id
+ORDER BY o.order_purchase_timestamp""",
+}
+
+def run(cmd: list[str], env: dict) -> tuple[float, float, str]:
+    """(peak RSS MB, seconds, stdout) of one child process."""
+    t0 = time.perf_counter()
+    p = subprocess.Popen(cmd, env={**os.environ, **env}, cwd=ROOT, stdout=subprocess.PIPE,
+                         stderr=subprocess.STDOUT, text=True)
+    out = p.stdout.read()
+    _, status, usage = os.wait4(p.pid, 0)
+    p.returncode = os.waitstatus_to_exitcode(status)
+    if p.returncode:
+        raise RuntimeError(f"{' '.join(cmd)} failed:\n{out[-2000:]}")
+    kb = usage.ru_maxrss
+    return (kb / 1024 if sys.platform != "darwin" else kb / 1024 / 1024), time.perf_counter() - t0, out
+
+def child_query(sql: str, db_path: str):
+    from core.sql_agent import execute_sql
+    from core.results import truncated_at
+    tbl, err = execute_sql(sql, db_path)
+    if err:
+        raise SystemExit(err)
+    print(json.dumps({"rows": tbl.num_rows, "truncated": truncated_at(tbl) is not None}))
+
+def phases(raw_dir: Path, work: Path, env: dict, label: str) -> list[tuple]:
+    db = work / f"{label}.duckdb"
+    env = {**env, "QUERY_LOG_ENABLED": "0", "DUCKDB_TEMP_DIR": str(work / f"{label}.tmp")}
+    rows = []
+    rss, secs, _ = run([sys.executable, "scripts/ingest.py", "--raw-dir", str(raw_dir),
+                        "--processed-dir", str(work / f"{label}_parquet"), "--db-path", str(db)], env)
+    rows.append((label, "ingest", rss, secs, ""))
+    for name, sql in QUERIES.items():
+        rss, secs, out = run([sys.executable, __file__, "--child-sql", sql, "--db-path", str(db)], env)
+        res = json.loads(out.strip().splitlines()[-1])
+        rows.append((label, name, rss, secs, f"{res['rows']:,} rows" + (" (capped)" if res["truncated"] else "")))
+    return rows
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--scale", type=float, default=10)
+    ap.add_argument("--raw-dir", default=None, help="existing Olist-layout CSVs (skips generation)")
+    ap.add_argument("--budget-mb", type=int, default=1536, help="MEMORY_BUDGET_MB for the bounded run")
+    ap.add_argument("--chunk-rows", type=int, default=100000)
+    ap.add_argument("--max-rss-mb", type=float, default=None, help="fail above this (default: the budget)")
+    ap.add_argument("--compare", action="store_true", help="also run without limits")
+    ap.add_argument("--work-dir", default=None, help="keep outputs here (default: temp dir, removed)")
+    ap.add_argument("--child-sql"); ap.add_argument("--db-path")
+    args = ap.parse_args()
+    if args.child_sql:
+        return child_query(args.child_sql, args.db_path)
+
+    work = Path(args.work_dir or tempfile.mkdtemp(prefix="olist_ooc_"))
+    work.mkdir(parents=True, exist_ok=True)
+    try:
+        raw_dir = Path(args.raw_dir) if args.raw_dir else work / "raw"
+        if not args.raw_dir:
+            print(f"→ Generating scale {args.scale:g} CSVs in {raw_dir}")
+            run([sys.executable, "scripts/generate_synthetic.py", "--scale", str(args.scale),
+                 "--out", str(raw_dir)], {})
+
+        bounded = {"MEMORY_BUDGET_MB": str(args.budget_mb), "INGEST_CHUNK_ROWS": str(args.chunk_rows)}
+        rows = phases(raw_dir, work, bounded, "bounded")
+        if args.compare:
+            rows += phases(raw_dir, work, {"INGEST_CHUNK_ROWS": str(10 ** 9)}, "unbounded")
+
+        limit = args.max_rss_mb or args.budget_mb
+        print(f"\n{'run':10} {'phase':28} {'peak RSS MB':>12} {'seconds':>8}  result")
+        failed = False
+        for label, phase, rss, secs, note in rows:
+            over = label == "bounded" and rss > limit
+            failed |= over
+            print(f"{label:10} {phase:28} {rss:>12.0f} {secs:>8.1f}  {note}{'  ✗ over ' + f'{limit:.0f} MB' if over else ''}")
+        print(f"\n{'❌ FAIL' if failed else '✅ PASS'}: bounded run peak RSS {'exceeds' if failed else 'within'} {limit:.0f} MB")
+        sys.exit(1 if failed else 0)
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Peak memory per answer: old pandas result path vs the Arrow-native one.
+
+  old:   fetchdf() -> df.copy() + round for display -> df.to_csv()
+  arrow: fetch_arrow_table() -> round float columns for display -> every download format the
+         app offers (DuckDB COPY to CSV and Parquet, Arrow IPC); the app builds only the chosen
+         one, once per result, so this is its worst case
+
+Each (path, query) pair runs in a fresh subprocess and reports the peak-RSS increase over
+the process baseline (after imports and connecting), so allocator caches don't leak across runs.
+Summaries/charts are left out: both paths only ever touch the first 10 rows there.
+
+  python scripts/bench_result_memory.py [--db-path db/olist.duckdb]
+"""
+import sys, os, json, time, resource, argparse, subprocess
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_DB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "db", "olist.duckdb")
+
+QUERIES = {
+    "items (all rows)": "SELECT * FROM items",
+    "orders x items x customers": """SELECT o.*, i.price, i.freight_value, c.customer_state, c.customer_city
+FROM orders o JOIN items i ON i.order_id = o.order_id JOIN customers c ON c.customer_id = o.customer_id""",
+    "revenue by category": """SELECT p.product_category_name, SUM(i.price + i.freight_value) AS revenue
+FROM items i JOIN products p ON p.product_id = i.product_id GROUP BY 1 ORDER BY 2 DESC""",
+}
+
+def _maxrss_mb() -> float:
+    kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return kb / 1024 if sys.platform != "darwin" else kb / 1024 / 1024
+
+def child(path: str, sql: str, db_path: str):
+    import duckdb
+    import pandas as pd
+    from core.results import round_floats, to_csv_bytes, to_parquet_bytes, to_arrow_bytes
+
+    con = duckdb.connect(db_path, read_only=True)
+    con.execute("SELECT 1").fetchall()
+    base = _maxrss_mb()
+    t0 = time.perf_counter()
+    if path == "old":
+        df = con.execute(sql).fetchdf()
+        df_show = df.copy()
+        for c in df_show.columns:
+            if pd.api.types.is_float_dtype(df_show[c]):
+                df_show[c] = df_show[c].round(3)
+        csv = df.to_csv(index=False).encode("utf-8")
+        rows, out = len(df), len(csv)
+    else:
+        tbl = con.execute(sql).fetch_arrow_table()
+        show = round_floats(tbl, 3)
+        csv = to_csv_bytes(tbl)
+        pq = to_parquet_bytes(tbl)
+        ipc = to_arrow_bytes(tbl)
+        rows, out = tbl.num_rows, len(csv) + len(pq) + len(ipc)
+    elapsed = time.perf_counter() - t0
+    print(json.dumps({"rows": rows, "peak_mb": round(_maxrss_mb() - base, 1),
+                      "elapsed_s": round(elapsed, 3), "export_bytes": out}))
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--db-path", default=DEFAULT_DB)
+    ap.add_argument("--child", choices=["old", "arrow"])
+    ap.add_argument("--sql")
+    args = ap.parse_args()
+    if args.child:
+        return child(args.child, args.sql, args.db_path)
+
+    print(f"{'query':30} {'rows':>9} {'old MB':>8} {'arrow MB':>9} {'old s':>7} {'arrow s':>8}")
+    for name, sql in QUERIES.items():
+        res = {}
+        for path in ("old", "arrow"):
+            out = subprocess.run([sys.executable, __file__, "--child", path, "--sql", sql,
+                                  "--db-path", args.db_path], capture_output=True, text=True, check=True)
+            res[path] = json.loads(out.stdout.strip().splitlines()[-1])
+        print(f"{name:30} {res['old']['rows']:>9,} {res['old']['peak_mb']:>8} {res['arrow']['peak_mb']:>9} "
+              f"{res['old']['elapsed_s']:>7} {res['arrow']['elapsed_s']:>8}")
+
+if __name__ == "__main__":
+    main()
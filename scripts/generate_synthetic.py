@@ -0,0 +1,287 @@
+"""
+Synthetic Olist data at N× scale, for scale testing and benchmarks.
+
+Generates orders/customers/items/payments/reviews/geolocation that follow the Olist
+distributions (customer state, order status, purchase month, items per order, payment
+types, review scores, prices, delivery times) with intact foreign keys, plus products and
+sellers grown from the real ones in data/raw. Everything is produced by DuckDB straight
+to disk (streaming, deterministic for a given --seed), so 100×+ doesn't need the data in
+memory.
+
+  python scripts/generate_synthetic.py --scale 10 --out data/synthetic/x10
+  python scripts/generate_synthetic.py --scale 100 --format parquet --out data/synthetic/x100
+  python scripts/generate_synthetic.py --scale 10 --profile-db db/olist.duckdb ...
+
+--format csv writes the file layout scripts/ingest.py expects (--raw-dir <out>);
+--format parquet writes fact tables partitioned by purchase year/month (hive layout).
+Distributions come from --profile-db when given (an ingested Olist DuckDB), else from
+the built-in profile below (measured on the public Olist dataset).
+"""
+import argparse, math, os, shutil, sys, time
+from pathlib import Path
+
+import duckdb
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from ingest import RAW_FILES
+
+BASE_ORDERS = 99441
+SLOTS = 10000  # resolution of categorical sampling (0.01%)
+
+DEFAULT_PROFILE = {
+    "customer_state": {
+        "SP": 41.98, "RJ": 12.92, "MG": 11.70, "RS": 5.50, "PR": 5.07, "SC": 3.66, "BA": 3.40,
+        "DF": 2.15, "ES": 2.04, "GO": 2.03, "PE": 1.66, "CE": 1.34, "PA": 0.98, "MT": 0.91,
+        "MA": 0.75, "MS": 0.72, "PB": 0.54, "PI": 0.50, "RN": 0.49, "AL": 0.42, "SE": 0.35,
+        "TO": 0.28, "RO": 0.25, "AM": 0.15, "AC": 0.08, "AP": 0.07, "RR": 0.05,
+    },
+    "order_status": {
+        "delivered": 97.02, "shipped": 1.11, "canceled": 0.63, "unavailable": 0.61,
+        "invoiced": 0.32, "processing": 0.30, "created": 0.01, "approved": 0.01,
+    },
+    "purchase_month": {
+        "2016-09": 4, "2016-10": 324, "2016-12": 1, "2017-01": 800, "2017-02": 1780,
+        "2017-03": 2682, "2017-04": 2404, "2017-05": 3700, "2017-06": 3245, "2017-07": 4026,
+        "2017-08": 4331, "2017-09": 4285, "2017-10": 4631, "2017-11": 7544, "2017-12": 5673,
+        "2018-01": 7269, "2018-02": 6728, "2018-03": 7211, "2018-04": 6939, "2018-05": 6873,
+        "2018-06": 6167, "2018-07": 6292, "2018-08": 6512, "2018-09": 16, "2018-10": 4,
+    },
+    "items_per_order": {1: 90.06, 2: 7.61, 3: 1.33, 4: 0.51, 5: 0.19, 6: 0.19, 7: 0.11},
+    "payment_type": {"credit_card": 73.92, "boleto": 19.04, "voucher": 5.56, "debit_card": 1.47},
+    "review_score": {5: 57.78, 4: 19.29, 1: 11.51, 3: 8.24, 2: 3.18},
+}
+
+# state -> (capital, approx. lat, lng): fallback cities and geolocation centroids
+STATES = {
+    "AC": ("rio branco", -9.97, -67.81), "AL": ("maceio", -9.67, -35.74), "AM": ("manaus", -3.12, -60.02),
+    "AP": ("macapa", 0.03, -51.07), "BA": ("salvador", -12.97, -38.50), "CE": ("fortaleza", -3.73, -38.52),
+    "DF": ("brasilia", -15.79, -47.88), "ES": ("vitoria", -20.32, -40.34), "GO": ("goiania", -16.69, -49.26),
+    "MA": ("sao luis", -2.53, -44.30), "MG": ("belo horizonte", -19.92, -43.94), "MS": ("campo grande", -20.47, -54.62),
+    "MT": ("cuiaba", -15.60, -56.10), "PA": ("belem", -1.46, -48.49), "PB": ("joao pessoa", -7.12, -34.86),
+    "PE": ("recife", -8.05, -34.88), "PI": ("teresina", -5.09, -42.80), "PR": ("curitiba", -25.43, -49.27),
+    "RJ": ("rio de janeiro", -22.91, -43.17), "RN": ("natal", -5.79, -35.21), "RO": ("porto velho", -8.76, -63.90),
+    "RR": ("boa vista", 2.82, -60.67), "RS": ("porto alegre", -30.03, -51.23), "SC": ("florianopolis", -27.60, -48.55),
+    "SE": ("aracaju", -10.91, -37.07), "SP": ("sao paulo", -23.55, -46.63), "TO": ("palmas", -10.18, -48.33),
+}
+
+COMMENTS = ["Recomendo", "Produto muito bom, chegou antes do prazo", "Ótimo", "Entrega rápida",
+            "Não recebi o produto", "Produto diferente do anunciado", "Bom custo benefício",
+            "Chegou com defeito", "Muito satisfeito com a compra", "Demorou para chegar"]
+
+# --------------------------------------------------------------------------------------
+# Profile
+# --------------------------------------------------------------------------------------
+def profile_from_db(path: str) -> dict:
+    con = duckdb.connect(path, read_only=True)
+    q = lambda sql: {k: v for k, v in con.execute(sql).fetchall() if k is not None}
+    prof = {
+        "customer_state": q("SELECT customer_state, COUNT(*) FROM orders JOIN customers USING (customer_id) GROUP BY 1"),
+        "order_status": q("SELECT order_status, COUNT(*) FROM orders GROUP BY 1"),
+        "purchase_month": q("SELECT strftime(order_purchase_timestamp, '%Y-%m'), COUNT(*) FROM orders GROUP BY 1"),
+        "items_per_order": q("SELECT n, COUNT(*) FROM (SELECT COUNT(*) AS n FROM items GROUP BY order_id) GROUP BY 1"),
+        "payment_type": q("SELECT payment_type, COUNT(*) FROM payments WHERE payment_type <> 'not_defined' GROUP BY 1"),
+        "review_score": q("SELECT review_score, COUNT(*) FROM reviews GROUP BY 1"),
+    }
+    con.close()
+    return prof
+
+def _slots(con, name: str, dist: dict):
+    """Lookup table slot -> value with each value owning a share of SLOTS slots."""
+    total = sum(dist.values())
+    rows, acc = [], 0.0
+    for v, w in sorted(dist.items(), key=lambda kv: -kv[1]):
+        lo = round(acc / total * SLOTS); acc += w; hi = round(acc / total * SLOTS)
+        rows += [(s, str(v)) for s in range(lo, hi)]
+    con.execute(f"CREATE TABLE {name} (slot INTEGER, value VARCHAR)")
+    con.executemany(f"INSERT INTO {name} VALUES (?, ?)", rows)
+
+# --------------------------------------------------------------------------------------
+# Generator (DuckDB views over range(n_orders); nothing is materialised)
+# --------------------------------------------------------------------------------------
+def build_views(con, n_orders: int, dim_scale: int, raw_dir: Path, prof: dict, seed: int):
+    # deterministic uniforms in [0, 1): u(row, stream)
+    con.execute(f"CREATE MACRO u(i, k) AS (hash(i, k, {seed}) % 1000003) / 1000003.0")
+    # standard normal (Box-Muller)
+    con.execute("CREATE MACRO z(i, k) AS sqrt(-2 * ln(1 - u(i, k))) * cos(2 * pi() * u(i, k + 1000))")
+    con.execute("CREATE MACRO slot(i, k) AS floor(u(i, k) * %d)::INTEGER" % SLOTS)
+    for name in ("customer_state", "order_status", "purchase_month", "items_per_order", "payment_type", "review_score"):
+        _slots(con, f"d_{name}", prof[name])
+    con.execute("CREATE TABLE d_comments (k INTEGER, msg VARCHAR)")
+    con.executemany("INSERT INTO d_comments VALUES (?, ?)", list(enumerate(COMMENTS)))
+
+    # dimensions grown from the real files: copy 0 keeps the real ids
+    read = lambda f: f"read_csv('{(raw_dir / RAW_FILES[f]).as_posix()}', header=true, all_varchar=true)"
+    con.execute(f"""CREATE TABLE products AS
+        SELECT CASE WHEN c = 0 THEN product_id ELSE md5(product_id || c) END AS product_id, * EXCLUDE (product_id, c)
+        FROM {read('products')}, range({dim_scale}) r(c)""")
+    con.execute("CREATE TABLE p_idx AS SELECT row_number() OVER () - 1 AS idx, product_id FROM products")
+    con.execute(f"""CREATE TABLE sellers AS
+        SELECT CASE WHEN c = 0 THEN seller_id ELSE md5(seller_id || c) END AS seller_id, * EXCLUDE (seller_id, c)
+        FROM {read('sellers')}, range({dim_scale}) r(c)""")
+    con.execute("CREATE TABLE s_idx AS SELECT row_number() OVER () - 1 AS idx, seller_id FROM sellers")
+    con.execute(f"CREATE TABLE product_category_translation AS SELECT * FROM {read('product_category_translation')}")
+    # customer cities: the real (city, zip prefix) pairs seen per state, capital as fallback
+    con.execute("""CREATE TABLE places AS
+        SELECT seller_state AS state, seller_city AS city, seller_zip_code_prefix::BIGINT AS zip,
+               row_number() OVER (PARTITION BY seller_state ORDER BY seller_city, seller_zip_code_prefix) - 1 AS k
+        FROM (SELECT DISTINCT seller_state, seller_city, seller_zip_code_prefix FROM sellers)""")
+    con.executemany("INSERT INTO places SELECT ?, ?, ?, 0 WHERE NOT EXISTS (SELECT 1 FROM places WHERE state = ?)",
+                    [(s, c, 10000 + i * 1000, s) for i, (s, (c, _, _)) in enumerate(STATES.items())])
+    con.execute("CREATE TABLE place_n AS SELECT state, COUNT(*) AS n FROM places GROUP BY 1")
+    n_products = con.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+    n_sellers = con.execute("SELECT COUNT(*) FROM sellers").fetchone()[0]
+
+    con.execute(f"""CREATE VIEW g_orders AS
+    SELECT r.i,
+           md5('o' || r.i || '-{seed}') AS order_id,
+           md5('c' || r.i || '-{seed}') AS customer_id,
+           -- ~3% of customers are repeat buyers (same customer_unique_id as an earlier order)
+           md5('u' || CASE WHEN u(r.i, 1) < 0.03 THEN floor(u(r.i, 2) * r.i)::BIGINT ELSE r.i END || '-{seed}') AS customer_unique_id,
+           r.state AS customer_state, pl.city AS customer_city, pl.zip AS customer_zip_code_prefix,
+           os.value AS order_status,
+           strptime(pm.value || '-01', '%Y-%m-%d')
+             + to_seconds((u(r.i, 6) * 28 * 86400)::BIGINT) AS purchase_ts,
+           CASE WHEN os.value = 'unavailable' THEN 0 ELSE ni.value::INTEGER END AS n_items,
+           floor(u(r.i, 8) * {n_sellers})::BIGINT AS seller_idx,
+           pt.value AS payment_type,
+           rs.value::BIGINT AS review_score
+    FROM (SELECT r.i, st.value AS state, floor(u(r.i, 4) * pn.n)::BIGINT AS place_k
+          FROM range({n_orders}) r(i)
+          JOIN d_customer_state st ON st.slot = slot(r.i, 3)
+          JOIN place_n pn ON pn.state = st.value) r
+    JOIN places pl ON pl.state = r.state AND pl.k = r.place_k
+    JOIN d_order_status os ON os.slot = slot(r.i, 5)
+    JOIN d_purchase_month pm ON pm.slot = slot(r.i, 7)
+    JOIN d_items_per_order ni ON ni.slot = slot(r.i, 9)
+    JOIN d_payment_type pt ON pt.slot = slot(r.i, 10)
+    JOIN d_review_score rs ON rs.slot = slot(r.i, 11)""")
+
+    # delivery timeline: approval < 2 days, carrier 1-5 days later, transit ~ 2 + Exp(6) days,
+    # estimate 15-30 days after purchase (~9% late, as in Olist)
+    con.execute("""CREATE VIEW g_timeline AS
+    SELECT *,
+           purchase_ts + to_seconds((u(i, 20) * 172800)::BIGINT) AS approved_ts,
+           purchase_ts + to_seconds((u(i, 20) * 172800 + 86400 + u(i, 21) * 345600)::BIGINT) AS carrier_ts,
+           purchase_ts + to_seconds((u(i, 20) * 172800 + 86400 + u(i, 21) * 345600
+                                     + (2 - 6 * ln(1 - u(i, 22))) * 86400)::BIGINT) AS delivered_ts,
+           date_trunc('day', purchase_ts) + to_days((15 + floor(u(i, 23) * 16))::INTEGER) AS estimated_ts
+    FROM g_orders""")
+
+    con.execute(f"""CREATE VIEW orders AS
+    SELECT order_id, customer_id, order_status,
+           purchase_ts AS order_purchase_timestamp,
+           CASE WHEN order_status NOT IN ('created', 'canceled') THEN approved_ts END AS order_approved_at,
+           CASE WHEN order_status IN ('delivered', 'shipped') THEN carrier_ts END AS order_delivered_carrier_date,
+           CASE WHEN order_status = 'delivered' THEN delivered_ts END AS order_delivered_customer_date,
+           estimated_ts AS order_estimated_delivery_date
+    FROM g_timeline""")
+    con.execute("""CREATE VIEW customers AS
+    SELECT customer_id, customer_unique_id, customer_zip_code_prefix, customer_city, customer_state FROM g_orders""")
+
+    # one seller per order (as in most Olist orders); popular products sampled more often
+    con.execute(f"""CREATE VIEW g_items AS
+    SELECT o.i, o.order_id, k + 1 AS order_item_id, o.purchase_ts,
+           p.product_id, s.seller_id,
+           round(exp(4.3 + 0.9 * z(o.i * 8 + k, 30)), 2) AS price,
+           round(exp(2.8 + 0.5 * z(o.i * 8 + k, 32)), 2) AS freight_value
+    FROM (SELECT * FROM g_orders, range(n_items) t(k)) o
+    JOIN p_idx p ON p.idx = floor(pow(u(o.i * 8 + k, 31), 2) * {n_products})
+    JOIN s_idx s ON s.idx = o.seller_idx""")
+    con.execute("""CREATE VIEW items AS
+    SELECT order_id, order_item_id, product_id, seller_id,
+           purchase_ts + INTERVAL 6 DAY AS shipping_limit_date, price, freight_value
+    FROM g_items""")
+
+    # payment_value = order total; ~3% of orders split off a voucher as a second payment
+    con.execute("""CREATE VIEW payments AS
+    WITH tot AS (SELECT i, SUM(price + freight_value) AS total FROM g_items GROUP BY 1),
+    base AS (
+      SELECT o.i, o.order_id, o.payment_type, COALESCE(t.total, 0) AS total, u(o.i, 40) < 0.03 AS split,
+             CASE WHEN o.payment_type = 'credit_card'
+                  THEN 1 + floor(pow(u(o.i, 41), 2) * 10)::BIGINT ELSE 1 END AS installments
+      FROM g_orders o LEFT JOIN tot t ON t.i = o.i
+    )
+    SELECT order_id, 1::BIGINT AS payment_sequential, payment_type, installments AS payment_installments,
+           round(CASE WHEN split THEN total * 0.7 ELSE total END, 2) AS payment_value
+    FROM base
+    UNION ALL
+    SELECT order_id, 2, 'voucher', 1, round(total * 0.3, 2) FROM base WHERE split""")
+
+    con.execute(f"""CREATE VIEW reviews AS
+    SELECT md5('r' || i || '-{seed}') AS review_id, order_id, review_score,
+           NULL::VARCHAR AS review_comment_title,
+           CASE WHEN u(i, 50) < 0.41 THEN c.msg END AS review_comment_message,
+           date_trunc('day', CASE WHEN order_status = 'delivered' THEN delivered_ts
+                                  ELSE estimated_ts END) + INTERVAL 1 DAY AS review_creation_date,
+           date_trunc('day', CASE WHEN order_status = 'delivered' THEN delivered_ts ELSE estimated_ts END)
+             + INTERVAL 1 DAY + to_seconds((u(i, 51) * 259200)::BIGINT) AS review_answer_timestamp
+    FROM g_timeline JOIN d_comments c ON c.k = floor(u(i, 52) * {len(COMMENTS)})""")
+
+    # a few points per zip prefix around the state centroid
+    con.execute("CREATE TABLE centroids (state VARCHAR, lat DOUBLE, lng DOUBLE)")
+    con.executemany("INSERT INTO centroids VALUES (?, ?, ?)", [(s, la, lo) for s, (_, la, lo) in STATES.items()])
+    con.execute("""CREATE VIEW geolocation AS
+    SELECT z.zip AS geolocation_zip_code_prefix,
+           round(c.lat + (u(z.zip * 4 + t.k, 60) - 0.5) * 2, 6) AS geolocation_lat,
+           round(c.lng + (u(z.zip * 4 + t.k, 61) - 0.5) * 2, 6) AS geolocation_lng,
+           z.city AS geolocation_city, z.state AS geolocation_state
+    FROM places z JOIN centroids c ON c.state = z.state, range(3) t(k)""")
+
+# --------------------------------------------------------------------------------------
+# Output
+# --------------------------------------------------------------------------------------
+PARTITIONED = {"orders": "order_purchase_timestamp", "items": None, "payments": None, "reviews": None}
+
+def write(con, out: Path, fmt: str):
+    out.mkdir(parents=True, exist_ok=True)
+    for name, fname in RAW_FILES.items():
+        t0 = time.perf_counter()
+        if fmt == "csv":
+            target = out / fname
+            con.execute(f"COPY (SELECT * FROM {name}) TO '{target.as_posix()}' (HEADER, DELIMITER ',')")
+        elif name in PARTITIONED:
+            target = out / name
+            # partition by the order's purchase month so a date filter prunes every fact table alike
+            src = name if name == "orders" else f"{name} JOIN (SELECT order_id, order_purchase_timestamp FROM orders) USING (order_id)"
+            con.execute(f"""COPY (SELECT {name}.*, year(order_purchase_timestamp) AS year,
+                                         month(order_purchase_timestamp) AS month FROM {src})
+                            TO '{target.as_posix()}' (FORMAT PARQUET, PARTITION_BY (year, month), OVERWRITE_OR_IGNORE)""")
+        else:
+            target = out / f"{name}.parquet"
+            con.execute(f"COPY (SELECT * FROM {name}) TO '{target.as_posix()}' (FORMAT PARQUET)")
+        print(f"  ✓ {name} → {target.name} ({time.perf_counter() - t0:.1f}s)")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--scale", type=float, default=10, help="multiple of the real ~99k orders")
+    ap.add_argument("--out", default=None, help="output folder (default data/synthetic/x<scale>)")
+    ap.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    ap.add_argument("--raw-dir", default="data/raw", help="real products/sellers/translation CSVs")
+    ap.add_argument("--profile-db", default=None, help="ingested Olist DuckDB to take distributions from")
+    ap.add_argument("--dim-scale", type=int, default=None, help="product/seller copies (default ≈ sqrt(scale))")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--memory-limit", default=None, help="DuckDB memory_limit, e.g. 4GB")
+    args = ap.parse_args()
+
+    n_orders = int(BASE_ORDERS * args.scale)
+    dim_scale = args.dim_scale or max(1, round(math.sqrt(args.scale)))
+    out = Path(args.out or f"data/synthetic/x{args.scale:g}")
+    prof = profile_from_db(args.profile_db) if args.profile_db else DEFAULT_PROFILE
+
+    con = duckdb.connect()
+    tmp = out / ".tmp"  # spill space for the payments aggregate at large scales
+    con.execute(f"SET temp_directory='{tmp.as_posix()}'")
+    if args.memory_limit:
+        con.execute(f"SET memory_limit='{args.memory_limit}'")
+    con.execute("SET preserve_insertion_order=false")  # lets COPY stream in parallel
+    build_views(con, n_orders, dim_scale, Path(args.raw_dir), prof, args.seed)
+    print(f"→ Generating {n_orders:,} orders (scale {args.scale:g}, products/sellers ×{dim_scale}) as {args.format} in {out}")
+    t0 = time.perf_counter()
+    write(con, out, args.format)
+    con.close()
+    shutil.rmtree(tmp, ignore_errors=True)
+    print(f"✅ Done in {time.perf_counter() - t0:.1f}s"
+          + (f" — ingest with: python scripts/ingest.py --raw-dir {out}" if args.format == "csv" else ""))
+
+if __name__ == "__main__":
+    main()
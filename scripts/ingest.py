@@ -1,7 +1,20 @@
-import argparse, os, json
+import argparse, csv, os, sys
 from pathlib import Path
-import pandas as pd
-import duckdb
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pv
+import pyarrow.parquet as pq
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.semantic import build_semantic_layer
+from core.approx import build_samples
+from core.db import open_db
+from core.answers import build as build_answers
+from core.versions import stamp
+
+# CSVs are read and written to parquet this many rows at a time, so ingest memory is bounded
+# by the chunk (not the file); dedup/sorting happen in DuckDB, which spills past memory_limit
+INGEST_CHUNK_ROWS = int(os.getenv("INGEST_CHUNK_ROWS", "250000"))
 
 RAW_FILES = {
     "customers": "olist_customers_dataset.csv",
@@ -15,76 +28,157 @@ RAW_FILES = {
     "product_category_translation": "product_category_name_translation.csv",
 }
 
-DATE_COLS = {
-    "orders": [
-        "order_purchase_timestamp",
-        "order_approved_at",
-        "order_delivered_carrier_date",
-        "order_delivered_customer_date",
-        "order_estimated_delivery_date",
-    ],
-    "reviews": ["review_creation_date", "review_answer_timestamp"],
-}
+# Declared column types per table. CSVs are read as text and converted column by column in
+# Arrow (no pandas type inference), so every chunk gets the same types even when one is all
+# null. Text is trimmed and blanks become NULL. Values that don't parse also become NULL: a
+# stray value in a late chunk is lost instead of failing the run. Dates are parsed as they
+# are read. CAT columns are low-cardinality text: dictionary-encoded in Parquet and an ENUM
+# in DuckDB (small integer codes instead of strings in scans, group-bys and joins). Columns not
+# declared here stay text.
+STR, INT, FLOAT = pa.string(), pa.int32(), pa.float64()
+TS = pa.timestamp("us", tz="UTC")
+CAT = pa.dictionary(pa.int32(), pa.string())
+TIMESTAMP_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d")
 
-NUMERIC_CASTS = {
+SCHEMAS = {
+    "customers": {
+        "customer_id": STR, "customer_unique_id": STR, "customer_zip_code_prefix": INT,
+        "customer_city": STR, "customer_state": CAT,
+    },
+    "geolocation": {
+        "geolocation_zip_code_prefix": INT, "geolocation_lat": FLOAT, "geolocation_lng": FLOAT,
+        "geolocation_city": STR, "geolocation_state": CAT,
+    },
     "items": {
-        "price": "float64",
-        "freight_value": "float64",
-        "shipping_limit_date": None,  # cast later to datetime
+        "order_id": STR, "order_item_id": INT, "product_id": STR, "seller_id": STR,
+        "shipping_limit_date": TS, "price": FLOAT, "freight_value": FLOAT,
     },
     "payments": {
-        "payment_sequential": "Int64",
-        "payment_installments": "Int64",
-        "payment_value": "float64",
+        "order_id": STR, "payment_sequential": INT, "payment_type": CAT,
+        "payment_installments": INT, "payment_value": FLOAT,
+    },
+    "reviews": {
+        "review_id": STR, "order_id": STR, "review_score": INT, "review_comment_title": STR,
+        "review_comment_message": STR, "review_creation_date": TS, "review_answer_timestamp": TS,
+    },
+    "orders": {
+        "order_id": STR, "customer_id": STR, "order_status": CAT,
+        "order_purchase_timestamp": TS, "order_approved_at": TS, "order_delivered_carrier_date": TS,
+        "order_delivered_customer_date": TS, "order_estimated_delivery_date": TS,
     },
     "products": {
-        "product_weight_g": "float64",
-        "product_length_cm": "float64",
-        "product_height_cm": "float64",
-        "product_width_cm": "float64",
+        "product_id": STR, "product_category_name": CAT, "product_name_lenght": INT,
+        "product_description_lenght": INT, "product_photos_qty": INT, "product_weight_g": FLOAT,
+        "product_length_cm": FLOAT, "product_height_cm": FLOAT, "product_width_cm": FLOAT,
+    },
+    "sellers": {
+        "seller_id": STR, "seller_zip_code_prefix": INT, "seller_city": STR, "seller_state": CAT,
+    },
+    "product_category_translation": {
+        "product_category_name": CAT, "product_category_name_english": CAT,
     },
 }
 
-def read_csv_clean(path: Path, name: str) -> pd.DataFrame:
-    df = pd.read_csv(path, encoding="utf-8")
-    # strip whitespace on strings
-    for c in df.select_dtypes(include=["object"]).columns:
-        df[c] = df[c].astype(str).str.strip()
-        # normalize empty strings to NA
-        df[c] = df[c].replace({"": pd.NA, "nan": pd.NA})
-    # numeric casts
-    if name in NUMERIC_CASTS:
-        for col, dtype in NUMERIC_CASTS[name].items():
-            if col in df.columns and dtype:
-                df[col] = pd.to_numeric(df[col], errors="coerce").astype(dtype)
-    # date casts
-    if name in DATE_COLS:
-        for col in DATE_COLS[name]:
-            if col in df.columns:
-                df[col] = pd.to_datetime(df[col], errors="coerce", utc=True)
-    # special case: items.shipping_limit_date
-    if name == "items" and "shipping_limit_date" in df.columns:
-        df["shipping_limit_date"] = pd.to_datetime(df["shipping_limit_date"], errors="coerce", utc=True)
-    return df
-
-def write_parquet(df: pd.DataFrame, out_dir: Path, name: str) -> Path:
+DEDUP = {"customers", "sellers", "products", "geolocation", "product_category_translation"}
+CLUSTER = {  # sort order per table for common access patterns (improves locality)
+    "orders": "order_purchase_timestamp",
+    "items": "order_id",
+    "payments": "order_id",
+    "reviews": "review_creation_date",
+}
+
+_NUMBER_RE = r"^[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?$"
+
+def _header(path: Path) -> list[str]:
+    with path.open(encoding="utf-8", newline="") as f:
+        return next(csv.reader(f))
+
+def _block_size(path: Path, chunk_rows: int) -> int:
+    # the CSV reader splits by bytes: estimate the block holding `chunk_rows` rows from the first MB
+    with path.open("rb") as f:
+        head = f.read(1 << 20)
+    per_row = len(head) / max(1, head.count(b"\n"))
+    return int(min(max(chunk_rows * per_row, 1 << 16), 1 << 30))
+
+def convert_column(col: pa.Array, typ: pa.DataType) -> pa.Array:
+    """Raw CSV text -> `typ`: trimmed, blanks and unparseable values NULL."""
+    col = pc.utf8_trim_whitespace(col)
+    col = pc.if_else(pc.equal(col, ""), pa.scalar(None, pa.string()), col)
+    if pa.types.is_timestamp(typ):
+        parsed = [pc.strptime(col, format=f, unit=typ.unit, error_is_null=True) for f in TIMESTAMP_FORMATS]
+        return pc.coalesce(*parsed).cast(typ)  # naive Olist times, read as UTC
+    if pa.types.is_integer(typ) or pa.types.is_floating(typ):
+        num = pc.if_else(pc.match_substring_regex(col, _NUMBER_RE), col, pa.scalar(None, pa.string()))
+        num = num.cast(pa.float64())
+        if pa.types.is_integer(typ):  # "3.0" is 3, "2.5" isn't an integer
+            num = pc.if_else(pc.equal(pc.floor(num), num), num, pa.scalar(None, pa.float64()))
+        return num.cast(typ)
+    if pa.types.is_dictionary(typ):
+        return pc.dictionary_encode(col).cast(typ)
+    return col
+
+def read_csv_chunks(path: Path, name: str, chunk_rows: int = INGEST_CHUNK_ROWS):
+    """Arrow tables of about `chunk_rows` rows each, in the declared types (SCHEMAS)."""
+    declared = SCHEMAS.get(name, {})
+    names = _header(path)
+    schema = pa.schema([(c, declared.get(c, STR)) for c in names])
+    reader = pv.open_csv(
+        path,
+        read_options=pv.ReadOptions(block_size=_block_size(path, chunk_rows)),
+        parse_options=pv.ParseOptions(newlines_in_values=True),  # review comments span lines
+        convert_options=pv.ConvertOptions(column_types={c: pa.string() for c in names}),
+    )
+    for batch in reader:
+        yield pa.Table.from_arrays([convert_column(batch.column(c), schema.field(c).type) for c in names],
+                                   schema=schema)
+
+def write_parquet(chunks, out_dir: Path, name: str) -> tuple[Path, int]:
+    """Stream Arrow tables into one parquet file; returns (path, rows)."""
     out_dir.mkdir(parents=True, exist_ok=True)
     path = out_dir / f"{name}.parquet"
-    df.to_parquet(path, index=False)
-    return path
+    writer, rows = None, 0
+    try:
+        for t in chunks:
+            if writer is None:
+                writer = pq.ParquetWriter(path, t.schema, compression="zstd")
+            writer.write_table(t)
+            rows += t.num_rows
+    finally:
+        if writer is not None:
+            writer.close()
+    return path, rows
+
+def _enum_casts(con, name: str, src: str) -> list[str]:
+    """CREATE TYPE <table>_<column>_t AS ENUM (its values) for the table's CAT columns; the casts."""
+    present = {r[0] for r in con.execute(f"DESCRIBE SELECT * FROM {src}").fetchall()}
+    casts = []
+    for col, typ in SCHEMAS.get(name, {}).items():
+        if not pa.types.is_dictionary(typ) or col not in present:
+            continue
+        values = [r[0] for r in con.execute(
+            f'SELECT DISTINCT "{col}" FROM {src} WHERE "{col}" IS NOT NULL ORDER BY 1').fetchall()]
+        if not values:
+            continue  # all NULL: leave it VARCHAR
+        enum = f"{name}_{col}_t"
+        con.execute(f'CREATE TYPE "{enum}" AS ENUM ({", ".join(_quote(v) for v in values)})')
+        casts.append(f'"{col}"::"{enum}" AS "{col}"')
+    return casts
+
+def _quote(v: str) -> str:
+    return "'" + v.replace("'", "''") + "'"
 
 def create_duckdb(parquet_map: dict, db_path: Path):
     db_path.parent.mkdir(parents=True, exist_ok=True)
-    con = duckdb.connect(db_path.as_posix())
-    con.execute("PRAGMA threads=4;")
-    # Create tables from parquet (schema will be inferred from parquet types)
+    # memory_limit / temp_directory / threads come from the DUCKDB_* env settings (core/db.py)
+    con = open_db(db_path, preserve_insertion_order=False)
+    # Create tables from parquet (declared types, CAT columns as ENUMs); dedup + clustering in the same pass
     for name, p in parquet_map.items():
-        con.execute(f"CREATE OR REPLACE TABLE {name} AS SELECT * FROM read_parquet('{p.as_posix()}');")
-    # Basic clustering for common access patterns (improves locality)
-    con.execute("CREATE OR REPLACE TABLE orders AS SELECT * FROM orders ORDER BY order_purchase_timestamp;")
-    con.execute("CREATE OR REPLACE TABLE items AS SELECT * FROM items ORDER BY order_id;")
-    con.execute("CREATE OR REPLACE TABLE payments AS SELECT * FROM payments ORDER BY order_id;")
-    con.execute("CREATE OR REPLACE TABLE reviews AS SELECT * FROM reviews ORDER BY review_creation_date;")
+        src = f"read_parquet('{p.as_posix()}')"
+        casts = _enum_casts(con, name, src)
+        cols = f"* REPLACE ({', '.join(casts)})" if casts else "*"
+        distinct = "DISTINCT " if name in DEDUP else ""
+        order = f" ORDER BY {CLUSTER[name]}" if name in CLUSTER else ""
+        con.execute(f"CREATE OR REPLACE TABLE {name} AS SELECT {distinct}{cols} FROM {src}{order};")
     con.close()
 
 def main():
@@ -92,6 +186,7 @@ def main():
     ap.add_argument("--raw-dir", required=True, help="Folder containing Olist CSVs")
     ap.add_argument("--processed-dir", default="data/processed", help="Folder to write parquet")
     ap.add_argument("--db-path", default="db/olist.duckdb", help="DuckDB output path")
+    ap.add_argument("--chunk-rows", type=int, default=INGEST_CHUNK_ROWS, help="CSV rows read per chunk")
     args = ap.parse_args()
 
     raw_dir = Path(args.raw_dir)
@@ -110,21 +205,34 @@ def main():
     if missing:
         raise FileNotFoundError("Missing required CSVs:\n" + "\n".join(missing))
 
-    # Read → clean → parquet
+    # Read → clean → parquet, chunk by chunk
     parquet_map = {}
     for name, p in paths.items():
         print(f"→ Loading {name} from {p.name}")
-        df = read_csv_clean(p, name)
-        # quick dedup pass on obvious keys (kept simple)
-        if name in {"customers","sellers","products","geolocation","product_category_translation"}:
-            df = df.drop_duplicates()
-        pq = write_parquet(df, processed_dir, name)
-        parquet_map[name] = pq
-        print(f"  ✓ {name}: {len(df):,} rows → {pq.name}")
-
-    # Build DuckDB
-    create_duckdb(parquet_map, db_path)
-    print(f"✅ DuckDB ready at {db_path}")
+        out, rows = write_parquet(read_csv_chunks(p, name, args.chunk_rows), processed_dir, name)
+        parquet_map[name] = out
+        print(f"  ✓ {name}: {rows:,} rows → {out.name}")
+
+    # hand the chunk buffers back before DuckDB starts allocating
+    pa.default_memory_pool().release_unused()
+
+    # Build DuckDB in a side file and swap it in: a running app/API keeps its read-only pool on
+    # the old file until then (and reopens on the new one), instead of blocking the rebuild
+    build = db_path.with_name(db_path.stem + ".building" + db_path.suffix)
+    for f in (build, build.with_name(build.name + ".wal")):
+        f.unlink(missing_ok=True)
+    create_duckdb(parquet_map, build)
+    build_semantic_layer(build)
+    build_samples(build)
+    con = open_db(build)
+    stamps = stamp(con)  # per-table fingerprints: what this rebuild actually changed (core/versions.py)
+    con.close()
+    os.replace(build, db_path)
+    print(f"✅ DuckDB ready at {db_path} (with fact_order_items, semantic views, monthly rollups + approx samples; "
+          f"{len(stamps)} tables stamped)")
+    answers = build_answers(db_path)  # glossary + category translations, so those skip the LLM
+    print(f"✅ Answer store: {len(answers['terms'])} glossary terms, "
+          f"{len(answers['translations']['English'])} category translations")
 
 if __name__ == "__main__":
     main()
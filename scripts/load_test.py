@@ -0,0 +1,98 @@
+"""
+Load test for the execution service: N concurrent chat sessions against the real DuckDB
+file with a stubbed LLM (fixed latency, canned SQL), so it runs offline and is repeatable.
+
+  python scripts/load_test.py --sessions 50 --questions 4 --llm-latency 0.4
+  python scripts/load_test.py --mode inline      # old behaviour: each session runs inline
+"""
+import sys, os, time, argparse, random, threading, statistics
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import core.orchestrator as orchestrator
+import core.sql_agent as sql_agent
+from core.executor import ExecutionService, Cancelled
+from core.sql_agent import DEFAULT_DB, DEFAULT_SCHEMA
+
+# Questions the stubbed LLM knows; the first three also hit the template fast path.
+CANNED = {
+    "Top 5 product categories by revenue": None,
+    "How many orders per month in 2018?": None,
+    "Average delivery delay (days) by state": None,
+    "Which sellers have the most distinct customers?":
+        """SELECT i.seller_id, COUNT(DISTINCT o.customer_id) AS customers
+FROM items i JOIN orders o ON o.order_id = i.order_id
+GROUP BY 1 ORDER BY customers DESC LIMIT 10;""",
+    "Review score distribution":
+        "SELECT review_score, COUNT(*) AS n FROM reviews GROUP BY 1 ORDER BY 1;",
+    "Average installments per payment type":
+        "SELECT payment_type, AVG(payment_installments) AS avg_installments FROM payments GROUP BY 1;",
+}
+
+def install_stubs(latency: float):
+    def fake_llm(prompt, model, generation_config=None):
+        time.sleep(latency)
+        for q, sql in CANNED.items():
+            if q in prompt and sql:
+                return f"```sql\n{sql}\n```"
+        return "SELECT COUNT(*) AS orders FROM orders;"
+    sql_agent._call_gemini = fake_llm
+    orchestrator.detect_intent = lambda message: (time.sleep(latency / 4), "sql_query")[1]
+
+def session(i, args, service, latencies, errors, cancelled):
+    rnd = random.Random(i)
+    user = f"session-{i}"
+    for _ in range(args.questions):
+        q = rnd.choice(list(CANNED))
+        t0 = time.perf_counter()
+        try:
+            if args.mode == "inline":
+                md, extras = orchestrator.handle_message(q, DEFAULT_SCHEMA, args.db_path)
+            else:
+                fut = service.submit(user, orchestrator.handle_message, q, DEFAULT_SCHEMA, args.db_path,
+                                     cache_key=(q.lower(), str(DEFAULT_SCHEMA), str(args.db_path)))
+                # some impatient users ask again before the answer arrives
+                if rnd.random() < args.impatient:
+                    time.sleep(args.llm_latency / 2)
+                    fut = service.submit(user, orchestrator.handle_message, q, DEFAULT_SCHEMA, args.db_path)
+                md, extras = fut.result()
+            if extras.get("error"):
+                errors.append(extras["error"])
+        except Cancelled:
+            cancelled.append(q)
+        latencies.append(time.perf_counter() - t0)
+        time.sleep(rnd.random() * args.think_time)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sessions", type=int, default=50)
+    ap.add_argument("--questions", type=int, default=4, help="questions per session")
+    ap.add_argument("--llm-latency", type=float, default=0.4, help="stubbed LLM call latency (s)")
+    ap.add_argument("--think-time", type=float, default=0.2, help="max pause between questions (s)")
+    ap.add_argument("--impatient", type=float, default=0.1, help="share of questions re-asked mid-flight")
+    ap.add_argument("--workers", type=int, default=8)
+    ap.add_argument("--mode", choices=["service", "inline"], default="service")
+    ap.add_argument("--db-path", default=str(DEFAULT_DB))
+    args = ap.parse_args()
+
+    install_stubs(args.llm_latency)
+    service = ExecutionService(workers=args.workers) if args.mode == "service" else None
+    latencies, errors, cancelled = [], [], []
+    threads = [threading.Thread(target=session, args=(i, args, service, latencies, errors, cancelled))
+               for i in range(args.sessions)]
+    t0 = time.perf_counter()
+    for t in threads: t.start()
+    for t in threads: t.join()
+    wall = time.perf_counter() - t0
+
+    lat = sorted(latencies)
+    p = lambda q: lat[min(len(lat) - 1, int(q * len(lat)))]
+    print(f"mode={args.mode} sessions={args.sessions} questions={len(lat)} wall={wall:.2f}s "
+          f"throughput={len(lat) / wall:.1f} q/s")
+    print(f"latency  p50={p(0.5):.3f}s  p95={p(0.95):.3f}s  max={lat[-1]:.3f}s  mean={statistics.mean(lat):.3f}s")
+    print(f"errors={len(errors)} cancelled={len(cancelled)}")
+    if service:
+        print("service:", service.stats())
+        service.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+import argparse
 from pathlib import Path
 import duckdb, pandas as pd
 from tabulate import tabulate
@@ -67,9 +68,9 @@ def fk_violations(con):
         rows.append((label, child, ckey, parent, pkey, n))
     return pd.DataFrame(rows, columns=["check","child_table","child_key","parent_table","parent_key","violations"])
 
-def write_report(rc_df, nr_df, fk_df):
-    Path("docs").mkdir(parents=True, exist_ok=True)
-    with open(REPORT_MD, "w", encoding="utf-8") as f:
+def write_report(rc_df, nr_df, fk_df, report_md=REPORT_MD):
+    Path(report_md).parent.mkdir(parents=True, exist_ok=True)
+    with open(report_md, "w", encoding="utf-8") as f:
         f.write("# Ingestion & Sanity Report\n\n")
         f.write("## Row counts\n\n")
         f.write(tabulate(rc_df, headers="keys", tablefmt="github"))
@@ -80,13 +81,17 @@ def write_report(rc_df, nr_df, fk_df):
         f.write("\n")
 
 def main():
-    con = duckdb.connect(DB_PATH)
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--db-path", default=DB_PATH)
+    ap.add_argument("--report", default=REPORT_MD)
+    args = ap.parse_args()
+    con = duckdb.connect(args.db_path, read_only=True)
     rc = row_counts(con)
     nr = null_rates(con)
     fk = fk_violations(con)
-    write_report(rc, nr, fk)
+    write_report(rc, nr, fk, args.report)
     con.close()
-    print("✅ Wrote docs/ingest_report.md")
+    print(f"✅ Wrote {args.report}")
 
 if __name__ == "__main__":
     main()
@@ -2,6 +2,7 @@ import sys, os
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
 from core.sql_agent import ask
+from core.templates import fast_path_stats
 
 tests = [
     "Top 5 product categories by revenue",
@@ -13,10 +14,14 @@ tests = [
 for q in tests:
     print("="*80)
     print("Q:", q)
-    df, sql, err = ask(q)
+    tbl, sql, err = ask(q)
     print("\nSQL:\n", sql)
     if err:
         print("\nERR:", err)
     else:
         print("\nRESULT (head):")
-        print(df.head())
+        print(tbl.slice(0, 5).to_pandas())
+
+st = fast_path_stats()
+print("="*80)
+print(f"Template fast path: {st['hits']}/{st['total']} hits ({st['hit_rate']:.0%})")
@@ -0,0 +1,40 @@
+# tests/conftest.py
+# A small Olist-shaped DuckDB per test session; tests import core/ from the repo root.
+import os
+import sys
+from pathlib import Path
+
+import duckdb
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault("METRICS_ENABLED", "0")    # don't write data/cache/metrics.duckdb
+os.environ.setdefault("QUERY_LOG_ENABLED", "0")  # nor the workload log (core/advisor.py)
+
+def build_db(path: Path, orders: int = 20000):
+    con = duckdb.connect(str(path))
+    con.execute(f"""
+        CREATE TABLE customers AS
+        SELECT 'c' || i AS customer_id, ['SP', 'RJ', 'MG', 'BA'][i % 4 + 1] AS customer_state
+        FROM range({orders // 4}) t(i)""")
+    # skewed statuses and prices, deterministic (no random()): estimates are checked against exact
+    con.execute(f"""
+        CREATE TABLE orders AS
+        SELECT 'o' || i AS order_id, 'c' || (i % {orders // 4}) AS customer_id,
+               CASE WHEN i % 10 < 7 THEN 'delivered' WHEN i % 10 < 9 THEN 'shipped'
+                    WHEN i % 50 = 9 THEN 'canceled' ELSE 'invoiced' END AS order_status,
+               round(10 + (hash(i) % 10000) / 100.0, 2) AS price
+        FROM range({orders}) t(i)""")
+    con.execute("""
+        CREATE VIEW sem_orders AS
+        SELECT o.*, c.customer_state FROM orders o JOIN customers c USING (customer_id)""")
+    con.close()
+
+@pytest.fixture(scope="session")
+def db_path(tmp_path_factory) -> str:
+    path = tmp_path_factory.mktemp("db") / "olist.duckdb"
+    build_db(path)
+    yield str(path)
+    from core.db import close_pools
+    close_pools()
@@ -0,0 +1,44 @@
+import pytest
+
+from core import approx
+from core.db import connect
+
+@pytest.fixture(scope="module")
+def monkeypatch_module():
+    mp = pytest.MonkeyPatch()
+    yield mp
+    mp.undo()
+
+@pytest.fixture(scope="module")
+def sampled_db(db_path, monkeypatch_module):
+    monkeypatch_module.setattr(approx, "APPROX_MIN_ROWS", 10000)  # orders (20k) only
+    monkeypatch_module.setattr(approx, "SAMPLES", {"orders": ["order_status"]})
+    approx.build_samples(db_path, pct=20)
+    return db_path
+
+def _rows(sql, db_path):
+    with connect(db_path) as con:
+        return {r[0]: r[1:] for r in con.execute(sql).fetchall()}
+
+def test_sample_estimates_are_close_to_exact(sampled_db):
+    sql = "SELECT order_status, COUNT(*) AS n, SUM(price) AS revenue, AVG(price) AS avg_price FROM orders GROUP BY 1"
+    approx_sql, info = approx.rewrite(sql, sampled_db)
+    assert info["mode"] == "sample" and info["source"] == "stratified sample"
+    assert info["bounds"] == ["n_ci95", "revenue_ci95", "avg_price_ci95"]
+    exact, est = _rows(sql, sampled_db), _rows(approx_sql, sampled_db)
+    assert set(est) == set(exact)
+    for status, (n, revenue, avg_price) in exact.items():
+        e_n, e_rev, e_avg, _, rev_ci, avg_ci = est[status]
+        assert e_n == pytest.approx(n)  # weights are calibrated to the stratum sizes
+        assert abs(e_rev - revenue) <= max(2 * rev_ci, 0.05 * revenue)
+        assert abs(e_avg - avg_price) <= max(2 * avg_ci, 0.05 * avg_price)
+
+def test_small_tables_and_distinct_run_exactly(sampled_db):
+    sql, info = approx.rewrite("SELECT count(*) FROM customers", sampled_db)
+    assert info["mode"] == "exact" and sql == "SELECT count(*) FROM customers"
+    _, info = approx.rewrite("SELECT count(DISTINCT customer_id) FROM orders", sampled_db)
+    assert info["mode"] == "exact"
+
+def test_quantiles_use_a_sketch(sampled_db):
+    sql, info = approx.rewrite("SELECT median(price) FROM orders", sampled_db)
+    assert info["mode"] == "sketch" and "approx_quantile(price, 0.5)" in sql
@@ -0,0 +1,55 @@
+import json
+
+import pytest
+
+pytest.importorskip("reportlab")
+pytest.importorskip("matplotlib")
+pytest.importorskip("google.generativeai")
+
+from conftest import build_db
+from core import reports
+from core.db import open_db
+from core.versions import stamp
+
+INSIGHTS = [
+    {"question": "Orders by status", "sql": "SELECT order_status, count(*) AS n FROM orders GROUP BY 1 ORDER BY 1"},
+    {"question": "Customers by state", "sql": "SELECT customer_state, count(*) AS n FROM customers GROUP BY 1 ORDER BY 1"},
+]
+
+@pytest.fixture
+def stamped_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(reports, "REPORTS_DIR", tmp_path / "reports")
+    path = tmp_path / "olist.duckdb"
+    build_db(path, orders=2000)
+    con = open_db(path)
+    stamp(con)
+    con.close()
+    return path
+
+def _statuses(m):
+    return {it["question"]: it["status"] for it in m["insights"]}
+
+def test_refresh_skips_unchanged_tables(stamped_db):
+    first = reports.refresh(stamped_db, INSIGHTS)
+    assert set(_statuses(first).values()) == {"new"} and first["version"]
+    version = reports.REPORTS_DIR / first["version"]
+    assert {"report.md", "report.pdf", "manifest.json"} <= {p.name for p in version.iterdir()}
+
+    second = reports.refresh(stamped_db, INSIGHTS)
+    assert set(_statuses(second).values()) == {"skipped"}
+    assert second["version"] is None and second["latest"] == first["version"]
+
+def test_refresh_reruns_changed_tables(stamped_db):
+    reports.refresh(stamped_db, INSIGHTS)
+    con = open_db(stamped_db)
+    con.execute("UPDATE orders SET order_status = 'delivered' WHERE order_status = 'shipped'")
+    stamp(con)
+    con.close()
+    m = reports.refresh(stamped_db, INSIGHTS)
+    assert _statuses(m) == {"Orders by status": "changed", "Customers by state": "skipped"}
+    assert json.loads((reports.REPORTS_DIR / "latest.json").read_text())["version"] == m["version"]
+
+def test_force_writes_a_version(stamped_db):
+    reports.refresh(stamped_db, INSIGHTS)
+    m = reports.refresh(stamped_db, INSIGHTS, force=True)
+    assert set(_statuses(m).values()) == {"unchanged"} and m["version"]
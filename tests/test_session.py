@@ -0,0 +1,32 @@
+import pyarrow as pa
+import pytest
+
+from core.session import SessionContext
+
+@pytest.fixture
+def ctx(db_path):
+    c = SessionContext(db_path)
+    table = pa.table({"category": ["toys", "bed_bath", "a{b}"], "revenue": [30.0, 20.0, 10.0]})
+    c.remember("revenue by category", "SELECT category, revenue FROM t", table)
+    yield c
+    c.close()
+
+def test_refine_filter(ctx):
+    sql, table = ctx.refine("now only for toys")
+    assert table.to_pylist() == [{"category": "toys", "revenue": 30.0}]
+    assert sql.startswith("WITH prev AS (\nSELECT category, revenue FROM t\n)\nSELECT * FROM prev WHERE")
+
+def test_refine_sort_and_limit(ctx):
+    _, table = ctx.refine("sort by revenue ascending")
+    assert table.column("revenue").to_pylist() == [10.0, 20.0, 30.0]
+    _, table = ctx.refine("top 2")
+    assert table.num_rows == 2
+
+def test_refine_values_with_braces(ctx):
+    sql, table = ctx.refine("only a{b}")
+    assert table.column("category").to_pylist() == ["a{b}"]
+    assert "'a{b}'" in sql
+
+def test_refine_needs_a_new_query(ctx):
+    assert ctx.refine("now split by seller city") is None
+    assert SessionContext(ctx.db_path).refine("top 3") is None  # nothing to refine yet
@@ -0,0 +1,51 @@
+import pytest
+
+from core.sql_safety import check_sql, referenced_tables, is_syntax_error, ALLOWED_FUNCTIONS
+
+@pytest.mark.parametrize("sql", [
+    "SELECT order_status, count(*) AS n FROM orders GROUP BY 1 ORDER BY 2 DESC",
+    "WITH s AS (SELECT * FROM sem_orders) SELECT customer_state, avg(price) FROM s GROUP BY ALL",
+    "SELECT o.order_id FROM orders o JOIN customers c USING (customer_id) WHERE c.customer_state = 'SP'",
+    "SELECT order_id, row_number() OVER (ORDER BY price DESC) FROM orders LIMIT 5",
+    "SELECT nullif(price, 0), count_if(price > 20), date_trunc('month', now()) FROM orders GROUP BY ALL",
+    "SELECT * FROM orders UNION ALL SELECT * FROM orders",
+    "SELECT * FROM unnest([1, 2, 3])",
+    "DESCRIBE orders",
+    "SELECT 'DROP TABLE orders; read_csv(x)' AS s, replace(order_id, 'o', '') FROM orders",
+])
+def test_accepts(sql, db_path):
+    assert check_sql(sql, db_path) is None
+
+@pytest.mark.parametrize("sql, reason", [
+    ("DROP TABLE orders", "only a single SELECT"),
+    ("SELECT 1; SELECT 2", "only a single SELECT"),
+    ("INSERT INTO orders SELECT * FROM orders", "only a single SELECT"),
+    ("SELECT * FROM read_csv('/etc/passwd')", "table function not allowed"),
+    ("SELECT * FROM duckdb_settings()", "table function not allowed"),
+    ("SELECT * FROM 'orders.csv'", "file access"),
+    ("SELECT * FROM payments_secret", "unknown table"),
+    ("SELECT current_setting('memory_limit')", "function not allowed"),
+    ("SELECT getenv('HOME')", "function not allowed"),
+    ("SELECT nextval('seq')", "function not allowed"),
+    ("SELECT random() FROM orders", "function not allowed"),
+    ("SELECT current_query()", "function not allowed"),
+    ("SELECT has_table_privilege('orders', 'SELECT')", "function not allowed"),
+    ("SELEC * FROM orders", "syntax error"),
+])
+def test_rejects(sql, reason, db_path):
+    verdict = check_sql(sql, db_path)
+    assert verdict and verdict.startswith(reason), verdict
+
+def test_sensitive_builtins_are_not_allowed():
+    for name in ("current_setting", "getenv", "nextval", "currval", "setseed", "random", "uuid",
+                 "current_query", "error", "pg_typeof", "current_user", "txid_current"):
+        assert name not in ALLOWED_FUNCTIONS
+
+def test_syntax_errors_are_repairable():
+    assert is_syntax_error(check_sql("SELECT FROM WHERE"))
+    assert not is_syntax_error(check_sql("DROP TABLE orders"))
+
+def test_referenced_tables():
+    sql = "WITH s AS (SELECT * FROM main.orders) SELECT * FROM s JOIN customers c USING (customer_id)"
+    assert referenced_tables(sql) == {"main.orders", "customers"}
+    assert referenced_tables("UPDATE orders SET price = 0") is None
@@ -0,0 +1,38 @@
+import duckdb
+
+from core.versions import stamp, sql_versions
+
+def _table(rows):
+    con = duckdb.connect()
+    con.execute("CREATE TABLE g (zip INTEGER, city VARCHAR)")
+    con.executemany("INSERT INTO g VALUES (?, ?)", rows)
+    return con
+
+def test_stamp_changes_when_duplicate_rows_change_together():
+    con = _table([(1, "a"), (1, "a"), (2, "b")])
+    before = stamp(con)["g"]
+    con.execute("UPDATE g SET city = 'z' WHERE zip = 1")
+    assert stamp(con)["g"] != before
+
+def test_stamp_changes_with_one_value():
+    con = _table([(1, "a"), (2, "b")])
+    before = stamp(con)["g"]
+    con.execute("UPDATE g SET city = 'c' WHERE zip = 2")
+    assert stamp(con)["g"] != before
+
+def test_stamp_ignores_row_order_and_rebuilds():
+    con = _table([(1, "a"), (2, "b"), (3, "c")])
+    before = stamp(con)["g"]
+    con.execute("CREATE OR REPLACE TABLE g AS SELECT * FROM g ORDER BY zip DESC")
+    assert stamp(con)["g"] == before
+
+def test_stamp_records_table(tmp_path):
+    con = _table([(1, "a")])
+    stamps = stamp(con)
+    assert con.execute("SELECT table_name, version FROM ingest_versions").fetchall() == list(stamps.items())
+
+def test_sql_versions_resolves_views(db_path):
+    versions = sql_versions("SELECT customer_state, count(*) FROM sem_orders GROUP BY 1", db_path)
+    assert set(versions) == {"orders", "customers"}
+    assert all(v.startswith("file:") for v in versions.values())  # fixture DB has no stamps
+    assert sql_versions("DELETE FROM orders", db_path) is None